@@ -0,0 +1,299 @@
+"""
+Request analytics for GearGuard.
+
+The columns every metric needs are read from requests.db into compact
+arrays: one integer code per request for each group key, 0/1 status flags
+and the creation day. Each batch of rows is transposed and appended column
+by column, not request by request. Aggregates per technician, team,
+equipment category and equipment are then computed for every group in a
+single vectorized pass (NumPy bincount and sorted percentile lookups).
+
+NumPy is listed in requirements.txt. Without it the same arrays are
+aggregated in pure Python: counts go through collections.Counter, but open
+request ages are still gathered row by row, which is several times slower.
+
+Loaded columns are cached per request_date range until a trigger bumps the
+request_metrics cache version, equipment or categories change, or the UTC
+day (and with it the overdue flags) turns over. Ages are computed from the
+creation day at aggregation time, so cached columns never serve stale ages.
+"""
+import math
+import random
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+from itertools import compress
+
+from database import (
+    EQUIPMENT_DB, REQUESTS_DB, REQUEST_METRIC_GROUPS, REQUEST_METRICS_TAG, get_cache_version,
+    iter_request_metric_batches
+)
+from models import GroupMetrics
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency: fall back to stdlib arrays
+    np = None
+
+# Percentiles of open-request age reported for every group (GroupMetrics.open_age_p*)
+AGE_PERCENTILES = (50, 90)
+
+# Loaded request_date ranges kept in memory
+ANALYTICS_CACHE_SIZE = 8
+
+# Julian day number of the Unix epoch, as SQLite's julianday() counts
+UNIX_EPOCH_JULIAN_DAY = 2440587.5
+
+_columns_lock = threading.Lock()
+_columns_cache = OrderedDict()  # (start_date, end_date) -> (data version, RequestColumns)
+
+
+def julian_day(timestamp=None):
+    """Get the Julian day number of a Unix timestamp (default now)"""
+    return (time.time() if timestamp is None else timestamp) / 86400 + UNIX_EPOCH_JULIAN_DAY
+
+
+class RequestColumns:
+    """Analytics columns of a set of requests, loaded once and aggregated many times"""
+
+    def __init__(self):
+        self.labels = {group: [] for group in REQUEST_METRIC_GROUPS}  # group -> code -> label
+        self._indexes = {group: {} for group in REQUEST_METRIC_GROUPS}  # group -> label -> code
+        self.codes = {group: array('q') for group in REQUEST_METRIC_GROUPS}
+        self.completed = array('b')
+        self.open = array('b')
+        self.overdue = array('b')
+        self.created_days = array('d')
+
+    def __len__(self):
+        return len(self.completed)
+
+    def extend(self, rows):
+        """Add a batch of iter_request_metric_batches() rows; labels are coded in order of first appearance"""
+        if not rows:
+            return
+        technician, team, category, equipment, completed, is_open, overdue, created_days = zip(*rows)
+        for group, labels in zip(REQUEST_METRIC_GROUPS, (technician, team, category, equipment)):
+            index = self._indexes[group]
+            for label in dict.fromkeys(labels):
+                if label not in index:
+                    index[label] = len(index)
+                    self.labels[group].append(label)
+            self.codes[group].extend(map(index.__getitem__, labels))
+        self.completed.extend(completed)
+        self.open.extend(is_open)
+        self.overdue.extend(overdue)
+        if None in created_days:
+            created_days = [math.nan if day is None else day for day in created_days]
+        self.created_days.extend(created_days)
+
+    @classmethod
+    def load(cls, start_date=None, end_date=None):
+        """Read the analytics columns of requests raised in a request_date range"""
+        columns = cls()
+        for rows in iter_request_metric_batches(start_date, end_date):
+            columns.extend(rows)
+        return columns
+
+
+def data_version():
+    """Get the versions the analytics columns depend on: UTC day, requests, equipment and categories"""
+    return (time.strftime('%Y-%m-%d', time.gmtime()),
+            get_cache_version(REQUESTS_DB, REQUEST_METRICS_TAG),
+            get_cache_version(EQUIPMENT_DB, 'equipment'),
+            get_cache_version(EQUIPMENT_DB, 'equipment_categories'))
+
+
+def get_request_columns(start_date=None, end_date=None):
+    """Get the RequestColumns of a request_date range, reloaded only when the data version has moved"""
+    key = (start_date or None, end_date or None)
+    version = data_version()
+    with _columns_lock:
+        entry = _columns_cache.get(key)
+        if entry is not None and entry[0] == version:
+            _columns_cache.move_to_end(key)
+            return entry[1]
+
+    # Version read before loading: a concurrent write only makes this stale
+    columns = RequestColumns.load(*key)
+    with _columns_lock:
+        _columns_cache[key] = (version, columns)
+        _columns_cache.move_to_end(key)
+        while len(_columns_cache) > ANALYTICS_CACHE_SIZE:
+            _columns_cache.popitem(last=False)
+    return columns
+
+
+def _percentile(sorted_values, q):
+    """Linearly interpolated percentile of a sorted list, as numpy.percentile computes it"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q / 100
+    low = math.floor(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+# ==================== NUMPY BACKEND ====================
+
+def _group_percentiles_numpy(codes, values, groups, percentiles):
+    """Per-group percentiles of values with one sort: {q: array with NaN for empty groups}"""
+    keep = ~np.isnan(values)
+    codes, values = codes[keep], values[keep]
+    order = np.lexsort((values, codes))
+    values = values[order]
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.cumsum(counts) - counts
+
+    result = {}
+    for q in percentiles:
+        position = starts + (counts - 1) * (q / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, starts + counts - 1)
+        empty = counts == 0
+        low[empty] = high[empty] = 0
+        if len(values):
+            result[q] = values[low] + (values[high] - values[low]) * (position - low)
+        else:
+            result[q] = np.zeros(groups)
+        result[q][empty] = np.nan
+    return result
+
+
+def _aggregate_numpy(columns, group, now):
+    groups = len(columns.labels[group])
+    codes = np.frombuffer(columns.codes[group], dtype=np.int64)
+    completed = np.frombuffer(columns.completed, dtype=np.int8)
+    is_open = np.frombuffer(columns.open, dtype=np.int8)
+    overdue = np.frombuffer(columns.overdue, dtype=np.int8)
+
+    requests = np.bincount(codes, minlength=groups)
+    completed_counts = np.bincount(codes, weights=completed, minlength=groups)
+    open_counts = np.bincount(codes, weights=is_open, minlength=groups)
+    overdue_counts = np.bincount(codes, weights=overdue, minlength=groups)
+    open_mask = is_open.astype(bool)
+    open_ages = now - np.frombuffer(columns.created_days, dtype=np.float64)[open_mask]
+    ages = _group_percentiles_numpy(codes[open_mask], open_ages, groups, AGE_PERCENTILES)
+
+    return [
+        (requests[code], completed_counts[code], open_counts[code], overdue_counts[code],
+         *(None if np.isnan(ages[q][code]) else float(ages[q][code]) for q in AGE_PERCENTILES))
+        for code in range(groups)
+    ]
+
+
+# ==================== ARRAY BACKEND ====================
+
+def _aggregate_arrays(columns, group, now):
+    groups = len(columns.labels[group])
+    codes = columns.codes[group]
+    requests = Counter(codes)
+    completed = Counter(compress(codes, columns.completed))
+    open_counts = Counter(compress(codes, columns.open))
+    overdue = Counter(compress(codes, columns.overdue))
+
+    open_ages = [[] for _ in range(groups)]
+    for code, created_day in compress(zip(codes, columns.created_days), columns.open):
+        if created_day == created_day:  # skip NaN creation days
+            open_ages[code].append(now - created_day)
+
+    rows = []
+    for code in range(groups):
+        ages = sorted(open_ages[code])
+        rows.append((requests[code], completed[code], open_counts[code], overdue[code],
+                     *(_percentile(ages, q) for q in AGE_PERCENTILES)))
+    return rows
+
+
+# ==================== METRICS ====================
+
+def group_metrics(columns, group, use_numpy=None, now=None):
+    """Get GroupMetrics for every value of group, ordered by label; ages are in days before now (a Julian day)"""
+    if group not in REQUEST_METRIC_GROUPS:
+        raise ValueError(f"group must be one of: {', '.join(REQUEST_METRIC_GROUPS)}")
+    if use_numpy is None:
+        use_numpy = np is not None
+    aggregate = _aggregate_numpy if use_numpy else _aggregate_arrays
+
+    metrics = []
+    for label, (requests, completed, is_open, overdue, *ages) in zip(
+            columns.labels[group], aggregate(columns, group, julian_day() if now is None else now)):
+        requests, completed = int(requests), int(completed)
+        metrics.append(GroupMetrics(
+            label, requests, completed, int(is_open), int(overdue),
+            completed / requests * 100 if requests else 0,
+            *(None if age is None else round(age, 2) for age in ages)))
+    return sorted(metrics, key=lambda row: row.group)
+
+
+def get_request_analytics(groups=REQUEST_METRIC_GROUPS, start_date=None, end_date=None):
+    """Aggregate the (cached) request columns by every group in groups"""
+    columns = get_request_columns(start_date, end_date)
+    now = julian_day()
+    return {
+        'requests': len(columns),
+        'backend': 'numpy' if np is not None else 'array',
+        'groups': {group: group_metrics(columns, group, now=now) for group in groups},
+    }
+
+
+# ==================== BENCHMARK ====================
+
+def synthetic_batches(rows, batch_size=10000, seed=7):
+    """Yield batches of synthetic rows shaped like iter_request_metric_batches() output"""
+    rng = random.Random(seed)
+    sizes = {'technician': 50, 'team': 10, 'category': 25, 'equipment': 1000}
+    labels = {group: [f'{group.title()} {i}' for i in range(size)] for group, size in sizes.items()}
+    now = julian_day()
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for _ in range(min(batch_size, rows - offset)):
+            status = rng.random()
+            batch.append((*(rng.choice(labels[group]) for group in REQUEST_METRIC_GROUPS),
+                          int(status < 0.5), int(status >= 0.6), int(status >= 0.9),
+                          now - rng.expovariate(1 / 20)))
+        yield batch
+
+
+def _time_aggregation(columns, use_numpy, repeat):
+    """Best seconds of one full aggregation (every group) over repeat runs"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for group in REQUEST_METRIC_GROUPS:
+            group_metrics(columns, group, use_numpy=use_numpy)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(sizes=(100_000, 1_000_000), repeat=3, database=True):
+    """Time loading the columns and one full aggregation per backend.
+
+    Synthetic sizes time building the columns from row batches (generating
+    the rows is not counted, and neither is SQLite). With database, the
+    configured requests.db is also timed end to end, query included.
+    Returns a list of (source, rows, backend, load seconds, best aggregation seconds).
+    """
+    backends = [('numpy', True)] if np is not None else []
+    backends.append(('array', False))
+
+    sources = []
+    for rows in sizes:
+        columns, load_seconds = RequestColumns(), 0.0
+        for batch in synthetic_batches(rows):
+            started = time.perf_counter()
+            columns.extend(batch)
+            load_seconds += time.perf_counter() - started
+        sources.append(('synthetic', columns, load_seconds))
+    if database:
+        started = time.perf_counter()
+        columns = RequestColumns.load()
+        sources.append((REQUESTS_DB, columns, time.perf_counter() - started))
+
+    results = []
+    for source, columns, load_seconds in sources:
+        for name, use_numpy in backends:
+            results.append((source, len(columns), name, load_seconds, _time_aggregation(columns, use_numpy, repeat)))
+    return results
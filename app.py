@@ -1,15 +1,30 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (
+    Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, g,
+    stream_with_context, send_file, send_from_directory
+)
+import os
 import re
+import json
+import time
+from datetime import date, datetime, timedelta, timezone
 from database import (
     init_db, init_auth_db, init_equipment_db, init_requests_db,
     create_user, check_user_exists, verify_credentials, get_user_by_email,
     get_critical_equipment_count, get_technician_utilization, get_open_requests, get_maintenance_requests,
     get_all_equipment, get_equipment_by_id, create_equipment, update_equipment, delete_equipment,
     create_maintenance_request, update_request_status, get_dashboard_stats,
-    get_user_signups, get_all_users, get_maintenance_requests_simple,
+    get_user_signups, get_all_users, get_maintenance_requests_simple, create_profile, get_pool_stats, get_cache_stats,
+    get_user_role, release_thread_connections,
     # New requests database functions
-    create_maintenance_request_new, get_maintenance_requests_new, get_maintenance_requests_simple_new,
-    update_request_status_new, get_dashboard_stats_new,
+    create_maintenance_request_new, get_maintenance_requests_simple_new, get_calendar_requests, CALENDAR_MAX_DAYS,
+    parse_request_datetime,
+    get_maintenance_requests_for_equipment,
+    update_request_status_new, get_dashboard_stats_new, get_request_stats,
+    get_open_request_counts_by_equipment,
+    get_maintenance_requests_page, REQUEST_FILTERS, REQUEST_PAGE_SIZE, REQUEST_METRIC_GROUPS,
+    get_request_status_history, get_reliability_metrics, get_stage_times, RELIABILITY_SCOPES,
+    DOWNTIME_SCOPES, get_cost_totals, get_request_cost_entries, COST_SCOPES,
+    search_maintenance_requests,
     get_maintenance_request_by_id, update_maintenance_request, delete_maintenance_request,
     get_worksheet_comments, add_worksheet_comment,
     # Work centers and equipment categories
@@ -17,12 +32,139 @@ from database import (
     get_all_equipment_categories, create_equipment_category, get_equipment_category_by_id, 
     update_equipment_category, delete_equipment_category
 )
+from migrations import ensure_schema, schema_up_to_date
+from reports import (
+    REPORTS, REPORT_FILTERS, REPORT_PARTS, EXPORT_FORMATS, EXPORT_CHUNK_ROWS, report_headers, report_cells,
+    report_table, csv_chunks, gzip_chunks, export_report
+)
+from analytics import get_request_analytics
+from schedule import calendar_layout, get_schedule_conflicts, SCHEDULE_SCOPES
+from capacity import get_work_center_loads, CAPACITY_MAX_DAYS
+import sql_trace
+from profiler import (
+    profile_mode, start_profile, finish_profile, list_profiles, PROFILES_DIR, PROFILE_PARAM, PROFILE_HEADER
+)
+from metrics import request_started, request_finished, render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from oee import get_oee_series, OEE_PERIODS, OEE_MAX_DAYS
+from report_jobs import (
+    submit_report_job, get_report_job, job_status, REPORT_JOB_EVENT_INTERVAL, REPORT_JOB_EVENT_MAX_SECONDS,
+    REPORT_JOB_EVENT_RETRY_MS
+)
+from cli import gearguard_cli
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'  # Change this in production
 
-# Initialize database on startup
-init_db()
+app.cli.add_command(gearguard_cli)
+
+# templates/reports/_base.html renders every report's cells from its column definitions
+app.jinja_env.globals.update(report_headers=report_headers, report_cells=report_cells)
+
+# Check schema versions on startup (migrates when GEARGUARD_AUTO_MIGRATE is on)
+schema_ready = ensure_schema()
+
+@app.before_request
+def require_current_schema():
+    # An outdated database would fail requests on missing columns and indexes;
+    # refuse them until `flask gearguard migrate` has run
+    global schema_ready
+    if not schema_ready:
+        schema_ready = schema_up_to_date()
+        if not schema_ready:
+            return jsonify({'success': False,
+                            'message': "Database schema is out of date. Run 'flask gearguard migrate'."}), 503
+
+@app.before_request
+def start_request_metrics():
+    request_started(request.endpoint or 'unmatched')
+
+@app.after_request
+def record_response_metrics(response):
+    g.metrics_response = (response.status_code, None if response.is_streamed else response.calculate_content_length())
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    # Runs even when a view raised, which after_request handlers do not
+    status, size = g.pop('metrics_response', (500, None))
+    request_finished(request.method, status, size)
+
+@app.before_request
+def start_sql_trace():
+    sql_trace.begin_request()
+
+@app.after_request
+def add_query_summary(response):
+    trace = sql_trace.current_request()
+    if trace is not None:
+        response.headers[sql_trace.SUMMARY_HEADER] = trace.summary()
+    return response
+
+@app.teardown_request
+def finish_sql_trace(exc):
+    trace = sql_trace.end_request()
+    if trace is not None:
+        sql_trace.log_repeated(request.method, request.path, trace)
+
+def is_admin():
+    """Whether the logged-in user's profile has the admin role"""
+    return 'user_id' in session and get_user_role(session['user_id']) == 'admin'
+
+@app.before_request
+def start_request_profile():
+    mode = profile_mode(request.args.get(PROFILE_PARAM), request.headers.get(PROFILE_HEADER))
+    if mode and is_admin():
+        g.profile_requested = True
+        g.profile = start_profile(request.endpoint or 'unmatched', mode)
+
+@app.after_request
+def add_profile_header(response):
+    if g.get('profile_requested'):
+        response.headers[PROFILE_HEADER] = g.profile.name if g.profile else 'rate-limited'
+    return response
+
+@app.teardown_request
+def finish_request_profile(exc):
+    run = g.pop('profile', None)
+    if run is not None:
+        finish_profile(run)
+
+@app.teardown_appcontext
+def release_request_connections(exc):
+    # Hand connections back to the shared pool before the request thread exits
+    release_thread_connections()
+
+def status_progress(count, total):
+    """Get count as a percentage of total for progress bars (capped at 100)"""
+    return min((count / total * 100) if total > 0 else 0, 100)
+
+def request_page_args():
+    """Get the request list filters, page cursor and page size from the query string"""
+    filters = {name: request.args.get(name, '').strip() for name in REQUEST_FILTERS}
+    return filters, request.args.get('cursor'), request.args.get('limit', REQUEST_PAGE_SIZE, type=int)
+
+def load_request_page():
+    """Load the page of requests selected by the query string for a list page.
+
+    Returns (requests, filters, pagination); the pagination links keep the
+    active filters.
+    """
+    filters, cursor, limit = request_page_args()
+    try:
+        requests, next_cursor = get_maintenance_requests_page(filters, cursor, limit)
+    except ValueError as e:
+        flash(str(e), 'error')
+        requests, next_cursor = get_maintenance_requests_page({}, None, limit)
+        filters = {name: '' for name in filters}
+    
+    active_filters = {name: value for name, value in filters.items() if value}
+    if 'limit' in request.args:
+        active_filters['limit'] = limit
+    pagination = {
+        'next_url': url_for(request.endpoint, cursor=next_cursor, **active_filters) if next_cursor else None,
+        'first_url': url_for(request.endpoint, **active_filters) if cursor else None,
+    }
+    return requests, filters, pagination
 
 @app.route('/')
 def home():
@@ -84,16 +226,10 @@ def signup():
         
         if success:
             # Create profile
-            import sqlite3
-            conn = sqlite3.connect('equipment.db')
-            cursor = conn.cursor()
             # Get the newly created user ID
             is_valid, user_data = verify_credentials(email, password)
             if is_valid:
-                user_id = user_data[0]
-                cursor.execute('INSERT INTO profiles (user_id, full_name) VALUES (?, ?)', (user_id, full_name))
-                conn.commit()
-            conn.close()
+                create_profile(user_data[0], full_name)
             
             return render_template('auth.html', tab='signup', success='Account created successfully! You can now sign in.')
         else:
@@ -129,41 +265,40 @@ def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    stats = get_dashboard_stats_new()
+    stats = get_request_stats()
     equipment = get_all_equipment()
     work_centers = get_all_work_centers()
     requests = get_maintenance_requests_simple_new()
-    all_requests = get_maintenance_requests_new()
     
-    critical_count = get_critical_equipment_count()
-    technician_util = get_technician_utilization()
+    critical_count = stats['critical_equipment']
+    technician_util = stats['technician_utilization']
     
-    # Count requests by status from requests database
-    new_count = len([r for r in all_requests if r[7] == 'New'])
-    in_progress_count = len([r for r in all_requests if r[7] == 'In Progress'])
-    blocked_count = len([r for r in all_requests if r[7] == 'Blocked'])
-    ready_count = len([r for r in all_requests if r[7] == 'Ready for next stage'])
-    completed_count = len([r for r in all_requests if r[7] == 'Repaired'])
-    scrap_count = len([r for r in all_requests if r[7] == 'Scrap'])
-    total_requests = len(all_requests)
+    # Request counts by status (single grouped query)
+    new_count = stats['new']
+    in_progress_count = stats['in_progress']
+    blocked_count = stats['blocked']
+    ready_count = stats['ready']
+    completed_count = stats['completed']
+    scrap_count = stats['scrap']
+    total_requests = stats['total_requests']
     
     pending_count = new_count + in_progress_count
     
     # Get overdue count from stats (calculated in database)
-    overdue_count = stats.get('overdue', 0)
+    overdue_count = stats['overdue']
     
     # Calculate progress bar widths - more meaningful calculations
     # Critical equipment: show as percentage of total equipment (if we have equipment data)
-    total_equipment = stats.get('total_equipment', 0)
+    total_equipment = stats['total_equipment']
     critical_progress = min((critical_count / total_equipment * 100) if total_equipment > 0 else (critical_count * 20), 100) if critical_count > 0 else 0
     
     # Open requests: show as percentage of total requests
-    requests_progress = min((pending_count / total_requests * 100) if total_requests > 0 else 0, 100) if pending_count > 0 else 0
+    requests_progress = status_progress(pending_count, total_requests) if pending_count > 0 else 0
     
     # Calculate progress percentages for request status cards (as % of total requests)
-    new_progress = min((new_count / total_requests * 100) if total_requests > 0 else 0, 100)
-    in_progress_progress = min((in_progress_count / total_requests * 100) if total_requests > 0 else 0, 100)
-    completed_progress = min((completed_count / total_requests * 100) if total_requests > 0 else 0, 100)
+    new_progress = status_progress(new_count, total_requests)
+    in_progress_progress = status_progress(in_progress_count, total_requests)
+    completed_progress = status_progress(completed_count, total_requests)
     
     return render_template(
         'dashboard.html',
@@ -198,29 +333,31 @@ def maintenance():
     
     equipment = get_all_equipment()
     work_centers = get_all_work_centers()
-    all_requests = get_maintenance_requests_new()
-    stats = get_dashboard_stats_new()
+    page_requests, filters, pagination = load_request_page()
+    stats = get_request_stats()
     
     # Count requests by status
-    new_count = len([r for r in all_requests if r[7] == 'New'])
-    in_progress_count = len([r for r in all_requests if r[7] == 'In Progress'])
-    blocked_count = len([r for r in all_requests if r[7] == 'Blocked'])
-    ready_count = len([r for r in all_requests if r[7] == 'Ready for next stage'])
-    completed_count = len([r for r in all_requests if r[7] == 'Repaired'])
-    scrap_count = len([r for r in all_requests if r[7] == 'Scrap'])
-    total_requests = len(all_requests)
+    new_count = stats['new']
+    in_progress_count = stats['in_progress']
+    blocked_count = stats['blocked']
+    ready_count = stats['ready']
+    completed_count = stats['completed']
+    scrap_count = stats['scrap']
+    total_requests = stats['total_requests']
     
     # Calculate progress percentages for visual indicators
-    new_progress = min((new_count / total_requests * 100) if total_requests > 0 else 0, 100)
-    in_progress_progress = min((in_progress_count / total_requests * 100) if total_requests > 0 else 0, 100)
-    completed_progress = min((completed_count / total_requests * 100) if total_requests > 0 else 0, 100)
+    new_progress = status_progress(new_count, total_requests)
+    in_progress_progress = status_progress(in_progress_count, total_requests)
+    completed_progress = status_progress(completed_count, total_requests)
     
     return render_template('maintenance.html', 
                          active_page='maintenance',
                          user=session.get('email'),
                          equipment=equipment,
                          work_centers=work_centers,
-                         requests=all_requests,
+                         requests=page_requests,
+                         filters=filters,
+                         pagination=pagination,
                          new_count=new_count,
                          in_progress_count=in_progress_count,
                          blocked_count=blocked_count,
@@ -233,92 +370,70 @@ def maintenance():
                          completed_progress=completed_progress,
                          stats=stats)
 
-@app.route('/maintenance-calendar')
-def maintenance_calendar():
-    if 'user_id' not in session:
-        return redirect(url_for('login'))
-    
-    # Get all maintenance requests with scheduled dates
-    all_requests = get_maintenance_requests_new()
-    
-    # Debug: Print request structure
-    print(f"Total requests fetched: {len(all_requests)}")
-    if all_requests:
-        print(f"First request length: {len(all_requests[0])}")
-        print(f"First request: {all_requests[0]}")
-    
-    # Filter requests that have scheduled_date and format them properly
-    # Column order: id(0), subject(1), employee(2), technician(3), category(4), stage(5), 
-    # company(6), status(7), request_type(8), priority(9), description(10), 
-    # scheduled_date(11), due_date(12), equipment_id(13), team(14), request_date(15), 
-    # duration(16), created_at(17), updated_at(18), equipment_name(19)
-    scheduled_requests = []
-    for req in all_requests:
-        # Check if request has enough columns and scheduled_date exists
-        if len(req) > 11:
-            scheduled_date = req[11] if len(req) > 11 else None
-            created_at = req[17] if len(req) > 17 else None  # created_at at index 17
-            
-            # Only process if scheduled_date is not None and not empty
-            if scheduled_date:
-                scheduled_date_str = str(scheduled_date).strip()
-                
-                # Skip if empty string
-                if scheduled_date_str and scheduled_date_str.lower() != 'none':
-                    # If it's just a date (YYYY-MM-DD), use time from created_at
-                    if len(scheduled_date_str) == 10 and ' ' not in scheduled_date_str and 'T' not in scheduled_date_str:
-                        # Extract time from created_at if available
-                        if created_at:
-                            created_at_str = str(created_at).strip()
-                            # Extract time from created_at (format: YYYY-MM-DD HH:MM:SS)
-                            if ' ' in created_at_str:
-                                time_part = created_at_str.split(' ')[1]
-                                # Take only HH:MM:SS part
-                                if ':' in time_part:
-                                    scheduled_date_str = f"{scheduled_date_str} {time_part.split('.')[0]}"  # Remove microseconds if present
-                                else:
-                                    scheduled_date_str = f"{scheduled_date_str} 09:00:00"
-                            elif 'T' in created_at_str:
-                                time_part = created_at_str.split('T')[1].split('.')[0]  # Remove microseconds
-                                scheduled_date_str = f"{scheduled_date_str} {time_part}"
-                            else:
-                                scheduled_date_str = f"{scheduled_date_str} 09:00:00"  # Fallback
-                        else:
-                            scheduled_date_str = f"{scheduled_date_str} 09:00:00"  # Default if no created_at
-                    # Convert T separator to space for consistency
-                    elif 'T' in scheduled_date_str:
-                        scheduled_date_str = scheduled_date_str.replace('T', ' ')
-                    
-                    scheduled_requests.append({
-                        'id': req[0],
-                        'subject': req[1] if len(req) > 1 else 'No Subject',
-                        'employee': req[2] if len(req) > 2 else '',
-                        'technician': req[3] if len(req) > 3 else '',
-                        'scheduled_date': scheduled_date_str,
-                        'due_date': req[12] if len(req) > 12 else None,
-                        'status': req[7] if len(req) > 7 else 'New',
-                        'priority': req[9] if len(req) > 9 else 'Medium',
-                        'equipment_name': req[19] if len(req) > 19 else None,
-                        'created_at': str(created_at) if created_at else None
-                    })
-    
-    print(f"Scheduled requests found: {len(scheduled_requests)}")
-    for sr in scheduled_requests:
-        print(f"  - ID: {sr['id']}, Subject: {sr['subject']}, Date: {sr['scheduled_date']}")
-    
-    # Get current date info
-    from datetime import datetime, timedelta
+def render_calendar(active_page):
+    """Render the week calendar; events are fetched per week from /api/calendar"""
     today = datetime.now()
     current_week_start = today - timedelta(days=today.weekday())
     
     return render_template('calendar.html', 
-                         active_page='maintenance-calendar',
+                         active_page=active_page,
                          user=session.get('email'),
-                         scheduled_requests=scheduled_requests,
                          current_date=today.strftime('%Y-%m-%d'),
                          current_time=today.strftime('%H:%M'),
                          week_start=current_week_start.strftime('%Y-%m-%d'))
 
+@app.route('/maintenance-calendar')
+def maintenance_calendar():
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    return render_calendar('maintenance-calendar')
+
+def parse_window(args):
+    """Read a [start, end) window of at most CALENDAR_MAX_DAYS from query args.
+
+    Returns (start, end, error message).
+    """
+    start = parse_request_datetime(args.get('start'))
+    end = parse_request_datetime(args.get('end'))
+    if start is None or end is None:
+        return None, None, 'start and end must be ISO dates or datetimes'
+    if not start < end <= start + timedelta(days=CALENDAR_MAX_DAYS):
+        return None, None, f'end must be after start and at most {CALENDAR_MAX_DAYS} days later'
+    return start, end, None
+
+@app.route('/api/calendar')
+def api_calendar():
+    """Requests scheduled in [start, end) with their lane layout for the week view"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    start, end, error = parse_window(request.args)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    
+    events = calendar_layout(get_calendar_requests(start, end))
+    return jsonify({'success': True, 'start': start.isoformat(), 'end': end.isoformat(), 'events': events})
+
+@app.route('/api/schedule/conflicts')
+def api_schedule_conflicts():
+    """Double-booked technicians and overbooked teams among open requests running in [start, end)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    start, end, error = parse_window(request.args)
+    if error:
+        return jsonify({'success': False, 'message': error}), 400
+    scopes = request.args.get('scope')
+    scopes = scopes.split(',') if scopes else SCHEDULE_SCOPES
+    if any(scope not in SCHEDULE_SCOPES for scope in scopes):
+        return jsonify({'success': False, 'message': f"scope must be among: {', '.join(SCHEDULE_SCOPES)}"}), 400
+    
+    schedule = get_schedule_conflicts(start, end, scopes)
+    schedule['conflicts'] = {scope: [conflict.to_dict() for conflict in conflicts]
+                             for scope, conflicts in schedule['conflicts'].items()}
+    return jsonify({'success': True, 'start': start.isoformat(), 'end': end.isoformat(), **schedule})
+
 
 @app.route('/create-request', methods=['POST'])
 def create_request():
@@ -402,32 +517,7 @@ def view_request(request_id):
         if not request_data:
             return jsonify({'success': False, 'message': 'Request not found'}), 404
         
-        # Convert tuple to dictionary for JSON response
-        # Database has 19 columns (0-18), equipment_name is appended at index 19
-        request_dict = {
-            'id': request_data[0] if len(request_data) > 0 else None,
-            'subject': request_data[1] if len(request_data) > 1 else None,
-            'employee': request_data[2] if len(request_data) > 2 else None,
-            'technician': request_data[3] if len(request_data) > 3 else None,
-            'category': request_data[4] if len(request_data) > 4 else None,
-            'stage': request_data[5] if len(request_data) > 5 else None,
-            'company': request_data[6] if len(request_data) > 6 else None,
-            'status': request_data[7] if len(request_data) > 7 else None,
-            'request_type': request_data[8] if len(request_data) > 8 else None,
-            'priority': request_data[9] if len(request_data) > 9 else None,
-            'description': request_data[10] if len(request_data) > 10 else None,
-            'scheduled_date': request_data[11] if len(request_data) > 11 else None,
-            'due_date': request_data[12] if len(request_data) > 12 else None,
-            'equipment_id': request_data[13] if len(request_data) > 13 else None,
-            'team': request_data[14] if len(request_data) > 14 else None,
-            'request_date': request_data[15] if len(request_data) > 15 else None,
-            'duration': request_data[16] if len(request_data) > 16 else None,
-            'created_at': request_data[17] if len(request_data) > 17 else None,
-            'updated_at': request_data[18] if len(request_data) > 18 else None,
-            'equipment_name': request_data[19] if len(request_data) > 19 else None
-        }
-        
-        return jsonify({'success': True, 'request': request_dict})
+        return jsonify({'success': True, 'request': request_data.to_dict()})
     except Exception as e:
         import traceback
         print(f"Error in view_request: {str(e)}")
@@ -517,8 +607,10 @@ def equipment():
     equipment_list = get_all_equipment()
     categories = get_all_equipment_categories()
     work_centers = get_all_work_centers()
+    open_counts = get_open_request_counts_by_equipment()
     return render_template('equipment.html', active_page='equipment', user=session.get('email'), 
-                         equipment=equipment_list, categories=categories, work_centers=work_centers)
+                         equipment=equipment_list, categories=categories, work_centers=work_centers,
+                         open_counts=open_counts)
 
 @app.route('/equipment/<int:equipment_id>')
 def equipment_detail(equipment_id):
@@ -533,8 +625,7 @@ def equipment_detail(equipment_id):
     categories = get_all_equipment_categories()
     work_centers = get_all_work_centers()
     # Get maintenance requests for this equipment
-    all_requests = get_maintenance_requests_new()
-    equipment_requests = [r for r in all_requests if len(r) > 13 and r[13] and int(r[13]) == equipment_id]
+    equipment_requests = get_maintenance_requests_for_equipment(equipment_id)
     
     return render_template('equipment_detail.html', active_page='equipment', 
                          user=session.get('email'), equipment=equipment_data,
@@ -623,8 +714,106 @@ def requests_page():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    all_requests = get_maintenance_requests_new()
-    return render_template('requests.html', active_page='requests', user=session.get('email'), requests=all_requests)
+    page_requests, filters, pagination = load_request_page()
+    return render_template('requests.html', active_page='requests', user=session.get('email'),
+                           requests=page_requests, filters=filters, pagination=pagination)
+
+@app.route('/api/requests')
+def api_requests():
+    """Keyset-paginated, filtered maintenance requests as JSON"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    filters, cursor, limit = request_page_args()
+    try:
+        requests, next_cursor = get_maintenance_requests_page(filters, cursor, limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'requests': [row.to_dict() for row in requests],
+        'next_cursor': next_cursor,
+    })
+
+@app.route('/api/search')
+def api_search():
+    """Ranked full-text search over requests and worksheet comments"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    results = search_maintenance_requests(query, limit)
+    return jsonify({'success': True, 'query': query, **results})
+
+@app.route('/api/analytics')
+def api_analytics():
+    """Request metrics per technician, team, equipment category and equipment"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    groups = request.args.get('group')
+    groups = groups.split(',') if groups else REQUEST_METRIC_GROUPS
+    unknown = [group for group in groups if group not in REQUEST_METRIC_GROUPS]
+    if unknown:
+        return jsonify({'success': False, 'message': f"group must be among: {', '.join(REQUEST_METRIC_GROUPS)}"}), 400
+    
+    analytics = get_request_analytics(groups, request.args.get('start_date'), request.args.get('end_date'))
+    analytics['groups'] = {group: [row.to_dict() for row in rows] for group, rows in analytics['groups'].items()}
+    return jsonify({'success': True, **analytics})
+
+@app.route('/api/reliability')
+def api_reliability():
+    """MTTR, MTBF and time in each status per equipment or team, from the status history rollups"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    scope = request.args.get('scope', 'equipment')
+    if scope not in RELIABILITY_SCOPES:
+        return jsonify({'success': False, 'message': f"scope must be one of: {', '.join(RELIABILITY_SCOPES)}"}), 400
+    
+    stage_times = {}
+    for stage in get_stage_times(scope):
+        stage_times.setdefault(stage.group_key, {})[stage.status] = {
+            'exits': stage.exits, 'average_hours': stage.average_hours()}
+    
+    metrics = [dict(row.to_dict(), stage_times=stage_times.pop(row.group_key, {}))
+               for row in get_reliability_metrics(scope)]
+    return jsonify({'success': True, 'scope': scope, 'metrics': metrics})
+
+@app.route('/api/requests/<int:request_id>/history')
+def api_request_history(request_id):
+    """Status transitions of one maintenance request, oldest first"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    history = get_request_status_history(request_id)
+    if not history:
+        return jsonify({'success': False, 'message': 'Request not found'}), 404
+    return jsonify({'success': True, 'history': [change.to_dict() for change in history]})
+
+@app.route('/api/costs')
+def api_costs():
+    """Labor cost totals per equipment, category, work center or month, from the cost rollups"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    scope = request.args.get('scope', 'equipment')
+    if scope not in COST_SCOPES:
+        return jsonify({'success': False, 'message': f"scope must be one of: {', '.join(COST_SCOPES)}"}), 400
+    
+    totals = get_cost_totals(scope, request.args.get('start_month'), request.args.get('end_month'))
+    return jsonify({'success': True, 'scope': scope, 'totals': [total.to_dict() for total in totals]})
+
+@app.route('/api/requests/<int:request_id>/costs')
+def api_request_costs(request_id):
+    """Cost ledger entries of one maintenance request, oldest first"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    entries = [entry.to_dict() for entry in get_request_cost_entries(request_id)]
+    return jsonify({'success': True, 'request_id': request_id, 'entries': entries})
 
 @app.route('/teams')
 def teams():
@@ -638,26 +827,23 @@ def reporting():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    # Get all requests for reporting
-    all_requests = get_maintenance_requests_new()
-    stats = get_dashboard_stats_new()
-    equipment = get_all_equipment()
+    stats = get_request_stats()
     
     # Count requests by status
-    new_count = len([r for r in all_requests if r[7] == 'New'])
-    in_progress_count = len([r for r in all_requests if r[7] == 'In Progress'])
-    blocked_count = len([r for r in all_requests if r[7] == 'Blocked'])
-    ready_count = len([r for r in all_requests if r[7] == 'Ready for next stage'])
-    completed_count = len([r for r in all_requests if r[7] == 'Repaired'])
-    scrap_count = len([r for r in all_requests if r[7] == 'Scrap'])
-    total_requests = len(all_requests)
+    new_count = stats['new']
+    in_progress_count = stats['in_progress']
+    blocked_count = stats['blocked']
+    ready_count = stats['ready']
+    completed_count = stats['completed']
+    scrap_count = stats['scrap']
+    total_requests = stats['total_requests']
     
     # Get overdue count
-    overdue_count = stats.get('overdue', 0)
+    overdue_count = stats['overdue']
     
     # Get equipment stats
-    total_equipment = len(equipment)
-    critical_count = get_critical_equipment_count()
+    total_equipment = stats['total_equipment']
+    critical_count = stats['critical_equipment']
     
     return render_template('reporting.html', 
                          active_page='reporting', 
@@ -680,544 +866,146 @@ def generate_report():
     
     data = request.get_json()
     report_type = data.get('report_type')
-    start_date = data.get('start_date')
-    end_date = data.get('end_date')
-    status_filter = data.get('status_filter')
-    export_format = data.get('export_format', 'html')
+    if report_type not in REPORTS:
+        return jsonify({'success': False, 'message': 'Invalid report type'}), 400
+    
+    filters = {key: data.get(key) for key in REPORT_FILTERS}
+    # Representations to return; all of them unless the client asks for fewer
+    include = data.get('include') or REPORT_PARTS
+    if isinstance(include, str):
+        include = include.split(',')
+    if not set(include) <= set(REPORT_PARTS):
+        return jsonify({'success': False, 'message': f"include must be among: {', '.join(REPORT_PARTS)}"}), 400
     
     try:
-        if report_type == 'maintenance_requests':
-            return generate_maintenance_requests_report(start_date, end_date, status_filter, export_format)
-        elif report_type == 'equipment_status':
-            return generate_equipment_status_report(export_format)
-        elif report_type == 'status_summary':
-            return generate_status_summary_report(export_format)
-        elif report_type == 'overdue_requests':
-            return generate_overdue_requests_report(start_date, end_date, export_format)
-        elif report_type == 'technician_performance':
-            return generate_technician_performance_report(start_date, end_date, export_format)
-        elif report_type == 'work_centers':
-            return generate_work_centers_report(export_format)
-        elif report_type == 'equipment_categories':
-            return generate_equipment_categories_report(export_format)
-        else:
-            return jsonify({'success': False, 'message': 'Invalid report type'}), 400
+        report_def = REPORTS[report_type]
+        records = list(report_def.records(filters))
+        
+        response = {'success': True, 'report_title': report_def.title}
+        if 'html_content' in include:
+            response['html_content'] = render_template(f'reports/{report_type}.html', report=report_def,
+                                                       records=records, filters=filters)
+        if 'table_data' in include:
+            response['table_data'] = report_table(report_def, records)
+        if 'csv_content' in include:
+            response['csv_content'] = generate_csv_from_data(report_def, records)
+        return jsonify(response)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
-def generate_maintenance_requests_report(start_date, end_date, status_filter, export_format):
-    """Generate maintenance requests report"""
-    all_requests = get_maintenance_requests_new()
-    
-    # Filter by date range
-    filtered_requests = all_requests
-    if start_date or end_date:
-        filtered_requests = []
-        for req in all_requests:
-            req_date = req[15] if len(req) > 15 else None  # request_date at index 15
-            if req_date:
-                if start_date and req_date < start_date:
-                    continue
-                if end_date and req_date > end_date:
-                    continue
-            filtered_requests.append(req)
-    
-    # Filter by status
-    if status_filter:
-        filtered_requests = [r for r in filtered_requests if r[7] == status_filter]
-    
-    # Generate HTML content
-    html_content = f'''
-    <div style="padding: 20px;">
-        <h3 style="color: #333; margin-bottom: 20px;">Maintenance Requests Report</h3>
-        <p style="color: #666; margin-bottom: 20px;">
-            <strong>Date Range:</strong> {start_date or 'All'} to {end_date or 'All'}<br>
-            <strong>Status Filter:</strong> {status_filter or 'All'}<br>
-            <strong>Total Records:</strong> {len(filtered_requests)}
-        </p>
-        <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead>
-                <tr style="background: #f8f9fa; border-bottom: 2px solid #e0e0e0;">
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">ID</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Subject</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Employee</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Technician</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Status</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Priority</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Request Date</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Scheduled Date</th>
-                </tr>
-            </thead>
-            <tbody>
-    '''
-    
-    table_data = []
-    for req in filtered_requests:
-        table_data.append({
-            'ID': req[0],
-            'Subject': req[1],
-            'Employee': req[2],
-            'Technician': req[3] or 'Unassigned',
-            'Status': req[7],
-            'Priority': req[9],
-            'Request Date': req[15] if len(req) > 15 else 'N/A',
-            'Scheduled Date': req[11] if len(req) > 11 and req[11] else 'N/A'
-        })
-        
-        html_content += f'''
-                <tr style="border-bottom: 1px solid #e0e0e0;">
-                    <td style="padding: 12px;">{req[0]}</td>
-                    <td style="padding: 12px;">{req[1]}</td>
-                    <td style="padding: 12px;">{req[2]}</td>
-                    <td style="padding: 12px;">{req[3] or 'Unassigned'}</td>
-                    <td style="padding: 12px;">{req[7]}</td>
-                    <td style="padding: 12px;">{req[9]}</td>
-                    <td style="padding: 12px;">{req[15] if len(req) > 15 else 'N/A'}</td>
-                    <td style="padding: 12px;">{req[11] if len(req) > 11 and req[11] else 'N/A'}</td>
-                </tr>
-        '''
-    
-    html_content += '''
-            </tbody>
-        </table>
-    </div>
-    '''
-    
-    return jsonify({
-        'success': True,
-        'report_title': 'Maintenance Requests Report',
-        'html_content': html_content,
-        'table_data': table_data,
-        'csv_content': generate_csv_from_data(table_data)
-    })
-
-def generate_equipment_status_report(export_format):
-    """Generate equipment status report"""
-    equipment = get_all_equipment()
-    
-    html_content = f'''
-    <div style="padding: 20px;">
-        <h3 style="color: #333; margin-bottom: 20px;">Equipment Status Report</h3>
-        <p style="color: #666; margin-bottom: 20px;"><strong>Total Equipment:</strong> {len(equipment)}</p>
-        <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead>
-                <tr style="background: #f8f9fa; border-bottom: 2px solid #e0e0e0;">
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">ID</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Name</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Health</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Status</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Created</th>
-                </tr>
-            </thead>
-            <tbody>
-    '''
-    
-    table_data = []
-    for eq in equipment:
-        health = eq[2] if len(eq) > 2 else 100
-        status = eq[3] if len(eq) > 3 else 'active'
-        table_data.append({
-            'ID': eq[0],
-            'Name': eq[1],
-            'Health': f'{health}%',
-            'Status': status,
-            'Created': eq[4] if len(eq) > 4 else 'N/A'
-        })
-        
-        health_color = '#e74c3c' if health < 30 else '#f39c12' if health < 60 else '#2ecc71'
-        html_content += f'''
-                <tr style="border-bottom: 1px solid #e0e0e0;">
-                    <td style="padding: 12px;">{eq[0]}</td>
-                    <td style="padding: 12px;">{eq[1]}</td>
-                    <td style="padding: 12px; color: {health_color}; font-weight: 600;">{health}%</td>
-                    <td style="padding: 12px;">{status}</td>
-                    <td style="padding: 12px;">{eq[4] if len(eq) > 4 else 'N/A'}</td>
-                </tr>
-        '''
-    
-    html_content += '''
-            </tbody>
-        </table>
-    </div>
-    '''
+@app.route('/export-report')
+def export_report_route():
+    """Stream a report as a CSV, NDJSON or HTML download, optionally gzipped"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    return jsonify({
-        'success': True,
-        'report_title': 'Equipment Status Report',
-        'html_content': html_content,
-        'table_data': table_data,
-        'csv_content': generate_csv_from_data(table_data)
-    })
+    report_type = request.args.get('report_type')
+    export_format = request.args.get('format', 'csv')
+    if report_type not in REPORTS:
+        return jsonify({'success': False, 'message': 'Invalid report type'}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    filters = {key: request.args.get(key) or None for key in REPORT_FILTERS}
+    compress = request.args.get('gzip') in ('1', 'true')
+    
+    filename = f'{report_type}_{date.today().isoformat()}.{export_format}'
+    mimetype = EXPORT_FORMATS[export_format]
+    if compress:
+        filename += '.gz'
+        mimetype = 'application/gzip'
+    
+    if export_format == 'html':
+        # A standalone page rendered as the cursor is read, buffered into
+        # chunks of EXPORT_CHUNK_ROWS template events rather than one per cell
+        report_def = REPORTS[report_type]
+        stream = app.jinja_env.get_template('reports/document.html').stream(
+            report_type=report_type, report=report_def, records=report_def.records(filters), filters=filters)
+        stream.enable_buffering(EXPORT_CHUNK_ROWS)
+        chunks = stream_with_context(stream)
+        if compress:
+            chunks = gzip_chunks(chunks)
+    else:
+        chunks = stream_with_context(export_report(report_type, filters, export_format, compress))
+    return Response(chunks, mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
 
-def generate_status_summary_report(export_format):
-    """Generate status summary report"""
-    all_requests = get_maintenance_requests_new()
-    
-    # Count by status
-    status_counts = {}
-    for req in all_requests:
-        status = req[7] if len(req) > 7 else 'Unknown'
-        status_counts[status] = status_counts.get(status, 0) + 1
-    
-    total = len(all_requests)
-    
-    html_content = f'''
-    <div style="padding: 20px;">
-        <h3 style="color: #333; margin-bottom: 20px;">Status Summary Report</h3>
-        <p style="color: #666; margin-bottom: 20px;"><strong>Total Requests:</strong> {total}</p>
-        <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead>
-                <tr style="background: #f8f9fa; border-bottom: 2px solid #e0e0e0;">
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Status</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Count</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Percentage</th>
-                </tr>
-            </thead>
-            <tbody>
-    '''
-    
-    table_data = []
-    for status, count in sorted(status_counts.items()):
-        percentage = (count / total * 100) if total > 0 else 0
-        table_data.append({
-            'Status': status,
-            'Count': count,
-            'Percentage': f'{percentage:.1f}%'
-        })
-        
-        html_content += f'''
-                <tr style="border-bottom: 1px solid #e0e0e0;">
-                    <td style="padding: 12px;"><strong>{status}</strong></td>
-                    <td style="padding: 12px;">{count}</td>
-                    <td style="padding: 12px;">{percentage:.1f}%</td>
-                </tr>
-        '''
-    
-    html_content += '''
-            </tbody>
-        </table>
-    </div>
-    '''
-    
-    return jsonify({
-        'success': True,
-        'report_title': 'Status Summary Report',
-        'html_content': html_content,
-        'table_data': table_data,
-        'csv_content': generate_csv_from_data(table_data)
-    })
+def generate_csv_from_data(report_def, records):
+    """Generate CSV content, quoted by the csv module, from report records"""
+    return ''.join(csv_chunks(report_def, records))
 
-def generate_overdue_requests_report(start_date, end_date, export_format):
-    """Generate overdue requests report"""
-    all_requests = get_maintenance_requests_new()
-    from datetime import datetime
-    
-    overdue_requests = []
-    today = datetime.now().date()
-    
-    for req in all_requests:
-        due_date_str = req[12] if len(req) > 12 else None  # due_date at index 12
-        status = req[7] if len(req) > 7 else 'New'
-        
-        if due_date_str and status in ['New', 'In Progress', 'Blocked', 'Ready for next stage']:
-            try:
-                due_date = datetime.strptime(str(due_date_str), '%Y-%m-%d').date()
-                if due_date < today:
-                    overdue_requests.append(req)
-            except:
-                pass
-    
-    html_content = f'''
-    <div style="padding: 20px;">
-        <h3 style="color: #333; margin-bottom: 20px;">Overdue Requests Report</h3>
-        <p style="color: #666; margin-bottom: 20px;"><strong>Total Overdue:</strong> {len(overdue_requests)}</p>
-        <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead>
-                <tr style="background: #f8f9fa; border-bottom: 2px solid #e0e0e0;">
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">ID</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Subject</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Employee</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Due Date</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Status</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Priority</th>
-                </tr>
-            </thead>
-            <tbody>
-    '''
-    
-    table_data = []
-    for req in overdue_requests:
-        table_data.append({
-            'ID': req[0],
-            'Subject': req[1],
-            'Employee': req[2],
-            'Due Date': req[12] if len(req) > 12 else 'N/A',
-            'Status': req[7],
-            'Priority': req[9]
-        })
-        
-        html_content += f'''
-                <tr style="border-bottom: 1px solid #e0e0e0;">
-                    <td style="padding: 12px;">{req[0]}</td>
-                    <td style="padding: 12px;">{req[1]}</td>
-                    <td style="padding: 12px;">{req[2]}</td>
-                    <td style="padding: 12px; color: #e74c3c; font-weight: 600;">{req[12] if len(req) > 12 else 'N/A'}</td>
-                    <td style="padding: 12px;">{req[7]}</td>
-                    <td style="padding: 12px;">{req[9]}</td>
-                </tr>
-        '''
-    
-    html_content += '''
-            </tbody>
-        </table>
-    </div>
-    '''
-    
-    return jsonify({
-        'success': True,
-        'report_title': 'Overdue Requests Report',
-        'html_content': html_content,
-        'table_data': table_data,
-        'csv_content': generate_csv_from_data(table_data)
-    })
+# ==================== REPORT JOBS ====================
 
-def generate_technician_performance_report(start_date, end_date, export_format):
-    """Generate technician performance report"""
-    all_requests = get_maintenance_requests_new()
-    
-    # Group by technician
-    technician_stats = {}
-    for req in all_requests:
-        technician = req[3] if len(req) > 3 and req[3] else 'Unassigned'
-        status = req[7] if len(req) > 7 else 'New'
-        
-        if technician not in technician_stats:
-            technician_stats[technician] = {
-                'total': 0,
-                'completed': 0,
-                'in_progress': 0,
-                'new': 0
-            }
-        
-        technician_stats[technician]['total'] += 1
-        if status == 'Repaired':
-            technician_stats[technician]['completed'] += 1
-        elif status == 'In Progress':
-            technician_stats[technician]['in_progress'] += 1
-        elif status == 'New':
-            technician_stats[technician]['new'] += 1
-    
-    html_content = f'''
-    <div style="padding: 20px;">
-        <h3 style="color: #333; margin-bottom: 20px;">Technician Performance Report</h3>
-        <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead>
-                <tr style="background: #f8f9fa; border-bottom: 2px solid #e0e0e0;">
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Technician</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Total Requests</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Completed</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">In Progress</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">New</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Completion Rate</th>
-                </tr>
-            </thead>
-            <tbody>
-    '''
-    
-    table_data = []
-    for tech, stats in sorted(technician_stats.items()):
-        completion_rate = (stats['completed'] / stats['total'] * 100) if stats['total'] > 0 else 0
-        table_data.append({
-            'Technician': tech,
-            'Total Requests': stats['total'],
-            'Completed': stats['completed'],
-            'In Progress': stats['in_progress'],
-            'New': stats['new'],
-            'Completion Rate': f'{completion_rate:.1f}%'
-        })
-        
-        html_content += f'''
-                <tr style="border-bottom: 1px solid #e0e0e0;">
-                    <td style="padding: 12px;"><strong>{tech}</strong></td>
-                    <td style="padding: 12px;">{stats['total']}</td>
-                    <td style="padding: 12px; color: #2ecc71;">{stats['completed']}</td>
-                    <td style="padding: 12px; color: #f39c12;">{stats['in_progress']}</td>
-                    <td style="padding: 12px; color: #3498db;">{stats['new']}</td>
-                    <td style="padding: 12px; font-weight: 600;">{completion_rate:.1f}%</td>
-                </tr>
-        '''
-    
-    html_content += '''
-            </tbody>
-        </table>
-    </div>
-    '''
+@app.route('/report-jobs', methods=['POST'])
+def submit_report_job_route():
+    """Queue a report, or a pack of several report types, to run in the background"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    return jsonify({
-        'success': True,
-        'report_title': 'Technician Performance Report',
-        'html_content': html_content,
-        'table_data': table_data,
-        'csv_content': generate_csv_from_data(table_data)
-    })
+    data = request.get_json() or {}
+    report_types = data.get('report_types') or [data.get('report_type')]
+    success, message, job = submit_report_job(session['user_id'], report_types, data,
+                                              data.get('format', 'csv'), bool(data.get('gzip')))
+    if not success:
+        return jsonify({'success': False, 'message': message}), 400
+    return jsonify({'success': True, 'message': message, **job_status(job)}), 202
 
-def generate_work_centers_report(export_format):
-    """Generate work centers report"""
-    work_centers = get_all_work_centers()
-    
-    html_content = f'''
-    <div style="padding: 20px;">
-        <h3 style="color: #333; margin-bottom: 20px;">Work Centers Report</h3>
-        <p style="color: #666; margin-bottom: 20px;"><strong>Total Work Centers:</strong> {len(work_centers)}</p>
-        <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead>
-                <tr style="background: #f8f9fa; border-bottom: 2px solid #e0e0e0;">
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Name</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Code</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Cost per hour</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Capacity Time Efficiency</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">OEE Target</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Company</th>
-                </tr>
-            </thead>
-            <tbody>
-    '''
-    
-    table_data = []
-    for wc in work_centers:
-        table_data.append({
-            'Name': wc[1],
-            'Code': wc[2] or '',
-            'Cost per hour': wc[5] if wc[5] else 0,
-            'Capacity Time Efficiency': wc[6] if wc[6] else 100,
-            'OEE Target': wc[7] if wc[7] else 0,
-            'Company': wc[8] or 'My company'
-        })
-        
-        html_content += f'''
-                <tr style="border-bottom: 1px solid #e0e0e0;">
-                    <td style="padding: 12px;"><strong>{wc[1]}</strong></td>
-                    <td style="padding: 12px;">{wc[2] or '-'}</td>
-                    <td style="padding: 12px;">{wc[5] if wc[5] else 0:.2f}</td>
-                    <td style="padding: 12px;">{wc[6] if wc[6] else 100:.2f}</td>
-                    <td style="padding: 12px;">{wc[7] if wc[7] else 0:.2f}</td>
-                    <td style="padding: 12px;">{wc[8] or 'My company'}</td>
-                </tr>
-        '''
-    
-    html_content += '''
-            </tbody>
-        </table>
-    </div>
-    '''
+@app.route('/report-jobs/<job_id>')
+def report_job_status_route(job_id):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    return jsonify({
-        'success': True,
-        'report_title': 'Work Centers Report',
-        'html_content': html_content,
-        'table_data': table_data,
-        'csv_content': generate_csv_from_data(table_data)
-    })
+    job = get_report_job(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    return jsonify({'success': True, **job_status(job)})
 
-def generate_equipment_categories_report(export_format):
-    """Generate equipment categories report"""
-    categories = get_all_equipment_categories()
-    
-    html_content = f'''
-    <div style="padding: 20px;">
-        <h3 style="color: #333; margin-bottom: 20px;">Equipment Categories Report</h3>
-        <p style="color: #666; margin-bottom: 20px;"><strong>Total Categories:</strong> {len(categories)}</p>
-        <table style="width: 100%; border-collapse: collapse; margin-top: 20px;">
-            <thead>
-                <tr style="background: #f8f9fa; border-bottom: 2px solid #e0e0e0;">
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Name</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Responsible</th>
-                    <th style="padding: 12px; text-align: left; font-weight: 600; color: #333;">Company</th>
-                </tr>
-            </thead>
-            <tbody>
-    '''
-    
-    table_data = []
-    for cat in categories:
-        table_data.append({
-            'Name': cat[1],
-            'Responsible': cat[2] or '',
-            'Company': cat[3] or 'My company'
-        })
-        
-        html_content += f'''
-                <tr style="border-bottom: 1px solid #e0e0e0;">
-                    <td style="padding: 12px;"><strong>{cat[1]}</strong></td>
-                    <td style="padding: 12px;">{cat[2] or '-'}</td>
-                    <td style="padding: 12px;">{cat[3] or 'My company'}</td>
-                </tr>
-        '''
-    
-    html_content += '''
-            </tbody>
-        </table>
-    </div>
-    '''
+@app.route('/report-jobs/<job_id>/events')
+def report_job_events_route(job_id):
+    """Stream a job's progress as server-sent events until it finishes"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    return jsonify({
-        'success': True,
-        'report_title': 'Equipment Categories Report',
-        'html_content': html_content,
-        'table_data': table_data,
-        'csv_content': generate_csv_from_data(table_data)
-    })
+    job = get_report_job(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    
+    def events():
+        # Each stream holds a server thread, so it ends after
+        # REPORT_JOB_EVENT_MAX_SECONDS; EventSource clients reconnect after
+        # the retry delay and get the current status first
+        deadline = time.monotonic() + REPORT_JOB_EVENT_MAX_SECONDS
+        yield f'retry: {REPORT_JOB_EVENT_RETRY_MS}\n\n'
+        last = None
+        while True:
+            status = job_status(job)
+            if status != last:
+                yield f'data: {json.dumps(status)}\n\n'
+                last = status
+            if status['status'] in ('done', 'failed') or time.monotonic() >= deadline:
+                break
+            time.sleep(REPORT_JOB_EVENT_INTERVAL)
+    
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
 
-def generate_csv_from_data(table_data):
-    """Generate CSV content from table data"""
-    if not table_data:
-        return ''
-    
-    # Header
-    csv_lines = [','.join(table_data[0].keys())]
-    
-    # Rows
-    for row in table_data:
-        csv_lines.append(','.join([str(v) for v in row.values()]))
+@app.route('/report-jobs/<job_id>/download')
+def report_job_download_route(job_id):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
-    return '\n'.join(csv_lines)
+    job = get_report_job(job_id, session['user_id'])
+    if job is None:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'success': False, 'message': f"Job is {job['status']}"}), 409
+    return send_file(job['path'], as_attachment=True, download_name=job['filename'])
 
 @app.route('/calendar')
 def calendar_page():
     if 'user_id' not in session:
         return redirect(url_for('login'))
     
-    # Get all maintenance requests with scheduled dates
-    all_requests = get_maintenance_requests_new()
-    
-    # Filter requests that have scheduled_date
-    scheduled_requests = []
-    for req in all_requests:
-        if len(req) > 11 and req[11]:  # scheduled_date at index 11
-            scheduled_requests.append({
-                'id': req[0],
-                'subject': req[1],
-                'employee': req[2],
-                'technician': req[3],
-                'scheduled_date': req[11],
-                'due_date': req[12] if len(req) > 12 else None,
-                'status': req[7] if len(req) > 7 else 'New',
-                'priority': req[9] if len(req) > 9 else 'Medium',
-                'equipment_name': req[19] if len(req) > 19 else None
-            })
-    
-    # Get current date info
-    from datetime import datetime, timedelta
-    today = datetime.now()
-    current_week_start = today - timedelta(days=today.weekday())
-    
-    return render_template('calendar.html', 
-                         active_page='calendar',
-                         user=session.get('email'),
-                         scheduled_requests=scheduled_requests,
-                         current_date=today.strftime('%Y-%m-%d'),
-                         current_time=today.strftime('%H:%M'),
-                         week_start=current_week_start.strftime('%Y-%m-%d'))
+    return render_calendar('calendar')
 
 @app.route('/settings')
 def settings_page():
@@ -1232,7 +1020,7 @@ def get_worksheet_comments_route(request_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 401
     
     comments = get_worksheet_comments(request_id)
-    return jsonify({'success': True, 'comments': comments})
+    return jsonify({'success': True, 'comments': [comment.to_dict() for comment in comments]})
 
 @app.route('/add-worksheet-comment', methods=['POST'])
 def add_worksheet_comment_route():
@@ -1265,6 +1053,60 @@ def work_centers():
                          user=session.get('email'),
                          work_centers=work_centers_list)
 
+@app.route('/api/work-centers/capacity')
+def api_work_center_capacity():
+    """Booked vs available hours per work center in [start, end), this week by default"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    if 'start' in request.args or 'end' in request.args:
+        start = parse_request_datetime(request.args.get('start'))
+        end = parse_request_datetime(request.args.get('end'))
+        if start is None or end is None:
+            return jsonify({'success': False, 'message': 'start and end must be ISO dates or datetimes'}), 400
+        if not start < end <= start + timedelta(days=CAPACITY_MAX_DAYS):
+            return jsonify({'success': False,
+                            'message': f'end must be after start and at most {CAPACITY_MAX_DAYS} days later'}), 400
+    else:
+        # Stored times are UTC, so the default week is the current UTC week
+        today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=7)
+    
+    loads = [load.to_dict() for load in get_work_center_loads(start, end)]
+    return jsonify({'success': True, 'start': start.isoformat(), 'end': end.isoformat(), 'work_centers': loads})
+
+@app.route('/api/oee')
+def api_oee():
+    """Downtime, availability and OEE per work center or equipment per day, week or month"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    
+    scope = request.args.get('scope', 'work_center')
+    period = request.args.get('period', 'day')
+    if scope not in DOWNTIME_SCOPES:
+        return jsonify({'success': False, 'message': f"scope must be one of: {', '.join(DOWNTIME_SCOPES)}"}), 400
+    if period not in OEE_PERIODS:
+        return jsonify({'success': False, 'message': f"period must be one of: {', '.join(OEE_PERIODS)}"}), 400
+    group_id = request.args.get('group_id', type=int)
+    
+    if 'start' in request.args or 'end' in request.args:
+        start = parse_request_datetime(request.args.get('start'))
+        end = parse_request_datetime(request.args.get('end'))
+        if start is None or end is None:
+            return jsonify({'success': False, 'message': 'start and end must be ISO dates'}), 400
+        start, end = start.date(), end.date()
+        if not start < end <= start + timedelta(days=OEE_MAX_DAYS):
+            return jsonify({'success': False,
+                            'message': f'end must be after start and at most {OEE_MAX_DAYS} days later'}), 400
+    else:
+        end = date.today() + timedelta(days=1)
+        start = end - timedelta(days=30)
+    
+    points = [point.to_dict() for point in get_oee_series(scope, period, start, end, group_id)]
+    return jsonify({'success': True, 'scope': scope, 'period': period, 'start': start.isoformat(),
+                    'end': end.isoformat(), 'points': points})
+
 @app.route('/equipment-categories')
 def equipment_categories():
     if 'user_id' not in session:
@@ -1327,7 +1169,54 @@ def create_equipment_category_route():
 
 @app.route('/health')
 def health():
-    return {'status': 'healthy'}
+    return {'status': 'healthy', 'db_pool': get_pool_stats(), 'reference_cache': get_cache_stats()}
+
+@app.route('/metrics')
+def metrics():
+    """Request, database and cache metrics of this worker in the Prometheus text format"""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/admin/sql-trace', methods=['GET', 'POST'])
+def admin_sql_trace():
+    """Show the SQL tracer settings and latest slow queries; POST {"enabled": bool} toggles tracing"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    if not is_admin():
+        return jsonify({'success': False, 'message': 'Admin role required'}), 403
+    
+    if request.method == 'POST':
+        enabled = (request.get_json(silent=True) or {}).get('enabled')
+        if not isinstance(enabled, bool):
+            return jsonify({'success': False, 'message': 'enabled must be true or false'}), 400
+        sql_trace.set_enabled(enabled)
+    
+    return jsonify({
+        'success': True,
+        'enabled': sql_trace.enabled,
+        'slow_query_ms': sql_trace.SLOW_QUERY_MS,
+        'repeated_query_threshold': sql_trace.REPEATED_QUERY_THRESHOLD,
+        'slow_queries': sql_trace.get_slow_queries(),
+    })
+
+@app.route('/admin/profiles')
+def admin_profiles():
+    """List the request profiles written by ?profile=cpu|alloc, newest first"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    if not is_admin():
+        return jsonify({'success': False, 'message': 'Admin role required'}), 403
+    
+    return jsonify({'success': True, 'profiles': list_profiles()})
+
+@app.route('/admin/profiles/<name>')
+def admin_profile_download(name):
+    """Download one request profile file"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    if not is_admin():
+        return jsonify({'success': False, 'message': 'Admin role required'}), 403
+    
+    return send_from_directory(os.path.abspath(PROFILES_DIR), name, as_attachment=True, mimetype='text/plain')
 
 def validate_password(password):
     """Validate password according to requirements"""
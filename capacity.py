@@ -0,0 +1,111 @@
+"""
+Work center capacity planning for GearGuard.
+
+The scheduled requests of each work center are indexed as two sorted arrays,
+job starts and job ends, each with running sums. The busy time booked before
+an instant t is
+
+    B(t) = sum(t - s for starts s < t) - sum(t - e for ends e < t)
+
+which takes two binary searches and two running-sum lookups. The hours
+booked in any window [a, b) are then B(b) - B(a) in O(log n), however many
+jobs overlap the window. The index lives in this process and is rebuilt
+only after a trigger has bumped the work_center_bookings cache version,
+that is, after a booking may have changed.
+"""
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+
+from database import (
+    REQUESTS_DB, WORK_CENTER_BOOKINGS_TAG, get_all_work_centers, get_cache_version, get_work_center_bookings,
+    to_epoch
+)
+from models import WorkCenterLoad, SaturatedSlot
+
+# Hours a work center runs per day at 100% capacity time efficiency
+WORK_CENTER_HOURS_PER_DAY = float(os.environ.get('GEARGUARD_WORK_CENTER_HOURS_PER_DAY', '8'))
+
+# Length of the slots checked for saturation, and the widest window served
+CAPACITY_SLOT_SECONDS = 24 * 60 * 60
+CAPACITY_MAX_DAYS = 366
+
+_index_lock = threading.Lock()
+_index = None  # (cache version, {work_center_id: BookingIndex})
+
+
+class BookingIndex:
+    """Bookings of one work center, answering booked seconds for any window"""
+
+    def __init__(self, intervals):
+        self.starts = array('q', sorted(start for start, _ in intervals))
+        self.ends = array('q', sorted(end for _, end in intervals))
+        self.start_sums = array('q', accumulate(self.starts, initial=0))
+        self.end_sums = array('q', accumulate(self.ends, initial=0))
+
+    def __len__(self):
+        return len(self.starts)
+
+    def busy_before(self, t):
+        """Get the booked seconds before instant t"""
+        started = bisect_left(self.starts, t)
+        ended = bisect_left(self.ends, t)
+        return (started * t - self.start_sums[started]) - (ended * t - self.end_sums[ended])
+
+    def booked_seconds(self, start, end):
+        """Get the booked seconds in [start, end); overlapping jobs each count"""
+        return self.busy_before(end) - self.busy_before(start)
+
+
+def get_booking_indexes():
+    """Get {work_center_id: BookingIndex}, rebuilt when the bookings have changed"""
+    global _index
+    version = get_cache_version(REQUESTS_DB, WORK_CENTER_BOOKINGS_TAG)
+    with _index_lock:
+        if _index is not None and _index[0] == version:
+            return _index[1]
+
+    # Version read before loading: a concurrent write only makes this stale
+    intervals = {}
+    for work_center_id, start, end in get_work_center_bookings():
+        intervals.setdefault(work_center_id, []).append((start, end))
+    indexes = {work_center_id: BookingIndex(booked) for work_center_id, booked in intervals.items()}
+    with _index_lock:
+        _index = (version, indexes)
+    return indexes
+
+
+def available_seconds(work_center, seconds):
+    """Get the seconds a work center can work during `seconds` of calendar time"""
+    efficiency = work_center.capacity_time_efficiency
+    efficiency = 100 if efficiency is None else efficiency
+    return seconds * WORK_CENTER_HOURS_PER_DAY / 24 * efficiency / 100
+
+
+def work_center_load(work_center, index, start, end, slot_seconds=CAPACITY_SLOT_SECONDS):
+    """Get the WorkCenterLoad of one work center in [start, end) epoch seconds"""
+    booked = index.booked_seconds(start, end) if index else 0
+    available = available_seconds(work_center, end - start)
+
+    saturated = []
+    if index:
+        for slot_start in range(start, end, slot_seconds):
+            slot_end = min(slot_start + slot_seconds, end)
+            slot_booked = index.booked_seconds(slot_start, slot_end)
+            slot_available = available_seconds(work_center, slot_end - slot_start)
+            if slot_booked and slot_booked >= slot_available:
+                saturated.append(SaturatedSlot(slot_start, slot_end, round(slot_booked / 3600, 2),
+                                               round(slot_available / 3600, 2)))
+
+    return WorkCenterLoad(work_center.id, work_center.name, round(booked / 3600, 2), round(available / 3600, 2),
+                          round(booked / available * 100, 1) if available else None, saturated)
+
+
+def get_work_center_loads(start, end, slot_seconds=CAPACITY_SLOT_SECONDS):
+    """Get the WorkCenterLoad of every work center in [start, end) (naive UTC datetimes)"""
+    start, end = to_epoch(start), to_epoch(end)
+    indexes = get_booking_indexes()
+    return [work_center_load(work_center, indexes.get(work_center.id), start, end, slot_seconds)
+            for work_center in get_all_work_centers()]
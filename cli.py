@@ -0,0 +1,149 @@
+"""
+GearGuard maintenance commands, registered on the Flask CLI as `flask gearguard ...`.
+"""
+import click
+from flask.cli import AppGroup
+
+from migrations import DATABASES, get_schema_status, migrate
+
+gearguard_cli = AppGroup('gearguard', help='GearGuard database and maintenance commands.')
+
+
+@gearguard_cli.command('migrate')
+@click.option('--database', 'db_path', type=click.Choice(DATABASES), default=None,
+              help='Only migrate this database file.')
+@click.option('--target', type=int, default=None,
+              help='Stop at this schema version (requires --database).')
+def migrate_command(db_path, target):
+    """Apply pending schema migrations."""
+    if target is not None and db_path is None:
+        raise click.UsageError('--target requires --database')
+
+    for path in ([db_path] if db_path else DATABASES):
+        applied = migrate(path, target=target)
+        if not applied:
+            click.echo(f"'{path}' is up to date")
+
+
+@gearguard_cli.command('schema-status')
+def schema_status_command():
+    """Show the schema version of every database."""
+    for db_path, (current, latest) in get_schema_status().items():
+        state = 'up to date' if current >= latest else f'{latest - current} pending'
+        click.echo(f'{db_path}: version {current} of {latest} ({state})')
+
+
+@gearguard_cli.command('rollups')
+@click.option('--rebuild', is_flag=True, help='Recompute the rollup tables from scratch.')
+def rollups_command(rebuild):
+    """Check the request, reliability and cost rollups against a full recount."""
+    from database import repair_request_rollups, verify_request_rollups
+
+    if rebuild:
+        success, message = repair_request_rollups()
+        click.echo(message)
+        if not success:
+            raise click.exceptions.Exit(1)
+
+    drift = verify_request_rollups()
+    for table, mismatches in drift.items():
+        click.echo(f'{table}: {len(mismatches)} drifted keys')
+        for key, stored, actual in mismatches[:20]:
+            click.echo(f'    {key}: stored {stored}, actual {actual}')
+    if drift:
+        click.echo('Run `flask gearguard rollups --rebuild` to repair them.')
+        raise click.exceptions.Exit(1)
+    click.echo('All request rollups match a full recount')
+
+
+@gearguard_cli.command('search-index')
+@click.option('--rebuild', is_flag=True, help='Rebuild the full-text indexes from their tables.')
+def search_index_command(rebuild):
+    """Check the full-text search indexes against their tables."""
+    from database import check_search_indexes, rebuild_search_indexes
+
+    if rebuild:
+        success, message = rebuild_search_indexes()
+        click.echo(message)
+        if not success:
+            raise click.exceptions.Exit(1)
+
+    success, message = check_search_indexes()
+    click.echo(message)
+    if not success:
+        raise click.exceptions.Exit(1)
+
+
+@gearguard_cli.command('index-advisor')
+@click.option('--all', 'show_all', is_flag=True, help='Also list queries without issues.')
+@click.option('--benchmark', 'run_benchmark', is_flag=True,
+              help='Time the hot queries before and after the index migrations.')
+@click.option('--rows', type=int, default=100_000, show_default=True,
+              help='Synthetic requests to generate for the benchmark.')
+def index_advisor_command(show_all, run_benchmark, rows):
+    """Explain every query in database.py and flag full table scans."""
+    from index_advisor import advise, benchmark
+
+    flagged = 0
+    for finding in advise():
+        if not finding['issues'] and not show_all:
+            continue
+        flagged += bool(finding['issues'])
+        click.echo(f"{finding['function']} [{finding['database']}]")
+        click.echo(f"  {finding['sql'][:160]}")
+        for detail in finding['plan']:
+            click.echo(f'    plan: {detail}')
+        for issue in finding['issues']:
+            click.echo(f'    ! {issue}')
+    click.echo(f'{flagged} queries flagged')
+
+    if run_benchmark:
+        click.echo(f'\nBenchmark with {rows} requests (best of 5, ms):')
+        click.echo(f"{'query':<30} {'before':>10} {'after':>10} {'speedup':>9}")
+        for name, before, after in benchmark(rows):
+            click.echo(f'{name:<30} {before:>10.2f} {after:>10.2f} {before / max(after, 1e-6):>8.1f}x')
+
+
+@gearguard_cli.command('analytics-benchmark')
+@click.option('--rows', 'sizes', type=int, multiple=True,
+              help='Synthetic request counts to load and aggregate (repeatable). Default: 100k, 1M and 5M.')
+def analytics_benchmark_command(sizes):
+    """Time loading and aggregating the request analytics columns, on synthetic data and requests.db."""
+    from analytics import benchmark
+
+    click.echo(f"{'source':<12} {'rows':>10} {'backend':<8} {'load s':>9} {'agg s':>9} {'total s':>9} {'rows/s':>12}")
+    for source, rows, backend, load, aggregate in benchmark(sizes or (100_000, 1_000_000, 5_000_000)):
+        total = load + aggregate
+        click.echo(f'{source:<12} {rows:>10} {backend:<8} {load:>9.3f} {aggregate:>9.3f} {total:>9.3f} '
+                   f'{rows / max(total, 1e-9):>12,.0f}')
+
+
+@gearguard_cli.command('schedule-benchmark')
+@click.option('--jobs', 'sizes', type=int, multiple=True,
+              help='Synthetic jobs in one week (repeatable). Default: 10k and 50k.')
+def schedule_benchmark_command(sizes):
+    """Time lane packing and conflict detection on synthetic schedules."""
+    from schedule import benchmark
+
+    click.echo(f"{'jobs':>10} {'seconds':>9} {'jobs/s':>12}")
+    for jobs, seconds in benchmark(sizes or (10_000, 50_000)):
+        click.echo(f'{jobs:>10} {seconds:>9.3f} {jobs / seconds:>12,.0f}')
+
+
+@gearguard_cli.command('downtime')
+@click.option('--rebuild', is_flag=True, help='Recompute the daily downtime of every group, not only the changed ones.')
+def downtime_command(rebuild):
+    """Bring the daily downtime used by the OEE series up to date."""
+    import time
+    from database import mark_all_downtime_dirty
+    from oee import refresh_downtime
+
+    if rebuild:
+        success, message = mark_all_downtime_dirty()
+        click.echo(message)
+        if not success:
+            raise click.exceptions.Exit(1)
+
+    started = time.perf_counter()
+    refreshed = refresh_downtime()
+    click.echo(f'Refreshed the downtime of {refreshed} groups in {time.perf_counter() - started:.2f}s')
@@ -1,30 +1,361 @@
+import os
+import re
+import html
+import json
+import base64
 import sqlite3
 import hashlib
-from datetime import datetime
+import threading
+import time
+from functools import wraps
+from datetime import datetime, timezone
+
+import sql_trace
+from models import (
+    MaintenanceRequest, Equipment, WorkCenter, EquipmentCategory, WorksheetComment, TechnicianPerformance,
+    StatusChange, ReliabilityMetrics, StageTime, ScheduledJob, CostEntry, CostTotal, select_columns
+)
 
 # Database file names
 AUTH_DB = 'auth.db'
 EQUIPMENT_DB = 'equipment.db'
 REQUESTS_DB = 'requests.db'
 
+# Statuses of requests that still need work. OPEN_STATUS_FILTER is also the
+# WHERE clause of the partial open-request index, so queries must use it verbatim.
+# Migration 10 wrote that predicate out when creating the index: changing the
+# statuses here needs a new migration recreating idx_requests_open_due_date.
+OPEN_STATUSES = ('New', 'In Progress', 'Blocked', 'Ready for next stage')
+OPEN_STATUS_FILTER = "status IN ('New', 'In Progress', 'Blocked', 'Ready for next stage')"
+# Open requests due before today. Queries pin idx_requests_open_due_date with
+# INDEXED BY: without ANALYZE statistics the planner prefers the status index.
+OVERDUE_FILTER = f"{OPEN_STATUS_FILTER} AND due_at < CAST(strftime('%s', 'now', 'start of day') AS INTEGER)"
+
+# ==================== CONNECTION POOL ====================
+
+# PRAGMAs applied once when a pooled connection is opened
+CONNECTION_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('busy_timeout', 5000),
+    ('mmap_size', 64 * 1024 * 1024),
+    ('cache_size', -16000),  # negative value = size in KiB
+    ('temp_store', 'MEMORY'),
+)
+
+# Number of compiled statements each connection keeps in its statement cache
+STATEMENT_CACHE_SIZE = 256
+
+# Databases ATTACHed to pooled connections so queries can join across files
+ATTACHED_DATABASES = {
+    REQUESTS_DB: (('equipment_db', EQUIPMENT_DB),),
+}
+
+# Idle connections kept per database once returned to the pool; the rest are closed
+POOL_MAX_IDLE = int(os.environ.get('GEARGUARD_POOL_MAX_IDLE', '8'))
+
+_pool = threading.local()  # .connections: db_path -> checked out connection, .depth: db_path -> open checkouts
+_idle_lock = threading.Lock()
+_idle = {}  # db_path -> idle connections, shared by every thread of this process
+_idle_pid = None
+_pool_stats_lock = threading.Lock()
+_pool_stats = {}
+
+# Statements run and seconds spent in SQLite: per database for this process,
+# and per thread between start_query_stats() and stop_query_stats() (one web
+# request). Time covers execute and fetch calls. Executed statements are also
+# passed to sql_trace while SQL tracing is on.
+_query_totals_lock = threading.Lock()
+_query_totals = {}  # db_path -> [queries, seconds]
+_query_stats = threading.local()
+
+
+def _record_query(db_path, queries, seconds):
+    current = getattr(_query_stats, 'current', None)
+    if current is not None:
+        current[0] += queries
+        current[1] += seconds
+    with _query_totals_lock:
+        totals = _query_totals.setdefault(db_path, [0, 0.0])
+        totals[0] += queries
+        totals[1] += seconds
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor timing its statements and fetches into the query statistics"""
+
+    def _timed(self, sql, parameters, method, *args):
+        """Run method(self, *args) and record its time; sql is None for fetches.
+
+        parameters is what EXPLAIN needs to plan sql: None for executemany
+        and scripts.
+        """
+        started = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            seconds = time.perf_counter() - started
+            _record_query(self.connection.db_path, 0 if sql is None else 1, seconds)
+            if sql is not None and sql_trace.enabled:
+                sql_trace.record_statement(self.connection, sql, parameters, seconds)
+
+    def execute(self, sql, parameters=()):
+        return self._timed(sql, parameters, sqlite3.Cursor.execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._timed(sql, None, sqlite3.Cursor.executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._timed(sql_script, None, sqlite3.Cursor.executescript, sql_script)
+
+    def fetchone(self):
+        return self._timed(None, None, sqlite3.Cursor.fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed(None, None, sqlite3.Cursor.fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed(None, None, sqlite3.Cursor.fetchall)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors, including those of its execute shortcuts, are InstrumentedCursors"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def start_query_stats():
+    """Start counting the calling thread's queries"""
+    _query_stats.current = [0, 0.0]
+
+
+def stop_query_stats():
+    """Stop counting the calling thread's queries; returns (queries, seconds) since start_query_stats()"""
+    current = getattr(_query_stats, 'current', None)
+    _query_stats.current = None
+    return tuple(current) if current is not None else (0, 0.0)
+
+
+def get_query_totals():
+    """Get {db_path: (queries, seconds)} of every query run by this process"""
+    with _query_totals_lock:
+        return {db_path: tuple(totals) for db_path, totals in _query_totals.items()}
+
+
+def _open_connection(db_path):
+    """Open a new connection and apply the tuned PRAGMAs"""
+    # Pooled connections move between threads, but only one thread holds each at a time
+    conn = sqlite3.connect(db_path, cached_statements=STATEMENT_CACHE_SIZE, factory=InstrumentedConnection,
+                           check_same_thread=False)
+    conn.db_path = db_path
+    conn.trace_generation = None
+    for name, value in CONNECTION_PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    for schema, attached_path in ATTACHED_DATABASES.get(db_path, ()):
+        conn.execute('ATTACH DATABASE ? AS ' + schema, (attached_path,))
+    return conn
+
+
+def _record_pool_event(db_path, *events):
+    with _pool_stats_lock:
+        stats = _pool_stats.setdefault(db_path, {'opened': 0, 'checkouts': 0, 'reused': 0, 'rollbacks': 0,
+                                                 'closed': 0})
+        for event in events:
+            stats[event] += 1
+
+
+def _thread_pool():
+    """Get the calling thread's checkouts, dropping state inherited across a fork"""
+    global _idle, _idle_pid
+    pid = os.getpid()
+    if _idle_pid != pid:
+        with _idle_lock:
+            if _idle_pid != pid:
+                _idle, _idle_pid = {}, pid
+    if getattr(_pool, 'pid', None) != pid:
+        _pool.pid = pid
+        _pool.connections = {}
+        _pool.depth = {}
+    return _pool
+
+
+def get_connection(db_path):
+    """Check out a pooled connection to db_path.
+
+    Connections are shared by every thread of the process: a checkout takes
+    an idle one (opening a new one only when none is idle) and
+    release_connection() hands it back, so short-lived request threads keep
+    the PRAGMAs, ATTACHes and statement cache of earlier requests. Nested
+    checkouts of the same database in one thread get the same connection,
+    returned to the pool when the outermost checkout is released.
+    """
+    pool = _thread_pool()
+    conn = pool.connections.get(db_path)
+    if conn is not None:
+        pool.depth[db_path] += 1
+        _record_pool_event(db_path, 'reused', 'checkouts')
+        return conn
+
+    with _idle_lock:
+        idle = _idle.get(db_path)
+        conn = idle.pop() if idle else None
+    if conn is None:
+        conn = _open_connection(db_path)
+        _record_pool_event(db_path, 'opened', 'checkouts')
+    else:
+        _record_pool_event(db_path, 'reused', 'checkouts')
+    if conn.trace_generation != sql_trace.generation:
+        sql_trace.apply(conn)
+    pool.connections[db_path] = conn
+    pool.depth[db_path] = 1
+    return conn
+
+
+def _return_to_pool(conn):
+    """Put a connection no thread holds back in the idle pool, or close it when the pool is full"""
+    if conn.in_transaction:
+        conn.rollback()
+        _record_pool_event(conn.db_path, 'rollbacks')
+    with _idle_lock:
+        idle = _idle.setdefault(conn.db_path, [])
+        if len(idle) < POOL_MAX_IDLE:
+            idle.append(conn)
+            return
+    conn.close()
+    _record_pool_event(conn.db_path, 'closed')
+
+
+def release_connection(conn):
+    """Release a checkout, rolling back anything left uncommitted"""
+    pool = _thread_pool()
+    db_path = getattr(conn, 'db_path', None)
+    if db_path is None or pool.connections.get(db_path) is not conn:
+        # Not pooled (opened by the caller) or already released: only drop its transaction
+        if conn.in_transaction:
+            conn.rollback()
+        return
+    pool.depth[db_path] -= 1
+    if pool.depth[db_path] > 0:
+        if conn.in_transaction:
+            conn.rollback()
+            _record_pool_event(db_path, 'rollbacks')
+        return
+    del pool.connections[db_path], pool.depth[db_path]
+    _return_to_pool(conn)
+
+
+def release_thread_connections():
+    """Return every connection the calling thread still has checked out to the pool.
+
+    Called when a request ends, so a checkout a code path never released is
+    not lost with the request thread.
+    """
+    pool = _thread_pool()
+    connections = list(pool.connections.values())
+    pool.connections.clear()
+    pool.depth.clear()
+    for conn in connections:
+        _return_to_pool(conn)
+
+
+def get_pool_stats():
+    """Get per-database connection pool statistics for this process"""
+    with _pool_stats_lock:
+        return {db_path: dict(stats) for db_path, stats in _pool_stats.items()}
+
+# ==================== REFERENCE DATA CACHE ====================
+
+# Reference tables cached in-process, and the database holding each. Triggers
+# bump the table's row in that database's cache_versions table on every write
+# (see migrations.py), so a cached value is served only while the versions it
+# was loaded under are still current, whichever process made the change.
+REFERENCE_CACHE_TABLES = {
+    'equipment': EQUIPMENT_DB,
+    'equipment_categories': EQUIPMENT_DB,
+    'work_centers': REQUESTS_DB,
+}
+
+_reference_cache_lock = threading.Lock()
+_reference_cache = {}  # function name -> (tables, versions, value)
+_reference_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def _reference_versions(db_path, tables):
+    """Get the current version counters of tables"""
+    conn = get_connection(db_path)
+    cursor = conn.cursor()
+    cursor.execute(f'SELECT tag, version FROM cache_versions WHERE tag IN ({", ".join("?" * len(tables))})',
+                   tables)
+    versions = dict(cursor.fetchall())
+    release_connection(conn)
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def reference_cache(*tables):
+    """Cache a reference data loader until one of tables is written.
+
+    Every call costs one primary-key lookup of the table version counters;
+    the loader only runs again once a counter has moved.
+    """
+    db_path = REFERENCE_CACHE_TABLES[tables[0]]
+
+    def decorate(loader):
+        @wraps(loader)
+        def cached():
+            versions = _reference_versions(db_path, tables)
+            with _reference_cache_lock:
+                entry = _reference_cache.get(loader.__name__)
+                if entry is not None and entry[1] == versions:
+                    _reference_cache_stats['hits'] += 1
+                    return list(entry[2])
+                _reference_cache_stats['misses'] += 1
+
+            # Versions were read before loading, so a concurrent write can
+            # only make this entry look stale, never serve old rows as new
+            value = loader()
+            with _reference_cache_lock:
+                _reference_cache[loader.__name__] = (tables, versions, value)
+            return list(value)
+
+        cached.uncached = loader
+        return cached
+    return decorate
+
+
+def invalidate_reference_cache(*tables):
+    """Drop cached values loaded from any of tables"""
+    with _reference_cache_lock:
+        for name, (entry_tables, _, _) in list(_reference_cache.items()):
+            if set(entry_tables) & set(tables):
+                del _reference_cache[name]
+                _reference_cache_stats['invalidations'] += 1
+
+
+def get_cache_stats():
+    """Get reference cache hit, miss and invalidation counters for this process"""
+    with _reference_cache_lock:
+        stats = dict(_reference_cache_stats)
+        stats['entries'] = len(_reference_cache)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+    return stats
+
 # ==================== AUTHENTICATION DATABASE FUNCTIONS ====================
 
 def init_auth_db():
     """Initialize the authentication database for login/register"""
-    conn = sqlite3.connect(AUTH_DB)
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS portal_users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    from migrations import migrate
+    migrate(AUTH_DB)
     print(f"Authentication database '{AUTH_DB}' initialized successfully")
 
 def hash_password(password):
@@ -33,7 +364,7 @@ def hash_password(password):
 
 def create_user(email, password):
     """Create a new portal user in auth database"""
-    conn = sqlite3.connect(AUTH_DB)
+    conn = get_connection(AUTH_DB)
     cursor = conn.cursor()
     
     try:
@@ -49,22 +380,22 @@ def create_user(email, password):
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def check_user_exists(email):
     """Check if user exists in auth database"""
-    conn = sqlite3.connect(AUTH_DB)
+    conn = get_connection(AUTH_DB)
     cursor = conn.cursor()
     
     cursor.execute('SELECT id FROM portal_users WHERE email = ?', (email,))
     user = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     
     return user is not None
 
 def verify_credentials(email, password):
     """Verify user credentials from auth database"""
-    conn = sqlite3.connect(AUTH_DB)
+    conn = get_connection(AUTH_DB)
     cursor = conn.cursor()
     
     hashed_password = hash_password(password)
@@ -74,7 +405,7 @@ def verify_credentials(email, password):
     ''', (email, hashed_password))
     
     user = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     
     if user:
         return True, user
@@ -82,237 +413,48 @@ def verify_credentials(email, password):
 
 def get_user_by_email(email):
     """Get user by email from auth database"""
-    conn = sqlite3.connect(AUTH_DB)
+    conn = get_connection(AUTH_DB)
     cursor = conn.cursor()
     
     cursor.execute('SELECT id, email, password FROM portal_users WHERE email = ?', (email,))
     user = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     
     return user
 
 # ==================== EQUIPMENT DATABASE FUNCTIONS ====================
 
-def migrate_maintenance_requests_table(cursor):
-    """Add missing columns to maintenance_requests table if they don't exist"""
-    # Get table info to check existing columns
-    cursor.execute("PRAGMA table_info(maintenance_requests)")
-    existing_columns = [column[1] for column in cursor.fetchall()]
-    
-    # List of columns to add (SQLite ALTER TABLE doesn't support DEFAULT in ADD COLUMN)
-    columns_to_add = [
-        ('request_type', 'TEXT'),
-        ('priority', 'TEXT'),
-        ('description', 'TEXT'),
-        ('scheduled_date', 'DATE'),
-        ('due_date', 'DATE'),
-        ('equipment_id', 'INTEGER'),
-        ('team', 'TEXT'),
-        ('request_date', 'DATE'),
-        ('duration', 'TEXT'),
-    ]
-    
-    for column_name, column_type in columns_to_add:
-        if column_name not in existing_columns:
-            try:
-                cursor.execute(f'ALTER TABLE maintenance_requests ADD COLUMN {column_name} {column_type}')
-                print(f"Added column '{column_name}' to maintenance_requests table")
-                # Set default values for existing rows
-                if column_name == 'request_type':
-                    cursor.execute("UPDATE maintenance_requests SET request_type = 'Corrective (Breakdown)' WHERE request_type IS NULL")
-                elif column_name == 'priority':
-                    cursor.execute("UPDATE maintenance_requests SET priority = 'Medium' WHERE priority IS NULL")
-            except sqlite3.OperationalError as e:
-                print(f"Could not add column '{column_name}': {e}")
-
-def migrate_equipment_table(cursor):
-    """Add missing columns to equipment table if they don't exist"""
-    cursor.execute("PRAGMA table_info(equipment)")
-    existing_columns = [column[1] for column in cursor.fetchall()]
-    
-    columns_to_add = [
-        ('employee', 'TEXT'),
-        ('department', 'TEXT'),
-        ('serial_number', 'TEXT'),
-        ('technician', 'TEXT'),
-        ('equipment_category_id', 'INTEGER'),
-        ('company', 'TEXT'),
-        ('used_by', 'TEXT'),
-        ('maintenance_team', 'TEXT'),
-        ('assigned_date', 'DATE'),
-        ('description', 'TEXT'),
-        ('scrap_date', 'DATE'),
-        ('used_in_location', 'TEXT'),
-        ('work_center_id', 'INTEGER'),
-    ]
-    
-    for column_name, column_type in columns_to_add:
-        if column_name not in existing_columns:
-            try:
-                cursor.execute(f'ALTER TABLE equipment ADD COLUMN {column_name} {column_type}')
-                print(f"Added column '{column_name}' to equipment table")
-            except sqlite3.OperationalError as e:
-                print(f"Could not add column '{column_name}': {e}")
-
 def init_equipment_db():
     """Initialize the equipment database"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
-    cursor = conn.cursor()
-    
-    # Equipment table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS equipment (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            health_percentage INTEGER DEFAULT 100,
-            status TEXT DEFAULT 'active',
-            employee TEXT,
-            department TEXT,
-            serial_number TEXT,
-            technician TEXT,
-            equipment_category_id INTEGER,
-            company TEXT DEFAULT 'My Company (San Francisco)',
-            used_by TEXT,
-            maintenance_team TEXT,
-            assigned_date DATE,
-            description TEXT,
-            scrap_date DATE,
-            used_in_location TEXT,
-            work_center_id INTEGER,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Migrate existing table to add new columns
-    migrate_equipment_table(cursor)
-    
-    # Maintenance requests table - create with basic structure first
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS maintenance_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            subject TEXT NOT NULL,
-            employee TEXT NOT NULL,
-            technician TEXT,
-            category TEXT NOT NULL,
-            stage TEXT DEFAULT 'New',
-            company TEXT NOT NULL,
-            status TEXT DEFAULT 'New',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Migrate existing table to add new columns
-    migrate_maintenance_requests_table(cursor)
-    
-    # For new installations, ensure all columns exist with proper defaults
-    # Check if request_type column exists, if not, the migration above should have added it
-    cursor.execute("PRAGMA table_info(maintenance_requests)")
-    columns = [col[1] for col in cursor.fetchall()]
-    
-    # If table was just created, it won't have the new columns, so add them
-    if 'request_type' not in columns:
-        migrate_maintenance_requests_table(cursor)
-    
-    # Technicians table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS technicians (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            utilization_percentage INTEGER DEFAULT 0,
-            status TEXT DEFAULT 'active',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Maintenance teams table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS maintenance_teams (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Team members table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS team_members (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            team_id INTEGER NOT NULL,
-            technician_id INTEGER NOT NULL,
-            role TEXT DEFAULT 'member',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (team_id) REFERENCES maintenance_teams(id),
-            FOREIGN KEY (technician_id) REFERENCES technicians(id)
-        )
-    ''')
-    
-    # Profiles table (linked to auth users)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS profiles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            full_name TEXT,
-            phone TEXT,
-            role TEXT DEFAULT 'user',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # User roles table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_roles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            role TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Equipment categories table (should be in equipment DB for joins)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS equipment_categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            responsible TEXT,
-            company TEXT DEFAULT 'My Company (San Francisco)',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Sample data insertion removed - database will start empty
-    # Users can add data through the application interface
-    
-    conn.commit()
-    conn.close()
+    from migrations import migrate
+    migrate(EQUIPMENT_DB)
     print(f"Equipment database '{EQUIPMENT_DB}' initialized successfully")
 
 def get_critical_equipment_count():
     """Get count of equipment with health < 30% from equipment database"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     cursor.execute('SELECT COUNT(*) FROM equipment WHERE health_percentage < 30')
     count = cursor.fetchone()[0]
-    conn.close()
+    release_connection(conn)
     
     return count
 
 def get_technician_utilization():
     """Get average technician utilization from equipment database"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     cursor.execute('SELECT AVG(utilization_percentage) FROM technicians')
     result = cursor.fetchone()[0]
-    conn.close()
+    release_connection(conn)
     
     return int(result) if result else 0
 
 def get_open_requests():
     """Get pending and overdue requests from equipment database"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     cursor.execute('SELECT COUNT(*) FROM maintenance_requests WHERE status = ?', ('Pending',))
@@ -321,13 +463,13 @@ def get_open_requests():
     cursor.execute('SELECT COUNT(*) FROM maintenance_requests WHERE status = ? AND due_date < date("now")', ('Pending',))
     overdue = cursor.fetchone()[0]
     
-    conn.close()
+    release_connection(conn)
     
     return pending, overdue
 
 def get_maintenance_requests(status=None):
     """Get all maintenance requests from equipment database"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     if status:
@@ -344,13 +486,13 @@ def get_maintenance_requests(status=None):
             ORDER BY created_at DESC
         ''')
     requests = cursor.fetchall()
-    conn.close()
+    release_connection(conn)
     
     return requests
 
 def get_maintenance_requests_simple():
     """Get maintenance requests in simple format for dashboard table"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -360,14 +502,16 @@ def get_maintenance_requests_simple():
         LIMIT 50
     ''')
     requests = cursor.fetchall()
-    conn.close()
+    release_connection(conn)
     
     return requests
 
+@reference_cache('equipment', 'equipment_categories')
 def get_all_equipment():
     """Get all equipment with category name"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
+    cursor.row_factory = Equipment.row_factory
     
     cursor.execute('''
         SELECT e.id, e.name, e.health_percentage, e.status, e.employee, e.department, 
@@ -380,14 +524,15 @@ def get_all_equipment():
         ORDER BY e.name
     ''')
     equipment = cursor.fetchall()
-    conn.close()
+    release_connection(conn)
     
     return equipment
 
 def get_equipment_by_id(equipment_id):
     """Get equipment by ID"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
+    cursor.row_factory = Equipment.row_factory
     
     cursor.execute('''
         SELECT e.id, e.name, e.health_percentage, e.status, e.employee, e.department, 
@@ -400,7 +545,7 @@ def get_equipment_by_id(equipment_id):
         WHERE e.id = ?
     ''', (equipment_id,))
     equipment = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     
     return equipment
 
@@ -409,7 +554,7 @@ def create_equipment(name, employee=None, department=None, serial_number=None, t
                      assigned_date=None, description=None, scrap_date=None, used_in_location=None,
                      work_center_id=None, health_percentage=100, status='active'):
     """Create new equipment"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     try:
@@ -424,18 +569,19 @@ def create_equipment(name, employee=None, department=None, serial_number=None, t
               assigned_date, description, scrap_date, used_in_location, work_center_id,
               health_percentage, status))
         conn.commit()
+        invalidate_reference_cache('equipment')
         return True, cursor.lastrowid
     except Exception as e:
         return False, str(e)
     finally:
-        conn.close()
+        release_connection(conn)
 
 def update_equipment(equipment_id, name, employee=None, department=None, serial_number=None, 
                      technician=None, equipment_category_id=None, company=None, used_by=None,
                      maintenance_team=None, assigned_date=None, description=None, scrap_date=None,
                      used_in_location=None, work_center_id=None, health_percentage=100, status='active'):
     """Update equipment"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     try:
@@ -449,29 +595,31 @@ def update_equipment(equipment_id, name, employee=None, department=None, serial_
               company, used_by, maintenance_team, assigned_date, description, scrap_date,
               used_in_location, work_center_id, health_percentage, status, equipment_id))
         conn.commit()
+        invalidate_reference_cache('equipment')
         return True, "Equipment updated successfully"
     except Exception as e:
         return False, str(e)
     finally:
-        conn.close()
+        release_connection(conn)
 
 def delete_equipment(equipment_id):
     """Delete equipment"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     try:
         cursor.execute('DELETE FROM equipment WHERE id=?', (equipment_id,))
         conn.commit()
+        invalidate_reference_cache('equipment')
         return True, "Equipment deleted successfully"
     except Exception as e:
         return False, str(e)
     finally:
-        conn.close()
+        release_connection(conn)
 
 def create_maintenance_request(subject, employee, equipment_id, request_type, priority, description, scheduled_date, due_date, company='My company', team=None, technician=None, category=None, request_date=None, duration=None):
     """Create a new maintenance request"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     try:
@@ -496,11 +644,11 @@ def create_maintenance_request(subject, employee, equipment_id, request_type, pr
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def update_request_status(request_id, status):
     """Update maintenance request status"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     try:
@@ -514,11 +662,11 @@ def update_request_status(request_id, status):
     except Exception as e:
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_dashboard_stats():
     """Get dashboard statistics"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     
     # Total equipment
@@ -537,7 +685,7 @@ def get_dashboard_stats():
     cursor.execute('SELECT COUNT(*) FROM maintenance_requests WHERE status = "Repaired"')
     completed = cursor.fetchone()[0]
     
-    conn.close()
+    release_connection(conn)
     
     return {
         'total_equipment': total_equipment,
@@ -548,7 +696,7 @@ def get_dashboard_stats():
 
 def get_user_signups():
     """Get user signups for chart (last 7 days)"""
-    conn = sqlite3.connect(AUTH_DB)
+    conn = get_connection(AUTH_DB)
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -559,14 +707,14 @@ def get_user_signups():
         ORDER BY date
     ''')
     signups = cursor.fetchall()
-    conn.close()
+    release_connection(conn)
     
     return signups
 
 def get_all_users():
     """Get all users with profile information"""
-    conn_auth = sqlite3.connect(AUTH_DB)
-    conn_equip = sqlite3.connect(EQUIPMENT_DB)
+    conn_auth = get_connection(AUTH_DB)
+    conn_equip = get_connection(EQUIPMENT_DB)
     
     cursor_auth = conn_auth.cursor()
     cursor_equip = conn_equip.cursor()
@@ -589,126 +737,122 @@ def get_all_users():
             'created_at': created_at
         })
     
-    conn_auth.close()
-    conn_equip.close()
+    release_connection(conn_auth)
+    release_connection(conn_equip)
     
     return result
 
+def get_user_role(user_id):
+    """Get the role of a portal user's profile ('user' without a profile)"""
+    conn = get_connection(EQUIPMENT_DB)
+    cursor = conn.cursor()
+    cursor.execute('SELECT role FROM profiles WHERE user_id = ?', (user_id,))
+    row = cursor.fetchone()
+    release_connection(conn)
+    
+    return row[0] if row and row[0] else 'user'
+
+def create_profile(user_id, full_name):
+    """Create the profile row linked to a portal user"""
+    conn = get_connection(EQUIPMENT_DB)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('INSERT INTO profiles (user_id, full_name) VALUES (?, ?)', (user_id, full_name))
+        conn.commit()
+        return True, "Profile created successfully"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+    finally:
+        release_connection(conn)
+
 # ==================== REQUESTS DATABASE FUNCTIONS ====================
 
 def init_requests_db():
     """Initialize the requests database for storing maintenance requests"""
-    conn = sqlite3.connect(REQUESTS_DB)
-    cursor = conn.cursor()
-    
-    # Maintenance requests table with all columns
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS maintenance_requests (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            subject TEXT NOT NULL,
-            employee TEXT NOT NULL,
-            technician TEXT,
-            category TEXT,
-            stage TEXT DEFAULT 'New',
-            company TEXT NOT NULL DEFAULT 'My company',
-            status TEXT DEFAULT 'New',
-            request_type TEXT,
-            priority TEXT DEFAULT 'Medium',
-            description TEXT,
-            scheduled_date DATE,
-            due_date DATE,
-            equipment_id INTEGER,
-            work_center_id INTEGER,
-            maintenance_for TEXT DEFAULT 'Equipment',
-            notes TEXT,
-            instructions TEXT,
-            team TEXT,
-            request_date DATE DEFAULT CURRENT_DATE,
-            duration TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Migrate existing table to add new columns
-    cursor.execute("PRAGMA table_info(maintenance_requests)")
-    existing_columns = [column[1] for column in cursor.fetchall()]
-    
-    columns_to_add = [
-        ('work_center_id', 'INTEGER'),
-        ('maintenance_for', 'TEXT DEFAULT "Equipment"'),
-        ('notes', 'TEXT'),
-        ('instructions', 'TEXT')
-    ]
-    
-    for column_name, column_type in columns_to_add:
-        if column_name not in existing_columns:
-            try:
-                cursor.execute(f'ALTER TABLE maintenance_requests ADD COLUMN {column_name} {column_type}')
-                print(f"Added column '{column_name}' to maintenance_requests table")
-            except sqlite3.OperationalError as e:
-                print(f"Could not add column '{column_name}': {e}")
-    
-    # Worksheet comments table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS worksheet_comments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            request_id INTEGER NOT NULL,
-            user TEXT NOT NULL,
-            comment TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (request_id) REFERENCES maintenance_requests(id)
-        )
-    ''')
-    
-    # Work centers table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS work_centers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            code TEXT,
-            tag TEXT,
-            alternative_workcenters TEXT,
-            cost_per_hour REAL DEFAULT 0.0,
-            capacity_time_efficiency REAL DEFAULT 100.0,
-            oee_target REAL DEFAULT 0.0,
-            company TEXT DEFAULT 'My company',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Equipment categories table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS equipment_categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            responsible TEXT,
-            company TEXT DEFAULT 'My company',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    from migrations import migrate
+    migrate(REQUESTS_DB)
     print(f"Requests database '{REQUESTS_DB}' initialized successfully")
 
+# scheduled_date, due_date and duration are free-form text as entered. Writes
+# also store them normalized: scheduled_start and due_at as epoch seconds
+# (stored times are taken as UTC, like SQLite's strftime('%s')) and
+# duration_minutes, so windows, overdue checks and duration sums are numeric
+# range scans. NULL when the text cannot be read.
+
+# Duration units -> minutes; a number without a unit is hours
+DURATION_UNITS = {
+    'd': 24 * 60, 'day': 24 * 60,
+    'h': 60, 'hr': 60, 'hour': 60,
+    'm': 1, 'min': 1, 'minute': 1,
+    '': 60,
+}
+DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)\s*([a-z]*)')
+
+def to_epoch(value):
+    """Get epoch seconds of a naive UTC datetime"""
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
+
+def parse_request_datetime(value):
+    """Parse a stored date or datetime ('YYYY-MM-DD', ISO with 'T' or ' '), or None"""
+    try:
+        parsed = datetime.fromisoformat(str(value or '').strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def scheduled_start_epoch(scheduled_date, created_at=None):
+    """Get scheduled_start for a scheduled_date.
+
+    Date-only schedules take their time of day from created_at (09:00 when
+    missing), as MaintenanceRequest.scheduled_datetime() shows them.
+    """
+    scheduled = parse_request_datetime(scheduled_date)
+    if scheduled is None:
+        return None
+    if len(str(scheduled_date).strip()) == 10:
+        created = parse_request_datetime(created_at)
+        time_of_day = created.time().replace(microsecond=0) if created else datetime.min.time().replace(hour=9)
+        scheduled = datetime.combine(scheduled.date(), time_of_day)
+    return to_epoch(scheduled)
+
+def due_at_epoch(due_date):
+    """Get due_at for a due_date (midnight for date-only values)"""
+    due = parse_request_datetime(due_date)
+    return to_epoch(due) if due else None
+
+def parse_duration_minutes(duration):
+    """Parse durations like '2h', '1 hour 30 min', '90m', '1.5' or '01:30' into minutes"""
+    text = str(duration or '').strip().lower()
+    clock = re.fullmatch(r'(\d+):([0-5]\d)', text)
+    if clock:
+        return int(clock[1]) * 60 + int(clock[2])
+    
+    parts = DURATION_PART.findall(text)
+    if not parts or DURATION_PART.sub('', text).strip(' ,&') not in ('', 'and'):
+        return None
+    minutes = 0
+    for amount, unit in parts:
+        unit = unit if unit in DURATION_UNITS else unit.rstrip('s')
+        if unit not in DURATION_UNITS:
+            return None
+        minutes += float(amount) * DURATION_UNITS[unit]
+    return round(minutes)
+
 def create_maintenance_request_new(subject, employee, equipment_id=None, request_type='Corrective', priority='Medium', description=None, scheduled_date=None, due_date=None, company='My company', team=None, technician=None, category=None, request_date=None, duration=None, work_center_id=None, maintenance_for='Equipment', notes=None, instructions=None):
     """Create a new maintenance request in the requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     
     try:
         # Get equipment name for category if not provided
         if not category and equipment_id:
-            conn_equip = sqlite3.connect(EQUIPMENT_DB)
-            cursor_equip = conn_equip.cursor()
-            cursor_equip.execute('SELECT name FROM equipment WHERE id = ?', (equipment_id,))
-            eq_result = cursor_equip.fetchone()
+            cursor.execute('SELECT name FROM equipment_db.equipment WHERE id = ?', (equipment_id,))
+            eq_result = cursor.fetchone()
             if eq_result:
                 category = eq_result[0]
-            conn_equip.close()
         
         # Use current date if request_date not provided
         if not request_date:
@@ -718,97 +862,224 @@ def create_maintenance_request_new(subject, employee, equipment_id=None, request
         equipment_id_int = int(equipment_id) if equipment_id and str(equipment_id).strip() else None
         work_center_id_int = int(work_center_id) if work_center_id and str(work_center_id).strip() else None
         
+        # created_at defaults to CURRENT_TIMESTAMP, which is UTC
+        scheduled_start = scheduled_start_epoch(scheduled_date, datetime.now(timezone.utc).replace(tzinfo=None))
+        
         cursor.execute('''
-            INSERT INTO maintenance_requests (subject, employee, equipment_id, work_center_id, maintenance_for, request_type, priority, description, scheduled_date, due_date, company, status, stage, team, technician, category, request_date, duration, notes, instructions)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'New', 'New', ?, ?, ?, ?, ?, ?, ?)
-        ''', (subject, employee, equipment_id_int, work_center_id_int, maintenance_for, request_type, priority, description, scheduled_date, due_date, company, team, technician, category, request_date, duration, notes, instructions))
+            INSERT INTO maintenance_requests (subject, employee, equipment_id, work_center_id, maintenance_for, request_type, priority, description, scheduled_date, due_date, company, status, stage, team, technician, category, request_date, duration, notes, instructions, scheduled_start, due_at, duration_minutes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'New', 'New', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (subject, employee, equipment_id_int, work_center_id_int, maintenance_for, request_type, priority, description, scheduled_date, due_date, company, team, technician, category, request_date, duration, notes, instructions,
+              scheduled_start, due_at_epoch(due_date), parse_duration_minutes(duration)))
         conn.commit()
         return True, "Request created successfully"
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
-def get_maintenance_requests_new(status=None):
-    """Get maintenance requests from the requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+# Column order returned by every requests query. The first 19 columns match
+# the original table layout and equipment_name stays at index 19, regardless
+# of the physical column order of older, migrated databases.
+REQUEST_FIELDS = MaintenanceRequest._fields
+
+REQUEST_COLUMNS = '''
+    SELECT r.id, r.subject, r.employee, r.technician, r.category, r.stage, r.company, r.status,
+           r.request_type, r.priority, r.description, r.scheduled_date, r.due_date, r.equipment_id,
+           r.team, r.request_date, r.duration, r.created_at, r.updated_at, e.name,
+           r.work_center_id, r.maintenance_for, r.notes, r.instructions, wc.name,
+           ec.name, r.scheduled_start, r.due_at, r.duration_minutes
+'''
+
+REQUEST_JOINS = '''
+    LEFT JOIN equipment_db.equipment e ON e.id = r.equipment_id
+    LEFT JOIN equipment_db.equipment_categories ec ON ec.id = e.equipment_category_id
+    LEFT JOIN work_centers wc ON wc.id = r.work_center_id
+'''
+
+REQUEST_SELECT = REQUEST_COLUMNS + '    FROM maintenance_requests r' + REQUEST_JOINS
+
+def _request_query(where, order_by, indexed_by):
+    """Build the joined request SELECT for a WHERE clause and ORDER BY"""
+    query = REQUEST_SELECT
+    if indexed_by:
+        query = f'{REQUEST_COLUMNS}    FROM maintenance_requests r INDEXED BY {indexed_by}{REQUEST_JOINS}'
+    if where:
+        query += f' WHERE {where}'
+    return query + f' ORDER BY {order_by}'
+
+def query_maintenance_requests(where='', params=(), order_by='r.created_at DESC', limit=None, indexed_by=None):
+    """Run a single joined query over maintenance requests.
+
+    Equipment, work center and equipment category names are resolved in the
+    same statement through the attached equipment database. indexed_by pins
+    the index used for maintenance_requests, for filters the planner would
+    otherwise misjudge without ANALYZE statistics.
+    """
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
+    cursor.row_factory = MaintenanceRequest.row_factory
     
-    if status:
-        cursor.execute('''
-            SELECT * FROM maintenance_requests
-            WHERE status = ?
-            ORDER BY created_at DESC
-        ''', (status,))
-    else:
-        cursor.execute('''
-            SELECT * FROM maintenance_requests
-            ORDER BY created_at DESC
-        ''')
+    query = _request_query(where, order_by, indexed_by)
+    if limit is not None:
+        query += ' LIMIT ?'
+        params = tuple(params) + (limit,)
     
+    cursor.execute(query, params)
     requests = cursor.fetchall()
-    conn.close()
-    
-    # Get equipment names from equipment database and append to results
-    if requests:
-        conn_equip = sqlite3.connect(EQUIPMENT_DB)
-        cursor_equip = conn_equip.cursor()
-        result = []
-        for req in requests:
-            req_list = list(req)
-            # equipment_id is at index 13 (0-indexed)
-            if len(req_list) > 13 and req_list[13]:
-                cursor_equip.execute('SELECT name FROM equipment WHERE id = ?', (req_list[13],))
-                eq_result = cursor_equip.fetchone()
-                equipment_name = eq_result[0] if eq_result else None
-            else:
-                equipment_name = None
-            # Append equipment_name to the tuple
-            req_list.append(equipment_name)
-            result.append(tuple(req_list))
-        conn_equip.close()
-        return result
+    release_connection(conn)
     
     return requests
 
-def get_maintenance_requests_simple_new():
-    """Get all maintenance requests in simple format from requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+# Rows fetched per round trip when streaming requests from a cursor
+REQUEST_STREAM_BATCH_SIZE = 500
+
+def iter_maintenance_requests(where='', params=(), order_by='r.created_at DESC', indexed_by=None):
+    """Yield maintenance requests straight from the cursor, one batch at a time.
+
+    Takes the same arguments as query_maintenance_requests() but never holds
+    more than REQUEST_STREAM_BATCH_SIZE rows in memory. The connection is
+    released when the generator is exhausted or closed.
+    """
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
+    cursor.row_factory = MaintenanceRequest.row_factory
     
+    try:
+        cursor.execute(_request_query(where, order_by, indexed_by), params)
+        while True:
+            rows = cursor.fetchmany(REQUEST_STREAM_BATCH_SIZE)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+# Filters accepted by get_maintenance_requests_page(): name -> (WHERE clause, value type)
+REQUEST_FILTERS = {
+    'status': ('r.status = ?', str),
+    'priority': ('r.priority = ?', str),
+    'technician': ('r.technician = ?', str),
+    'team': ('r.team = ?', str),
+    'equipment_id': ('r.equipment_id = ?', int),
+    'work_center_id': ('r.work_center_id = ?', int),
+    # Dates are YYYY-MM-DD, inclusive, and match the day the request was logged
+    'date_from': ('r.created_at >= ?', str),
+    'date_to': ("r.created_at < date(?, '+1 day')", str),
+}
+
+REQUEST_PAGE_SIZE = 50
+MAX_REQUEST_PAGE_SIZE = 200
+
+def encode_page_cursor(created_at, request_id):
+    """Encode the (created_at, id) of the last row shown as an opaque page cursor"""
+    return base64.urlsafe_b64encode(json.dumps([created_at, request_id]).encode()).decode().rstrip('=')
+
+def decode_page_cursor(cursor):
+    """Decode a page cursor back to (created_at, id); raises ValueError if malformed"""
+    try:
+        created_at, request_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError) as e:
+        raise ValueError('Invalid page cursor') from e
+    if not isinstance(created_at, str) or not isinstance(request_id, int):
+        raise ValueError('Invalid page cursor')
+    return created_at, request_id
+
+def get_maintenance_requests_page(filters=None, cursor=None, limit=REQUEST_PAGE_SIZE):
+    """Get one page of maintenance requests, newest first.
+
+    Pages are delimited by the (created_at, id) of the last row of the
+    previous page rather than an OFFSET, so every page is a bounded range scan
+    of an index no matter how deep it is. Returns (requests, next_cursor);
+    next_cursor is None on the last page. Raises ValueError for unknown
+    filters, bad filter values or a malformed cursor.
+    """
+    clauses = []
+    params = []
+    for name, value in (filters or {}).items():
+        if value in (None, ''):
+            continue
+        if name not in REQUEST_FILTERS:
+            raise ValueError(f'Unknown filter: {name}')
+        clause, value_type = REQUEST_FILTERS[name]
+        try:
+            params.append(value_type(value))
+        except ValueError as e:
+            raise ValueError(f'Invalid value for {name}: {value}') from e
+        clauses.append(clause)
+    
+    if cursor:
+        clauses.append('(r.created_at, r.id) < (?, ?)')
+        params.extend(decode_page_cursor(cursor))
+    
+    limit = max(1, min(int(limit), MAX_REQUEST_PAGE_SIZE))
+    requests = query_maintenance_requests(' AND '.join(clauses), params,
+                                          order_by='r.created_at DESC, r.id DESC', limit=limit + 1)
+    
+    next_cursor = None
+    if len(requests) > limit:
+        requests = requests[:limit]
+        next_cursor = encode_page_cursor(requests[-1].created_at, requests[-1].id)
+    return requests, next_cursor
+
+def get_maintenance_requests_new(status=None):
+    """Get maintenance requests from the requests database"""
+    if status:
+        return query_maintenance_requests('r.status = ?', (status,))
+    return query_maintenance_requests()
+
+# Widest window /api/calendar serves in one call (a month view with spare days)
+CALENDAR_MAX_DAYS = 42
+
+def get_calendar_requests(start, end):
+    """Get requests scheduled in [start, end) (naive UTC datetimes), earliest first"""
+    return query_maintenance_requests('r.scheduled_start >= ? AND r.scheduled_start < ?',
+                                      (to_epoch(start), to_epoch(end)), order_by='r.scheduled_start, r.id')
+
+# Minutes a scheduled request without a readable duration is taken to last
+DEFAULT_JOB_MINUTES = 60
+
+def get_scheduled_jobs(start, end):
+    """Get ScheduledJob rows of open requests running at any time in [start, end).
+
+    Jobs that started before the window are reached by looking back by the
+    longest scheduled duration, read from idx_requests_scheduled_duration.
+    """
+    start, end = to_epoch(start), to_epoch(end)
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
     cursor.execute('''
-        SELECT * FROM maintenance_requests
-        ORDER BY created_at DESC
-        LIMIT 50
+        SELECT duration_minutes FROM maintenance_requests
+        WHERE scheduled_start IS NOT NULL
+        ORDER BY duration_minutes DESC LIMIT 1
     ''')
-    requests = cursor.fetchall()
-    conn.close()
-    
-    # Get equipment names from equipment database and append to results
-    if requests:
-        conn_equip = sqlite3.connect(EQUIPMENT_DB)
-        cursor_equip = conn_equip.cursor()
-        result = []
-        for req in requests:
-            req_list = list(req)
-            # equipment_id is at index 13 (0-indexed)
-            if len(req_list) > 13 and req_list[13]:
-                cursor_equip.execute('SELECT name FROM equipment WHERE id = ?', (req_list[13],))
-                eq_result = cursor_equip.fetchone()
-                equipment_name = eq_result[0] if eq_result else None
-            else:
-                equipment_name = None
-            # Append equipment_name to the tuple
-            req_list.append(equipment_name)
-            result.append(tuple(req_list))
-        conn_equip.close()
-        return result
-    
-    return requests
+    row = cursor.fetchone()
+    longest = max(row[0] or 0, DEFAULT_JOB_MINUTES) if row else DEFAULT_JOB_MINUTES
+    
+    cursor.row_factory = ScheduledJob.row_factory
+    cursor.execute(f'''
+        SELECT id, technician, team, scheduled_start,
+               scheduled_start + COALESCE(duration_minutes, {DEFAULT_JOB_MINUTES}) * 60 AS end_at
+        FROM maintenance_requests INDEXED BY idx_requests_scheduled_start
+        WHERE scheduled_start >= ? AND scheduled_start < ? AND {OPEN_STATUS_FILTER}
+          AND end_at > ?
+    ''', (start - longest * 60, end, start))
+    jobs = cursor.fetchall()
+    release_connection(conn)
+    
+    return jobs
+
+def get_maintenance_requests_for_equipment(equipment_id):
+    """Get the maintenance requests of one piece of equipment, newest first"""
+    return query_maintenance_requests('r.equipment_id = ?', (equipment_id,))
+
+def get_maintenance_requests_simple_new():
+    """Get all maintenance requests in simple format from requests database"""
+    return query_maintenance_requests(limit=50)
 
 def update_request_status_new(request_id, status):
     """Update maintenance request status in requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     
     try:
@@ -822,91 +1093,240 @@ def update_request_status_new(request_id, status):
     except Exception as e:
         return False
     finally:
-        conn.close()
+        release_connection(conn)
 
-def get_dashboard_stats_new():
-    """Get dashboard statistics from requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+# ==================== REQUEST ROLLUPS ====================
+
+# Status history rows record the request's team, equipment and type when the
+# status changed; reliability and stage time rollups are grouped by these.
+# row is the alias to qualify columns with. The migrations spell the same
+# expressions out in their triggers, so changing one here needs a new
+# migration recreating those triggers too.
+
+def history_team_key(row=None):
+    """SQL expression for the team rollup key of a status history row"""
+    team = f'{row}.team' if row else 'team'
+    return f"COALESCE(NULLIF({team}, ''), 'Unassigned')"
+
+def history_failure_filter(row=None):
+    """SQL condition true for requests that count as failures: all but preventive work"""
+    request_type = f'{row}.request_type' if row else 'request_type'
+    return f"COALESCE({request_type}, 'Corrective') != 'Preventive'"
+
+def seconds_between(start, end):
+    """SQL expression for the whole seconds between two timestamp expressions"""
+    return f'CAST(ROUND((julianday({end}) - julianday({start})) * 86400) AS INTEGER)'
+
+def labor_cost_cents(minutes, cost_per_hour):
+    """SQL expression for the labor cost in cents of minutes worked at an hourly rate"""
+    return f'CAST(ROUND(COALESCE({minutes}, 0) * COALESCE({cost_per_hour}, 0) * 100 / 60.0) AS INTEGER)'
+
+def cost_rollup_keys(row=None):
+    """Get (scope, key expression, condition) of every cost rollup a cost ledger row counts towards.
+
+    Category totals are not stored: they are summed from the equipment rows
+    by each equipment's current category.
+    """
+    prefix = f'{row}.' if row else ''
+    return (
+        ('equipment', f'CAST({prefix}equipment_id AS TEXT)', f'{prefix}equipment_id IS NOT NULL'),
+        ('work_center', f'CAST({prefix}work_center_id AS TEXT)', f'{prefix}work_center_id IS NOT NULL'),
+        ('month', f"strftime('%Y-%m', {prefix}recorded_at)", '1'),
+    )
+
+def cost_entry_repairs(row=None):
+    """SQL expression for the repair count of a cost ledger row: +1 per completion, -1 per reversal"""
+    entry = f'{row}.entry' if row else 'entry'
+    return f"(CASE {entry} WHEN 'reversal' THEN -1 ELSE 1 END)"
+
+# Rollup tables kept current by triggers (see migrations.py): table -> (key
+# column count, query recomputing it from scratch). The count rollups follow
+# maintenance_requests; NULL statuses and technicians are rolled up under ''.
+# The stage time and reliability rollups follow request_status_history, the
+# cost rollups follow cost_ledger.
+REQUEST_ROLLUPS = {
+    'request_counts_by_status': (1, '''
+        SELECT COALESCE(status, ''), COUNT(*)
+        FROM maintenance_requests
+        GROUP BY 1
+    '''),
+    'request_counts_by_technician': (2, '''
+        SELECT COALESCE(technician, ''), COALESCE(status, ''), COUNT(*)
+        FROM maintenance_requests
+        GROUP BY 1, 2
+    '''),
+    'request_counts_by_equipment': (1, f'''
+        SELECT equipment_id, SUM({OPEN_STATUS_FILTER}), COUNT(*)
+        FROM maintenance_requests
+        WHERE equipment_id IS NOT NULL
+        GROUP BY equipment_id
+    '''),
+    'request_counts_by_work_center': (1, f'''
+        SELECT work_center_id, SUM({OPEN_STATUS_FILTER}), COUNT(*)
+        FROM maintenance_requests
+        WHERE work_center_id IS NOT NULL
+        GROUP BY work_center_id
+    '''),
+    'stage_time_rollups': (3, f'''
+        WITH transitions AS (
+            SELECT *, LAG(changed_at) OVER (PARTITION BY request_id ORDER BY id) AS entered_at
+            FROM request_status_history
+        ), scoped AS (
+            SELECT 'equipment' AS scope, CAST(equipment_id AS TEXT) AS group_key, *
+            FROM transitions WHERE equipment_id IS NOT NULL
+            UNION ALL
+            SELECT 'team', {history_team_key()}, * FROM transitions
+        )
+        SELECT scope, group_key, from_status, COUNT(*), SUM({seconds_between('entered_at', 'changed_at')})
+        FROM scoped
+        WHERE from_status IS NOT NULL AND entered_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    '''),
+    'reliability_rollups': (2, f'''
+        WITH events AS (
+            SELECT *, FIRST_VALUE(changed_at) OVER (PARTITION BY request_id ORDER BY id) AS opened_at,
+                   from_status IS NULL AND {history_failure_filter()} AS is_failure
+            FROM request_status_history
+        ), scoped AS (
+            SELECT 'equipment' AS scope, CAST(equipment_id AS TEXT) AS group_key, *
+            FROM events WHERE equipment_id IS NOT NULL
+            UNION ALL
+            SELECT 'team', {history_team_key()}, * FROM events
+        )
+        SELECT scope, group_key, SUM(is_failure),
+               MIN(CASE WHEN is_failure THEN changed_at END), MAX(CASE WHEN is_failure THEN changed_at END),
+               SUM(to_status = 'Repaired'),
+               SUM(CASE WHEN to_status = 'Repaired' THEN {seconds_between('opened_at', 'changed_at')} ELSE 0 END)
+        FROM scoped
+        GROUP BY 1, 2
+    '''),
+}
+
+REQUEST_ROLLUPS['cost_rollups'] = (2, ' UNION ALL '.join(f'''
+        SELECT '{scope}', {key}, SUM({cost_entry_repairs()}), SUM(minutes), SUM(cost_cents)
+        FROM cost_ledger
+        WHERE {condition}
+        GROUP BY 2
+    ''' for scope, key, condition in cost_rollup_keys()))
+
+def rebuild_request_rollups(cursor, tables=None):
+    """Recompute rollup tables from their source tables (inside the caller's transaction)"""
+    for table in (tables or REQUEST_ROLLUPS):
+        cursor.execute(f'DELETE FROM {table}')
+        cursor.execute(f'INSERT INTO {table} {REQUEST_ROLLUPS[table][1]}')
+
+def _rollup_rows(cursor, query, key_count):
+    """Get {key: values} for a rollup query, ignoring rows whose counts are all zero"""
+    cursor.execute(query)
+    return {row[:key_count]: row[key_count:] for row in cursor.fetchall() if any(row[key_count:])}
+
+def verify_request_rollups():
+    """Compare the rollup tables with a fresh recount.
+
+    Returns {table: [(key, stored values, actual values), ...]} for tables
+    that drifted.
+    """
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     
-    # Open requests
-    cursor.execute('SELECT COUNT(*) FROM maintenance_requests WHERE status IN ("New", "In Progress")')
-    open_requests = cursor.fetchone()[0]
-    
-    # In progress
-    cursor.execute('SELECT COUNT(*) FROM maintenance_requests WHERE status = "In Progress"')
-    in_progress = cursor.fetchone()[0]
+    drift = {}
+    for table, (key_count, query) in REQUEST_ROLLUPS.items():
+        stored = _rollup_rows(cursor, f'SELECT * FROM {table}', key_count)
+        actual = _rollup_rows(cursor, query, key_count)
+        mismatches = [(key, stored.get(key), actual.get(key))
+                      for key in sorted(set(stored) | set(actual), key=repr)
+                      if stored.get(key) != actual.get(key)]
+        if mismatches:
+            drift[table] = mismatches
+    release_connection(conn)
+    
+    return drift
+
+def repair_request_rollups():
+    """Rebuild every rollup table in one transaction"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
     
-    # Completed
-    cursor.execute('SELECT COUNT(*) FROM maintenance_requests WHERE status = "Repaired"')
-    completed = cursor.fetchone()[0]
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        rebuild_request_rollups(cursor)
+        conn.commit()
+        return True, "Rollups rebuilt successfully"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def get_open_request_counts_by_equipment():
+    """Get {equipment_id: open request count} from the equipment rollup"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.execute('SELECT equipment_id, open_count FROM request_counts_by_equipment WHERE open_count > 0')
+    counts = dict(cursor.fetchall())
+    release_connection(conn)
+    return counts
+
+# Keys of get_request_stats() holding the count of each request status
+STATUS_COUNT_KEYS = {
+    'New': 'new',
+    'In Progress': 'in_progress',
+    'Blocked': 'blocked',
+    'Ready for next stage': 'ready',
+    'Repaired': 'completed',
+    'Scrap': 'scrap',
+}
+
+def get_request_stats():
+    """Get request, equipment and technician statistics.
+
+    Per-status counts are read from the trigger-maintained status rollup, the
+    overdue count from the partial open-request index, and equipment totals
+    from the attached equipment database in the same connection.
+    """
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
     
-    # Total requests
-    cursor.execute('SELECT COUNT(*) FROM maintenance_requests')
-    total_requests = cursor.fetchone()[0]
+    cursor.execute('SELECT status, count FROM request_counts_by_status WHERE count != 0')
+    by_status = dict(cursor.fetchall())
     
-    # Overdue requests (due_date in past and status not completed)
-    cursor.execute('''
-        SELECT COUNT(*) FROM maintenance_requests 
-        WHERE due_date IS NOT NULL 
-        AND due_date < date('now') 
-        AND status NOT IN ('Repaired', 'Scrap')
+    cursor.execute(f'''
+        SELECT COUNT(*) FROM maintenance_requests INDEXED BY idx_requests_open_due_date
+        WHERE {OVERDUE_FILTER}
     ''')
     overdue = cursor.fetchone()[0]
     
-    conn.close()
-    
-    # Get equipment stats from equipment database
-    conn_equip = sqlite3.connect(EQUIPMENT_DB)
-    cursor_equip = conn_equip.cursor()
-    cursor_equip.execute('SELECT COUNT(*) FROM equipment')
-    total_equipment = cursor_equip.fetchone()[0]
-    conn_equip.close()
-    
-    return {
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(SUM(health_percentage < 30), 0),
+               (SELECT AVG(utilization_percentage) FROM equipment_db.technicians)
+        FROM equipment_db.equipment
+    ''')
+    total_equipment, critical_equipment, utilization = cursor.fetchone()
+    release_connection(conn)
+    
+    stats = {key: by_status.get(status, 0) for status, key in STATUS_COUNT_KEYS.items()}
+    stats.update({
+        'by_status': by_status,
+        'total_requests': sum(by_status.values()),
+        'open_requests': stats['new'] + stats['in_progress'],
+        'overdue': overdue,
         'total_equipment': total_equipment,
-        'open_requests': open_requests,
-        'in_progress': in_progress,
-        'completed': completed,
-        'total_requests': total_requests,
-        'overdue': overdue
-    }
+        'critical_equipment': critical_equipment,
+        'technician_utilization': int(utilization) if utilization else 0,
+    })
+    return stats
+
+def get_dashboard_stats_new():
+    """Get dashboard statistics from requests database"""
+    return get_request_stats()
 
 def get_maintenance_request_by_id(request_id):
     """Get a single maintenance request by ID from requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
-    cursor = conn.cursor()
-    
-    cursor.execute('SELECT * FROM maintenance_requests WHERE id = ?', (request_id,))
-    request = cursor.fetchone()
-    conn.close()
-    
-    if request:
-        # Get equipment name if equipment_id exists
-        req_list = list(request)
-        equipment_name = None
-        
-        if len(req_list) > 13 and req_list[13]:  # equipment_id at index 13
-            try:
-                conn_equip = sqlite3.connect(EQUIPMENT_DB)
-                cursor_equip = conn_equip.cursor()
-                cursor_equip.execute('SELECT name FROM equipment WHERE id = ?', (req_list[13],))
-                eq_result = cursor_equip.fetchone()
-                equipment_name = eq_result[0] if eq_result else None
-                conn_equip.close()
-            except Exception as e:
-                print(f"Error fetching equipment name: {e}")
-                equipment_name = None
-        
-        # Always append equipment_name (even if None) for consistent tuple structure
-        req_list.append(equipment_name)
-        return tuple(req_list)
-    
-    return request
+    requests = query_maintenance_requests('r.id = ?', (request_id,), order_by='r.id')
+    return requests[0] if requests else None
 
 def update_maintenance_request(request_id, subject=None, employee=None, equipment_id=None, request_type=None, priority=None, description=None, scheduled_date=None, due_date=None, company=None, team=None, technician=None, category=None, request_date=None, duration=None, status=None):
     """Update a maintenance request in the requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     
     try:
@@ -933,11 +1353,17 @@ def update_maintenance_request(request_id, subject=None, employee=None, equipmen
             updates.append('description = ?')
             values.append(description)
         if scheduled_date is not None:
+            cursor.execute('SELECT created_at FROM maintenance_requests WHERE id = ?', (request_id,))
+            row = cursor.fetchone()
             updates.append('scheduled_date = ?')
+            updates.append('scheduled_start = ?')
             values.append(scheduled_date)
+            values.append(scheduled_start_epoch(scheduled_date, row[0] if row else None))
         if due_date is not None:
             updates.append('due_date = ?')
+            updates.append('due_at = ?')
             values.append(due_date)
+            values.append(due_at_epoch(due_date))
         if company is not None:
             updates.append('company = ?')
             values.append(company)
@@ -955,7 +1381,9 @@ def update_maintenance_request(request_id, subject=None, employee=None, equipmen
             values.append(request_date)
         if duration is not None:
             updates.append('duration = ?')
+            updates.append('duration_minutes = ?')
             values.append(duration)
+            values.append(parse_duration_minutes(duration))
         if status is not None:
             updates.append('status = ?')
             updates.append('stage = ?')
@@ -975,11 +1403,11 @@ def update_maintenance_request(request_id, subject=None, employee=None, equipmen
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def delete_maintenance_request(request_id):
     """Delete a maintenance request from the requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     
     try:
@@ -991,12 +1419,13 @@ def delete_maintenance_request(request_id):
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_worksheet_comments(request_id):
-    """Get all worksheet comments for a maintenance request"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    """Get all worksheet comments for a maintenance request, newest first"""
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
+    cursor.row_factory = WorksheetComment.row_factory
     
     cursor.execute('''
         SELECT id, request_id, user, comment, created_at
@@ -1006,24 +1435,13 @@ def get_worksheet_comments(request_id):
     ''', (request_id,))
     
     comments = cursor.fetchall()
-    conn.close()
-    
-    # Convert to list of dictionaries
-    result = []
-    for comment in comments:
-        result.append({
-            'id': comment[0],
-            'request_id': comment[1],
-            'user': comment[2],
-            'comment': comment[3],
-            'created_at': comment[4]
-        })
+    release_connection(conn)
     
-    return result
+    return comments
 
 def add_worksheet_comment(request_id, user, comment):
     """Add a worksheet comment to a maintenance request"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     
     try:
@@ -1036,37 +1454,619 @@ def add_worksheet_comment(request_id, user, comment):
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_overdue_requests_new():
     """Get count of overdue requests from requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     
-    # Overdue requests are those with status 'New' or 'In Progress' and due_date in the past
-    cursor.execute('''
-        SELECT COUNT(*) FROM maintenance_requests 
-        WHERE status IN ("New", "In Progress", "Blocked", "Ready for next stage") 
-        AND due_date IS NOT NULL AND due_date < CURRENT_DATE
+    # Overdue requests are open requests due before today
+    cursor.execute(f'''
+        SELECT COUNT(*) FROM maintenance_requests INDEXED BY idx_requests_open_due_date
+        WHERE {OVERDUE_FILTER}
     ''')
     overdue_count = cursor.fetchone()[0]
-    conn.close()
+    release_connection(conn)
     return overdue_count
 
+# ==================== REPORT QUERIES ====================
+
+def _request_date_range(start_date, end_date):
+    """Build WHERE clauses and params for an inclusive YYYY-MM-DD request_date range"""
+    clauses, params = [], []
+    if start_date:
+        clauses.append('r.request_date >= ?')
+        params.append(start_date)
+    if end_date:
+        clauses.append('r.request_date <= ?')
+        params.append(end_date)
+    return clauses, params
+
+def _report_request_query(start_date, end_date, status):
+    """Build query_maintenance_requests() arguments for the requests report"""
+    clauses, params = _request_date_range(start_date, end_date)
+    if status:
+        clauses.append('r.status = ?')
+        params.append(status)
+    return {'where': ' AND '.join(clauses), 'params': params, 'order_by': 'r.request_date DESC, r.id DESC'}
+
+def get_report_requests(start_date=None, end_date=None, status=None):
+    """Get requests raised in a request_date range, optionally with one status.
+
+    Both dates are inclusive and optional; requests without a request_date
+    are only included when no range is given. Rows come newest first, in
+    index order, so the cost follows the number of rows returned.
+    """
+    return query_maintenance_requests(**_report_request_query(start_date, end_date, status))
+
+def iter_report_requests(start_date=None, end_date=None, status=None):
+    """Stream the rows of get_report_requests() from the cursor"""
+    return iter_maintenance_requests(**_report_request_query(start_date, end_date, status))
+
+def _overdue_report_query(start_date, end_date):
+    """Build query_maintenance_requests() arguments for the overdue report.
+
+    A date range is served by the (status, request_date) index; without one
+    the partial open-request index is pinned and already in due_at order.
+    """
+    clauses, params = _request_date_range(start_date, end_date)
+    # equipment has a status column too; due_at only exists on requests
+    clauses.insert(0, 'r.' + OVERDUE_FILTER)
+    return {
+        'where': ' AND '.join(clauses),
+        'params': params,
+        'order_by': 'r.due_at, r.id',
+        'indexed_by': None if params else 'idx_requests_open_due_date',
+    }
+
+def get_overdue_report_requests(start_date=None, end_date=None):
+    """Get overdue requests raised in a request_date range, most overdue first"""
+    return query_maintenance_requests(**_overdue_report_query(start_date, end_date))
+
+def iter_overdue_report_requests(start_date=None, end_date=None):
+    """Stream the rows of get_overdue_report_requests() from the cursor"""
+    return iter_maintenance_requests(**_overdue_report_query(start_date, end_date))
+
+def get_technician_performance(start_date=None, end_date=None):
+    """Get TechnicianPerformance rows ordered by technician.
+
+    Without a date range the totals come from the trigger-maintained
+    technician rollup; with one they are grouped in SQL over the covering
+    (request_date, technician, status) index.
+    """
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.row_factory = TechnicianPerformance.row_factory
+    
+    if start_date or end_date:
+        clauses, params = _request_date_range(start_date, end_date)
+        cursor.execute(f'''
+            SELECT COALESCE(NULLIF(r.technician, ''), 'Unassigned'), COUNT(*),
+                   SUM(r.status = 'Repaired'), SUM(r.status = 'In Progress'), SUM(r.status = 'New')
+            FROM maintenance_requests r
+            WHERE {' AND '.join(clauses)}
+            GROUP BY 1
+            ORDER BY 1
+        ''', params)
+    else:
+        cursor.execute('''
+            SELECT COALESCE(NULLIF(technician, ''), 'Unassigned'), SUM(count),
+                   SUM(CASE WHEN status = 'Repaired' THEN count ELSE 0 END),
+                   SUM(CASE WHEN status = 'In Progress' THEN count ELSE 0 END),
+                   SUM(CASE WHEN status = 'New' THEN count ELSE 0 END)
+            FROM request_counts_by_technician
+            WHERE count > 0
+            GROUP BY 1
+            ORDER BY 1
+        ''')
+    performance = cursor.fetchall()
+    release_connection(conn)
+    
+    return performance
+
+# Group keys of the analytics columns, in the order iter_request_metric_batches() returns them
+REQUEST_METRIC_GROUPS = ('technician', 'team', 'category', 'equipment')
+
+# cache_versions tag bumped by triggers on every request write that can change
+# an analytics row (see migrations.py)
+REQUEST_METRICS_TAG = 'request_metrics'
+
+def iter_request_metric_batches(start_date=None, end_date=None, batch_size=10000):
+    """Yield batches of per-request analytics rows raised in a request_date range.
+
+    Each row is (technician, team, category, equipment, completed, open,
+    overdue, created_day): group labels with blanks replaced, 0/1 status
+    flags, and the Julian day number the request was created at.
+    """
+    clauses, params = _request_date_range(start_date, end_date)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f'''
+            SELECT COALESCE(NULLIF(r.technician, ''), 'Unassigned'),
+                   COALESCE(NULLIF(r.team, ''), 'Unassigned'),
+                   COALESCE(ec.name, 'Uncategorized'),
+                   COALESCE(e.name || ' #' || e.id, 'No equipment'),
+                   IFNULL(r.status = 'Repaired', 0),
+                   IFNULL(r.{OPEN_STATUS_FILTER}, 0),
+                   IFNULL(r.{OVERDUE_FILTER}, 0),
+                   julianday(r.created_at)
+            FROM maintenance_requests r
+            LEFT JOIN equipment_db.equipment e ON e.id = r.equipment_id
+            LEFT JOIN equipment_db.equipment_categories ec ON ec.id = e.equipment_category_id
+            {where}
+        ''', params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        release_connection(conn)
+
+# ==================== RELIABILITY ====================
+
+# Groupings of the reliability and stage time rollups
+RELIABILITY_SCOPES = ('equipment', 'team')
+
+def get_request_status_history(request_id):
+    """Get the StatusChange rows of a request, oldest first"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.row_factory = StatusChange.row_factory
+    cursor.execute(f'''
+        SELECT {select_columns(StatusChange)}
+        FROM request_status_history
+        WHERE request_id = ?
+        ORDER BY id
+    ''', (request_id,))
+    history = cursor.fetchall()
+    release_connection(conn)
+    
+    return history
+
+def get_reliability_metrics(scope='equipment'):
+    """Get ReliabilityMetrics of every equipment or team, read from the reliability rollup"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.row_factory = ReliabilityMetrics.row_factory
+    cursor.execute(f'''
+        SELECT rr.scope, rr.group_key,
+               CASE WHEN rr.scope = 'equipment' THEN COALESCE(e.name, 'Equipment #' || rr.group_key)
+                    ELSE rr.group_key END,
+               rr.failures, rr.repairs, rr.repair_seconds, rr.first_failure_at, rr.last_failure_at,
+               {seconds_between('rr.first_failure_at', 'rr.last_failure_at')}
+        FROM reliability_rollups rr
+        LEFT JOIN equipment_db.equipment e ON rr.scope = 'equipment' AND e.id = CAST(rr.group_key AS INTEGER)
+        WHERE rr.scope = ? AND (rr.failures > 0 OR rr.repairs > 0)
+        ORDER BY 3
+    ''', (scope,))
+    metrics = cursor.fetchall()
+    release_connection(conn)
+    
+    return metrics
+
+def get_stage_times(scope='equipment'):
+    """Get StageTime rows of every equipment or team, read from the stage time rollup"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.row_factory = StageTime.row_factory
+    cursor.execute(f'''
+        SELECT {select_columns(StageTime)}
+        FROM stage_time_rollups
+        WHERE scope = ? AND exits > 0
+        ORDER BY group_key, status
+    ''', (scope,))
+    stage_times = cursor.fetchall()
+    release_connection(conn)
+    
+    return stage_times
+
+# ==================== COSTS ====================
+
+# Cost totals scopes served by get_cost_totals()
+COST_SCOPES = ('equipment', 'category', 'work_center', 'month')
+
+def get_cost_totals(scope='equipment', start_month=None, end_month=None):
+    """Get CostTotal rows of every equipment, category, work center or month, read from the cost rollup.
+
+    Months may be limited to an inclusive 'YYYY-MM' range. Categories sum the
+    equipment rows, so costs of requests without equipment are only counted
+    in the work center and month totals.
+    """
+    if scope == 'category':
+        query = '''
+            SELECT 'category', COALESCE(CAST(ec.id AS TEXT), ''), COALESCE(ec.name, 'Uncategorized'),
+                   SUM(cr.repairs), SUM(cr.minutes), SUM(cr.cost_cents)
+            FROM cost_rollups cr
+            LEFT JOIN equipment_db.equipment e ON e.id = CAST(cr.group_key AS INTEGER)
+            LEFT JOIN equipment_db.equipment_categories ec ON ec.id = e.equipment_category_id
+            WHERE cr.scope = 'equipment'
+            GROUP BY ec.id
+            HAVING SUM(cr.repairs) != 0 OR SUM(cr.cost_cents) != 0
+            ORDER BY 6 DESC, 3
+        '''
+        params = ()
+    else:
+        clauses, params = ['cr.scope = ?', '(cr.repairs != 0 OR cr.cost_cents != 0)'], [scope]
+        if scope == 'month' and start_month:
+            clauses.append('cr.group_key >= ?')
+            params.append(start_month)
+        if scope == 'month' and end_month:
+            clauses.append('cr.group_key <= ?')
+            params.append(end_month)
+        query = f'''
+            SELECT cr.scope, cr.group_key,
+                   CASE cr.scope WHEN 'equipment' THEN COALESCE(e.name, 'Equipment #' || cr.group_key)
+                                 WHEN 'work_center' THEN COALESCE(wc.name, 'Work Center #' || cr.group_key)
+                                 ELSE cr.group_key END,
+                   cr.repairs, cr.minutes, cr.cost_cents
+            FROM cost_rollups cr
+            LEFT JOIN equipment_db.equipment e ON cr.scope = 'equipment' AND e.id = CAST(cr.group_key AS INTEGER)
+            LEFT JOIN work_centers wc ON cr.scope = 'work_center' AND wc.id = CAST(cr.group_key AS INTEGER)
+            WHERE {' AND '.join(clauses)}
+            ORDER BY {'cr.group_key' if scope == 'month' else '6 DESC, 3'}
+        '''
+    
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.row_factory = CostTotal.row_factory
+    cursor.execute(query, params)
+    totals = cursor.fetchall()
+    release_connection(conn)
+    
+    return totals
+
+def get_request_cost_entries(request_id):
+    """Get the CostEntry rows recorded for one maintenance request, oldest first"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.row_factory = CostEntry.row_factory
+    cursor.execute(f'''
+        SELECT {select_columns(CostEntry)}
+        FROM cost_ledger
+        WHERE request_id = ?
+        ORDER BY id
+    ''', (request_id,))
+    entries = cursor.fetchall()
+    release_connection(conn)
+    
+    return entries
+
+# ==================== DOWNTIME ====================
+
+# Downtime series scopes -> request column grouping them. downtime_daily holds
+# the merged downtime of every group per UTC day; triggers mark a group in
+# downtime_dirty (bumping its version) whenever one of its requests changes,
+# and refresh_downtime() in oee.py recomputes only the dirty groups.
+DOWNTIME_SCOPES = {
+    'work_center': 'work_center_id',
+    'equipment': 'equipment_id',
+}
+
+def get_dirty_downtime_groups():
+    """Get (scope, group_id, version) of every group whose downtime needs recomputing"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.execute('SELECT scope, group_id, version FROM downtime_dirty')
+    groups = cursor.fetchall()
+    release_connection(conn)
+    
+    return groups
+
+def get_downtime_sources(scope, group_id):
+    """Get the requests of one work center or piece of equipment as downtime sources.
+
+    Rows are (scheduled_start, duration_minutes, request_type, opened_at,
+    repaired_at), the last two being epoch seconds of the request's first
+    status history row and of its latest move to Repaired. Scrapped requests
+    are left out.
+    """
+    column = DOWNTIME_SCOPES[scope]
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT r.scheduled_start, r.duration_minutes, r.request_type,
+               (SELECT CAST(strftime('%s', h.changed_at) AS INTEGER) FROM request_status_history h
+                WHERE h.request_id = r.id ORDER BY h.id LIMIT 1),
+               (SELECT CAST(strftime('%s', MAX(h.changed_at)) AS INTEGER) FROM request_status_history h
+                WHERE h.request_id = r.id AND h.to_status = 'Repaired')
+        FROM maintenance_requests r
+        WHERE r.{column} = ? AND r.status IS NOT 'Scrap'
+    ''', (group_id,))
+    sources = cursor.fetchall()
+    release_connection(conn)
+    
+    return sources
+
+def replace_downtime_days(groups):
+    """Store recomputed daily downtime and clear the groups' dirty marks in one transaction.
+
+    groups is a list of (scope, group_id, version, days), days being a list
+    of (day, planned_seconds, unplanned_seconds). A mark is only cleared
+    while it still has `version`, so a change made during the recomputation
+    leaves its group dirty.
+    """
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute('BEGIN IMMEDIATE')
+        for scope, group_id, version, days in groups:
+            cursor.execute('DELETE FROM downtime_daily WHERE scope = ? AND group_id = ?', (scope, group_id))
+            cursor.executemany('''
+                INSERT INTO downtime_daily (scope, group_id, day, planned_seconds, unplanned_seconds)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(scope, group_id, day, planned, unplanned) for day, planned, unplanned in days])
+            cursor.execute('DELETE FROM downtime_dirty WHERE scope = ? AND group_id = ? AND version = ?',
+                           (scope, group_id, version))
+        conn.commit()
+        return True, "Downtime refreshed successfully"
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def mark_all_downtime_dirty():
+    """Mark every work center and piece of equipment with requests for recomputation"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    
+    try:
+        for scope, column in DOWNTIME_SCOPES.items():
+            cursor.execute(f'''
+                INSERT INTO downtime_dirty (scope, group_id)
+                SELECT DISTINCT '{scope}', {column} FROM maintenance_requests WHERE {column} IS NOT NULL
+                ON CONFLICT (scope, group_id) DO UPDATE SET version = version + 1
+            ''')
+        conn.commit()
+        return True, "Downtime marked for recomputation"
+    except Exception as e:
+        conn.rollback()
+        return False, f"Error: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def get_downtime_days(scope, start_day, end_day):
+    """Get (group_id, name, oee_target, day, planned_seconds, unplanned_seconds) for days in [start_day, end_day)"""
+    if scope == 'work_center':
+        name, target, join = 'wc.name', 'wc.oee_target', 'LEFT JOIN work_centers wc ON wc.id = d.group_id'
+    else:
+        name, target, join = 'e.name', 'NULL', 'LEFT JOIN equipment_db.equipment e ON e.id = d.group_id'
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT d.group_id, {name}, {target}, d.day, d.planned_seconds, d.unplanned_seconds
+        FROM downtime_daily d
+        {join}
+        WHERE d.scope = ? AND d.day >= ? AND d.day < ?
+        ORDER BY d.group_id, d.day
+    ''', (scope, start_day, end_day))
+    days = cursor.fetchall()
+    release_connection(conn)
+    
+    return days
+
+# ==================== FULL-TEXT SEARCH ====================
+
+# FTS5 external-content indexes kept in sync by triggers (see migrations.py):
+# index table -> (content table, indexed columns)
+SEARCH_INDEXES = {
+    'request_search': ('maintenance_requests', ('subject', 'description', 'notes', 'instructions')),
+    'comment_search': ('worksheet_comments', ('comment',)),
+}
+
+# bm25() weights of the request_search columns: a subject match ranks highest
+REQUEST_SEARCH_WEIGHTS = (10.0, 4.0, 2.0, 2.0)
+
+# Control characters snippet() wraps matches in; replaced by <mark> after escaping
+SEARCH_MARK_START = '\x02'
+SEARCH_MARK_END = '\x03'
+
+SEARCH_TERM = re.compile(r'(\w+)(\*?)')
+
+# Only the newest matches are scored, so very common terms cost a bounded
+# amount of bm25() work instead of one score per matching row
+SEARCH_RANK_WINDOW = 5000
+
+def build_search_query(text):
+    """Turn user input into an FTS5 MATCH expression.
+
+    Every word must match; words are quoted so FTS5 operators in the input
+    are treated as text. The last word (or any word ending in *) matches as a
+    prefix. Returns None when the input has no searchable words.
+    """
+    terms = SEARCH_TERM.findall(text or '')
+    if not terms:
+        return None
+    return ' '.join(f'"{word}"' + ('*' if star or i == len(terms) - 1 else '')
+                    for i, (word, star) in enumerate(terms))
+
+def highlight_snippet(snippet):
+    """HTML-escape a snippet() result and mark the matched terms"""
+    return html.escape(snippet or '').replace(SEARCH_MARK_START, '<mark>').replace(SEARCH_MARK_END, '</mark>')
+
+def _search_rowid_cutoff(cursor, index, match):
+    """Get the lowest rowid among the newest SEARCH_RANK_WINDOW matches of index"""
+    cursor.execute(f'''
+        SELECT MIN(rowid) FROM (
+            SELECT rowid FROM {index} WHERE {index} MATCH ? ORDER BY rowid DESC LIMIT ?
+        )
+    ''', (match, SEARCH_RANK_WINDOW))
+    return cursor.fetchone()[0] or 0
+
+def search_index_available(cursor):
+    """Check that the FTS5 search tables exist (SQLite may be built without FTS5)"""
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('request_search', 'comment_search')")
+    return cursor.fetchone()[0] == len(SEARCH_INDEXES)
+
+def search_maintenance_requests(text, limit=20):
+    """Search request text and worksheet comments, best matches first.
+
+    Returns {'requests': [...], 'comments': [...]} where every hit carries a
+    highlighted snippet_html. Ranking covers the newest SEARCH_RANK_WINDOW
+    matches of each index. Without FTS5 it falls back to a LIKE scan.
+    """
+    match = build_search_query(text)
+    if match is None:
+        return {'requests': [], 'comments': []}
+    
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    
+    if not search_index_available(cursor):
+        release_connection(conn)
+        return _search_maintenance_requests_like(text, limit)
+    
+    cursor.execute(f'''
+        SELECT r.id, r.subject, r.status, r.created_at,
+               bm25(request_search, {', '.join(map(str, REQUEST_SEARCH_WEIGHTS))}) AS rank,
+               snippet(request_search, -1, ?, ?, '…', 12)
+        FROM request_search
+        JOIN maintenance_requests r ON r.id = request_search.rowid
+        WHERE request_search MATCH ? AND request_search.rowid >= ?
+        ORDER BY rank
+        LIMIT ?
+    ''', (SEARCH_MARK_START, SEARCH_MARK_END, match,
+          _search_rowid_cutoff(cursor, 'request_search', match), limit))
+    requests = [{'id': row[0], 'subject': row[1], 'status': row[2], 'created_at': row[3],
+                 'rank': row[4], 'snippet_html': highlight_snippet(row[5])}
+                for row in cursor.fetchall()]
+    
+    cursor.execute('''
+        SELECT c.id, c.request_id, r.subject, c.user, c.created_at,
+               bm25(comment_search) AS rank,
+               snippet(comment_search, 0, ?, ?, '…', 12)
+        FROM comment_search
+        JOIN worksheet_comments c ON c.id = comment_search.rowid
+        LEFT JOIN maintenance_requests r ON r.id = c.request_id
+        WHERE comment_search MATCH ? AND comment_search.rowid >= ?
+        ORDER BY rank
+        LIMIT ?
+    ''', (SEARCH_MARK_START, SEARCH_MARK_END, match,
+          _search_rowid_cutoff(cursor, 'comment_search', match), limit))
+    comments = [{'id': row[0], 'request_id': row[1], 'subject': row[2], 'user': row[3],
+                 'created_at': row[4], 'rank': row[5], 'snippet_html': highlight_snippet(row[6])}
+                for row in cursor.fetchall()]
+    release_connection(conn)
+    
+    return {'requests': requests, 'comments': comments}
+
+def _search_maintenance_requests_like(text, limit):
+    """Unranked substring search, used only when SQLite lacks FTS5"""
+    pattern = f'%{text.strip()}%'
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT id, subject, status, created_at FROM maintenance_requests
+        WHERE subject LIKE ? OR description LIKE ? OR notes LIKE ? OR instructions LIKE ?
+        ORDER BY created_at DESC
+        LIMIT ?
+    ''', (pattern, pattern, pattern, pattern, limit))
+    requests = [{'id': row[0], 'subject': row[1], 'status': row[2], 'created_at': row[3],
+                 'rank': None, 'snippet_html': html.escape(row[1] or '')}
+                for row in cursor.fetchall()]
+    
+    cursor.execute('''
+        SELECT c.id, c.request_id, r.subject, c.user, c.created_at, c.comment
+        FROM worksheet_comments c
+        LEFT JOIN maintenance_requests r ON r.id = c.request_id
+        WHERE c.comment LIKE ?
+        ORDER BY c.created_at DESC
+        LIMIT ?
+    ''', (pattern, limit))
+    comments = [{'id': row[0], 'request_id': row[1], 'subject': row[2], 'user': row[3],
+                 'created_at': row[4], 'rank': None, 'snippet_html': html.escape(row[5] or '')}
+                for row in cursor.fetchall()]
+    release_connection(conn)
+    
+    return {'requests': requests, 'comments': comments}
+
+def check_search_indexes():
+    """Run the FTS5 integrity check against the content tables.
+
+    Returns (success, message).
+    """
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    try:
+        if not search_index_available(cursor):
+            return False, "Full-text search tables are missing (SQLite without FTS5?)"
+        for index in SEARCH_INDEXES:
+            cursor.execute(f"INSERT INTO {index} ({index}, rank) VALUES ('integrity-check', 1)")
+        return True, "Search indexes match their content tables"
+    except sqlite3.DatabaseError as e:
+        return False, f"Error: {str(e)}"
+    finally:
+        release_connection(conn)
+
+def rebuild_search_indexes():
+    """Rebuild the FTS5 indexes from their content tables"""
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    try:
+        if not search_index_available(cursor):
+            return False, "Full-text search tables are missing (SQLite without FTS5?)"
+        for index in SEARCH_INDEXES:
+            cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+        conn.commit()
+        return True, "Search indexes rebuilt successfully"
+    except Exception as e:
+        return False, f"Error: {str(e)}"
+    finally:
+        release_connection(conn)
+
 # ==================== WORK CENTERS DATABASE FUNCTIONS ====================
 
+WORK_CENTER_COLUMNS = select_columns(WorkCenter)
+
+# cache_versions tag bumped by triggers on every request write that can move
+# a work center booking (see migrations.py)
+WORK_CENTER_BOOKINGS_TAG = 'work_center_bookings'
+
+def get_cache_version(db_path, tag):
+    """Get the current counter of a cache_versions tag"""
+    return _reference_versions(db_path, (tag,))[0]
+
+def get_work_center_bookings():
+    """Get (work_center_id, start, end) epoch intervals of scheduled requests booked on a work center.
+
+    Scrapped requests book nothing; requests without a readable duration
+    take DEFAULT_JOB_MINUTES.
+    """
+    conn = get_connection(REQUESTS_DB)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        SELECT work_center_id, scheduled_start,
+               scheduled_start + COALESCE(duration_minutes, {DEFAULT_JOB_MINUTES}) * 60
+        FROM maintenance_requests
+        WHERE work_center_id IS NOT NULL AND scheduled_start IS NOT NULL AND status IS NOT 'Scrap'
+    ''')
+    bookings = cursor.fetchall()
+    release_connection(conn)
+    
+    return bookings
+
+@reference_cache('work_centers')
 def get_all_work_centers():
     """Get all work centers from requests database"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM work_centers ORDER BY name ASC')
+    cursor.row_factory = WorkCenter.row_factory
+    cursor.execute(f'SELECT {WORK_CENTER_COLUMNS} FROM work_centers ORDER BY name ASC')
     work_centers = cursor.fetchall()
-    conn.close()
+    release_connection(conn)
     return work_centers
 
 def create_work_center(name, code=None, tag=None, alternative_workcenters=None, cost_per_hour=0.0, capacity_time_efficiency=100.0, oee_target=0.0, company='My company'):
     """Create a new work center"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     try:
         cursor.execute('''
@@ -1074,24 +2074,26 @@ def create_work_center(name, code=None, tag=None, alternative_workcenters=None,
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         ''', (name, code, tag, alternative_workcenters, cost_per_hour, capacity_time_efficiency, oee_target, company))
         conn.commit()
+        invalidate_reference_cache('work_centers')
         return True, "Work center created successfully"
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_work_center_by_id(work_center_id):
     """Get a work center by ID"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM work_centers WHERE id = ?', (work_center_id,))
+    cursor.row_factory = WorkCenter.row_factory
+    cursor.execute(f'SELECT {WORK_CENTER_COLUMNS} FROM work_centers WHERE id = ?', (work_center_id,))
     work_center = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     return work_center
 
 def update_work_center(work_center_id, name=None, code=None, tag=None, alternative_workcenters=None, cost_per_hour=None, capacity_time_efficiency=None, oee_target=None, company=None):
     """Update a work center"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     try:
         updates = []
@@ -1127,40 +2129,46 @@ def update_work_center(work_center_id, name=None, code=None, tag=None, alternati
             values.append(work_center_id)
             cursor.execute(f'UPDATE work_centers SET {", ".join(updates)} WHERE id = ?', values)
             conn.commit()
+            invalidate_reference_cache('work_centers')
             return True, "Work center updated successfully"
         return False, "No fields to update"
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def delete_work_center(work_center_id):
     """Delete a work center"""
-    conn = sqlite3.connect(REQUESTS_DB)
+    conn = get_connection(REQUESTS_DB)
     cursor = conn.cursor()
     try:
         cursor.execute('DELETE FROM work_centers WHERE id = ?', (work_center_id,))
         conn.commit()
+        invalidate_reference_cache('work_centers')
         return True, "Work center deleted successfully"
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 # ==================== EQUIPMENT CATEGORIES DATABASE FUNCTIONS ====================
 
+EQUIPMENT_CATEGORY_COLUMNS = select_columns(EquipmentCategory)
+
+@reference_cache('equipment_categories')
 def get_all_equipment_categories():
     """Get all equipment categories from equipment database"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM equipment_categories ORDER BY name ASC')
+    cursor.row_factory = EquipmentCategory.row_factory
+    cursor.execute(f'SELECT {EQUIPMENT_CATEGORY_COLUMNS} FROM equipment_categories ORDER BY name ASC')
     categories = cursor.fetchall()
-    conn.close()
+    release_connection(conn)
     return categories
 
 def create_equipment_category(name, responsible=None, company='My Company (San Francisco)'):
     """Create a new equipment category"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     try:
         cursor.execute('''
@@ -1168,24 +2176,26 @@ def create_equipment_category(name, responsible=None, company='My Company (San F
             VALUES (?, ?, ?)
         ''', (name, responsible, company))
         conn.commit()
+        invalidate_reference_cache('equipment_categories')
         return True, "Equipment category created successfully"
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def get_equipment_category_by_id(category_id):
     """Get an equipment category by ID"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
-    cursor.execute('SELECT * FROM equipment_categories WHERE id = ?', (category_id,))
+    cursor.row_factory = EquipmentCategory.row_factory
+    cursor.execute(f'SELECT {EQUIPMENT_CATEGORY_COLUMNS} FROM equipment_categories WHERE id = ?', (category_id,))
     category = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     return category
 
 def update_equipment_category(category_id, name=None, responsible=None, company=None):
     """Update an equipment category"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     try:
         updates = []
@@ -1206,25 +2216,27 @@ def update_equipment_category(category_id, name=None, responsible=None, company=
             values.append(category_id)
             cursor.execute(f'UPDATE equipment_categories SET {", ".join(updates)} WHERE id = ?', values)
             conn.commit()
+            invalidate_reference_cache('equipment_categories')
             return True, "Equipment category updated successfully"
         return False, "No fields to update"
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 def delete_equipment_category(category_id):
     """Delete an equipment category"""
-    conn = sqlite3.connect(EQUIPMENT_DB)
+    conn = get_connection(EQUIPMENT_DB)
     cursor = conn.cursor()
     try:
         cursor.execute('DELETE FROM equipment_categories WHERE id = ?', (category_id,))
         conn.commit()
+        invalidate_reference_cache('equipment_categories')
         return True, "Equipment category deleted successfully"
     except Exception as e:
         return False, f"Error: {str(e)}"
     finally:
-        conn.close()
+        release_connection(conn)
 
 # ==================== COMBINED INITIALIZATION ====================
 
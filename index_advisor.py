@@ -0,0 +1,322 @@
+"""
+Index advisor for the GearGuard databases.
+
+Runs EXPLAIN QUERY PLAN over every SQL statement written in database.py and
+flags full table scans and temporary sort B-trees, and benchmarks the hot
+request queries on a synthetic database before and after the index
+migrations.
+"""
+import ast
+import inspect
+import os
+import random
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from database import (
+    EQUIPMENT_DB, REQUESTS_DB, OPEN_STATUSES, OPEN_STATUS_FILTER, OVERDUE_FILTER, REQUEST_FILTERS, REQUEST_COLUMNS,
+    REQUEST_JOINS, REQUEST_SELECT, DEFAULT_JOB_MINUTES, get_connection, release_connection, to_epoch
+)
+from migrations import migrate
+
+SQL_STATEMENT = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b')
+NAMED_PARAMETER = re.compile(r'(?<![\w:]):([A-Za-z_]\w*)')
+
+# Query shapes assembled at runtime, which static extraction cannot see
+DYNAMIC_QUERIES = (
+    ('query_maintenance_requests', REQUESTS_DB, REQUEST_SELECT + ' ORDER BY r.created_at DESC'),
+    ('query_maintenance_requests', REQUESTS_DB, REQUEST_SELECT + ' ORDER BY r.created_at DESC LIMIT 50'),
+    ('query_maintenance_requests', REQUESTS_DB,
+     REQUEST_SELECT + ' WHERE r.status = ? ORDER BY r.created_at DESC'),
+    ('query_maintenance_requests', REQUESTS_DB, REQUEST_SELECT + ' WHERE r.id = ? ORDER BY r.id'),
+    ('get_report_requests', REQUESTS_DB,
+     REQUEST_SELECT + ' WHERE r.request_date >= ? AND r.request_date <= ? AND r.status = ?'
+                      ' ORDER BY r.request_date DESC, r.id DESC'),
+    ('get_overdue_report_requests', REQUESTS_DB,
+     REQUEST_SELECT + f' WHERE r.{OVERDUE_FILTER} AND r.request_date >= ? AND r.request_date <= ?'
+                      ' ORDER BY r.due_at, r.id'),
+    ('get_overdue_report_requests', REQUESTS_DB,
+     f'{REQUEST_COLUMNS} FROM maintenance_requests r INDEXED BY idx_requests_open_due_date{REQUEST_JOINS}'
+     f' WHERE r.{OVERDUE_FILTER} ORDER BY r.due_at, r.id'),
+    ('get_calendar_requests', REQUESTS_DB,
+     REQUEST_SELECT + ' WHERE r.scheduled_start >= ? AND r.scheduled_start < ? ORDER BY r.scheduled_start, r.id'),
+) + tuple(
+    # One filtered keyset page per REQUEST_FILTERS entry
+    ('get_maintenance_requests_page', REQUESTS_DB,
+     REQUEST_SELECT + f' WHERE {clause} AND (r.created_at, r.id) < (?, ?)'
+                      ' ORDER BY r.created_at DESC, r.id DESC LIMIT ?')
+    for clause, _ in REQUEST_FILTERS.values()
+)
+
+# Schema version without any secondary index, used as the "before" benchmark
+BASELINE_VERSION = 1
+
+# Benchmark week, as epoch seconds for the normalized columns and as text for the baseline ones
+WEEK_START, WEEK_END = datetime(2025, 3, 3), datetime(2025, 3, 10)
+WEEK_EPOCHS = (to_epoch(WEEK_START), to_epoch(WEEK_END))
+# Longest duration _seed_requests() gives a job, the look-back of get_scheduled_jobs()
+SEED_LONGEST_JOB_MINUTES = 8 * 60
+
+BENCHMARK_QUERIES = (
+    ('overdue count',
+     f'SELECT COUNT(*) FROM maintenance_requests INDEXED BY idx_requests_open_due_date WHERE {OVERDUE_FILTER}', ()),
+    ('overdue report',
+     f'{REQUEST_COLUMNS} FROM maintenance_requests r INDEXED BY idx_requests_open_due_date{REQUEST_JOINS}'
+     f' WHERE r.{OVERDUE_FILTER} ORDER BY r.due_at, r.id', ()),
+    ('latest 50 requests', REQUEST_SELECT + ' ORDER BY r.created_at DESC LIMIT 50', ()),
+    ('requests by status', REQUEST_SELECT + ' WHERE r.status = ? ORDER BY r.created_at DESC LIMIT 50',
+     ('Blocked',)),
+    ('requests for one equipment', REQUEST_SELECT + ' WHERE r.equipment_id = ? ORDER BY r.created_at DESC',
+     (42,)),
+    ('technician workload',
+     'SELECT status, COUNT(*) FROM maintenance_requests WHERE technician = ? GROUP BY status',
+     ('Technician 7',)),
+    ('calendar week',
+     REQUEST_SELECT + ' WHERE r.scheduled_start >= ? AND r.scheduled_start < ? ORDER BY r.scheduled_start, r.id',
+     WEEK_EPOCHS),
+    ('scheduled jobs in one week',
+     f'SELECT id, technician, team, scheduled_start, '
+     f'scheduled_start + COALESCE(duration_minutes, {DEFAULT_JOB_MINUTES}) * 60 AS end_at '
+     f'FROM maintenance_requests INDEXED BY idx_requests_scheduled_start '
+     f'WHERE scheduled_start >= ? AND scheduled_start < ? AND {OPEN_STATUS_FILTER} AND end_at > ?',
+     (WEEK_EPOCHS[0] - SEED_LONGEST_JOB_MINUTES * 60, WEEK_EPOCHS[1], WEEK_EPOCHS[0])),
+    ('comments for one request',
+     'SELECT id, request_id, user, comment, created_at FROM worksheet_comments '
+     'WHERE request_id = ? ORDER BY created_at DESC', (1234,)),
+)
+
+# REQUEST_SELECT at BASELINE_VERSION, before migration 10 added the normalized time columns
+BASELINE_REQUEST_SELECT = REQUEST_SELECT.replace('r.scheduled_start, r.due_at, r.duration_minutes', 'NULL, NULL, NULL')
+
+# The same queries as written against the BASELINE_VERSION columns, for the
+# benchmark queries filtering or sorting on columns that later migrations added
+BASELINE_QUERIES = {
+    'overdue count':
+        (f"SELECT COUNT(*) FROM maintenance_requests WHERE {OPEN_STATUS_FILTER} "
+         f"AND due_date IS NOT NULL AND due_date < date('now')", ()),
+    'overdue report':
+        (REQUEST_SELECT + f" WHERE r.{OPEN_STATUS_FILTER} AND r.due_date IS NOT NULL AND r.due_date < date('now')"
+                          " ORDER BY r.due_date, r.id", ()),
+    'calendar week':
+        (REQUEST_SELECT + ' WHERE r.scheduled_date >= ? AND r.scheduled_date < ? ORDER BY r.scheduled_date, r.id',
+         (WEEK_START.strftime('%Y-%m-%d'), WEEK_END.strftime('%Y-%m-%d'))),
+    'scheduled jobs in one week':
+        (f'SELECT id, technician, team, scheduled_date, duration FROM maintenance_requests '
+         f'WHERE scheduled_date >= ? AND scheduled_date < ? AND {OPEN_STATUS_FILTER}',
+         ((WEEK_START - timedelta(minutes=SEED_LONGEST_JOB_MINUTES)).strftime('%Y-%m-%d %H:%M:%S'),
+          WEEK_END.strftime('%Y-%m-%d'))),
+}
+
+
+# ==================== QUERY EXTRACTION ====================
+
+def _resolve_sql(node, module):
+    """Get the SQL text of a string literal or an f-string built from module string and integer constants"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.JoinedStr):
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(value.value)
+            elif isinstance(value, ast.FormattedValue) and isinstance(value.value, ast.Name) \
+                    and isinstance(getattr(module, value.value.id, None), (str, int)):
+                parts.append(str(getattr(module, value.value.id)))
+            else:
+                return None
+        return ''.join(parts)
+    return None
+
+
+def _connection_databases(function_node, module):
+    """Map the connection and cursor variables of a function to database paths"""
+    databases = {}
+    for node in ast.walk(function_node):
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1
+                and isinstance(node.targets[0], ast.Name) and isinstance(node.value, ast.Call)):
+            continue
+        call = node.value
+        if getattr(call.func, 'id', None) == 'get_connection' and call.args \
+                and isinstance(call.args[0], ast.Name):
+            databases[node.targets[0].id] = getattr(module, call.args[0].id, None)
+        elif isinstance(call.func, ast.Attribute) and call.func.attr == 'cursor' \
+                and isinstance(call.func.value, ast.Name) and call.func.value.id in databases:
+            databases[node.targets[0].id] = databases[call.func.value.id]
+    return databases
+
+
+def extract_queries(module=database):
+    """Collect (function name, db_path, sql) for every statement executed in module"""
+    tree = ast.parse(inspect.getsource(module))
+    queries = []
+
+    for function_node in tree.body:
+        if not isinstance(function_node, ast.FunctionDef):
+            continue
+        databases = _connection_databases(function_node, module)
+
+        for node in ast.walk(function_node):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ('execute', 'executemany') and node.args
+                    and isinstance(node.func.value, ast.Name)):
+                continue
+            db_path = databases.get(node.func.value.id)
+            sql = _resolve_sql(node.args[0], module)
+            if db_path and sql and SQL_STATEMENT.match(sql):
+                queries.append((function_node.name, db_path, ' '.join(sql.split())))
+
+    return queries + [(name, db_path, ' '.join(sql.split())) for name, db_path, sql in DYNAMIC_QUERIES]
+
+
+# ==================== PLAN ANALYSIS ====================
+
+def _placeholder_params(sql):
+    """Build NULL parameters matching the placeholders of sql"""
+    names = NAMED_PARAMETER.findall(sql)
+    if names:
+        return {name: None for name in names}
+    return (None,) * sql.count('?')
+
+
+def explain(conn, sql, params=None):
+    """Get the EXPLAIN QUERY PLAN detail lines of sql"""
+    if params is None:
+        params = _placeholder_params(sql)
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+
+
+def plan_issues(plan, sql):
+    """Flag full table scans and temporary sorts in a query plan"""
+    filtered = re.search(r'\bWHERE\b', sql, re.IGNORECASE) is not None
+    issues = []
+    for detail in plan:
+        if detail.startswith('SCAN ') and 'USING' not in detail and 'CONSTANT ROW' not in detail:
+            table = detail.split()[1]
+            if filtered:
+                issues.append(f'full table scan of {table}')
+            else:
+                issues.append(f'reads all of {table} (no WHERE clause)')
+        elif detail.startswith('USE TEMP B-TREE'):
+            issues.append(detail.lower())
+    return issues
+
+
+def advise(queries=None):
+    """Explain every query and return a list of findings dicts"""
+    findings = []
+    for function_name, db_path, sql in (queries or extract_queries()):
+        conn = get_connection(db_path)
+        try:
+            plan = explain(conn, sql)
+            issues = plan_issues(plan, sql)
+        except sqlite3.Error as e:
+            plan, issues = [], [f'could not explain: {e}']
+        finally:
+            release_connection(conn)
+        findings.append({
+            'function': function_name,
+            'database': db_path,
+            'sql': sql,
+            'plan': plan,
+            'issues': issues,
+        })
+    return findings
+
+
+# ==================== BENCHMARK ====================
+
+# Durations given to synthetic requests; None is an unreadable one (DEFAULT_JOB_MINUTES)
+SEED_DURATIONS = ('30 min', '1h', '1 hour 30 min', '2h', '4h', '8h', None)
+
+
+def _seed_requests(conn, rows, seed=7):
+    """Fill a BASELINE_VERSION requests database with rows synthetic maintenance requests.
+
+    Only the text schedule, due and duration columns exist at the baseline;
+    migrating afterwards backfills scheduled_start, due_at and
+    duration_minutes from them, as on an upgraded production database.
+    """
+    rng = random.Random(seed)
+    statuses = OPEN_STATUSES + ('Repaired', 'Repaired', 'Repaired', 'Scrap')
+    start = datetime(2023, 1, 1)
+
+    def request_rows():
+        for i in range(rows):
+            created = start + timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+            scheduled = None
+            if rng.random() < 0.5:
+                scheduled = created + timedelta(days=rng.randrange(30))
+                # Forms submit a date and time; older rows carry only the date
+                scheduled = scheduled.strftime('%Y-%m-%d %H:%M:%S' if rng.random() < 0.5 else '%Y-%m-%d')
+            due = (created + timedelta(days=rng.randrange(60))).strftime('%Y-%m-%d')
+            yield (f'Request {i}', 'employee@example.com', f'Technician {rng.randrange(50)}',
+                   rng.choice(statuses), rng.choice(('Low', 'Medium', 'High')), scheduled, due,
+                   rng.choice(SEED_DURATIONS), rng.randrange(1, 1001), f'Team {rng.randrange(10)}',
+                   created.strftime('%Y-%m-%d'), created.strftime('%Y-%m-%d %H:%M:%S'))
+
+    conn.executemany('''
+        INSERT INTO maintenance_requests (subject, employee, technician, status, priority, scheduled_date,
+                                          due_date, duration, equipment_id, team, request_date, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', request_rows())
+    conn.executemany('INSERT INTO worksheet_comments (request_id, user, comment) VALUES (?, ?, ?)',
+                     ((rng.randrange(1, rows + 1), 'technician@example.com', 'Checked and updated')
+                      for _ in range(rows)))
+    conn.commit()
+
+
+def _time_queries(conn, repeat, baseline=False):
+    """Get the best-of-repeat time in milliseconds of each benchmark query.
+
+    With baseline, queries listed in BASELINE_QUERIES run in their baseline
+    form and joined request queries select NULL for the normalized columns.
+    """
+    timings = {}
+    for name, sql, params in BENCHMARK_QUERIES:
+        if baseline:
+            sql, params = BASELINE_QUERIES.get(name, (sql, params))
+            sql = sql.replace(REQUEST_SELECT, BASELINE_REQUEST_SELECT)
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return timings
+
+
+def benchmark(rows=100_000, repeat=5):
+    """Time the hot request queries without and with the index migrations.
+
+    The "before" pass runs on the baseline schema, with the queries that read
+    later columns in their BASELINE_QUERIES form.
+    Returns a list of (query name, before ms, after ms).
+    """
+    workdir = tempfile.mkdtemp(prefix='gearguard-bench-')
+    try:
+        equipment_conn = sqlite3.connect(os.path.join(workdir, EQUIPMENT_DB))
+        migrate(EQUIPMENT_DB, conn=equipment_conn)
+        equipment_conn.executemany('INSERT INTO equipment (name) VALUES (?)',
+                                   ((f'Equipment {i}',) for i in range(1, 1001)))
+        equipment_conn.commit()
+        equipment_conn.close()
+
+        conn = sqlite3.connect(os.path.join(workdir, REQUESTS_DB))
+        conn.execute('ATTACH DATABASE ? AS equipment_db', (os.path.join(workdir, EQUIPMENT_DB),))
+        migrate(REQUESTS_DB, target=BASELINE_VERSION, conn=conn)
+        _seed_requests(conn, rows)
+        before = _time_queries(conn, repeat, baseline=True)
+
+        migrate(REQUESTS_DB, conn=conn)
+        after = _time_queries(conn, repeat)
+        conn.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return [(name, before[name], after[name]) for name, _, _ in BENCHMARK_QUERIES]
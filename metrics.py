@@ -0,0 +1,189 @@
+"""
+Request metrics for GearGuard in the Prometheus text exposition format.
+
+app.py calls request_started() before each request and request_finished()
+when it is torn down, which records per endpoint the latency, the response
+size, the status code, and the number of SQLite queries and seconds spent in
+them (counted by the instrumented connections in database.py). /metrics
+renders everything recorded by this process; with several workers, each
+worker serves its own numbers.
+
+Endpoints are Flask endpoint names, not paths, so the number of series stays
+bounded; requests matching no route are recorded as 'unmatched'. Responses
+streamed with stream_with_context are recorded once their last chunk is
+sent, without a size.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from database import get_pool_stats, get_cache_stats, get_query_totals, start_query_stats, stop_query_stats
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape_label(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    """Format label names and values as {name="value",...}"""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    """Format a sample value, integers without a decimal point"""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic counter per label values"""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{format_labels(self.labels, label_values)} {format_value(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    """Value that goes up and down, per label values"""
+
+    def dec(self, *label_values):
+        self.inc(*label_values, amount=-1)
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class Histogram:
+    """Observation counts in fixed buckets, with their sum, per label values"""
+
+    def __init__(self, name, help_text, buckets, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [per-bucket counts (last is +Inf), sum]
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        bounds = [format_value(bound) for bound in self.buckets] + ['+Inf']
+        with self._lock:
+            for label_values, (counts, total) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(bounds, counts):
+                    cumulative += count
+                    labels = format_labels(self.labels, label_values, f'le="{bound}"')
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = format_labels(self.labels, label_values)
+                lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+                lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+# ==================== METRICS ====================
+
+REQUESTS_TOTAL = Counter('gearguard_http_requests_total', 'HTTP requests by endpoint, method and status code.',
+                         ('endpoint', 'method', 'status'))
+REQUEST_LATENCY = Histogram('gearguard_http_request_duration_seconds', 'HTTP request latency in seconds.',
+                            LATENCY_BUCKETS, ('endpoint',))
+RESPONSE_SIZE = Histogram('gearguard_http_response_size_bytes', 'HTTP response body size in bytes.',
+                          SIZE_BUCKETS, ('endpoint',))
+IN_FLIGHT = Gauge('gearguard_http_requests_in_flight', 'HTTP requests being served.', ('endpoint',))
+REQUEST_QUERIES = Histogram('gearguard_http_request_db_queries', 'SQLite statements run per HTTP request.',
+                            QUERY_COUNT_BUCKETS, ('endpoint',))
+REQUEST_DB_TIME = Histogram('gearguard_http_request_db_seconds', 'Seconds spent in SQLite per HTTP request.',
+                            LATENCY_BUCKETS, ('endpoint',))
+
+HTTP_METRICS = (REQUESTS_TOTAL, REQUEST_LATENCY, RESPONSE_SIZE, IN_FLIGHT, REQUEST_QUERIES, REQUEST_DB_TIME)
+
+_request = threading.local()
+
+
+def request_started(endpoint):
+    """Start timing a request and counting its queries in the calling thread"""
+    _request.state = (endpoint, time.perf_counter())
+    IN_FLIGHT.inc(endpoint)
+    start_query_stats()
+
+
+def request_finished(method, status, size):
+    """Record the calling thread's request; size is None when unknown (streamed)"""
+    state = getattr(_request, 'state', None)
+    if state is None:
+        return
+    _request.state = None
+    endpoint, started = state
+    queries, db_seconds = stop_query_stats()
+
+    IN_FLIGHT.dec(endpoint)
+    REQUESTS_TOTAL.inc(endpoint, method, str(status))
+    REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint)
+    if size is not None:
+        RESPONSE_SIZE.observe(size, endpoint)
+    REQUEST_QUERIES.observe(queries, endpoint)
+    REQUEST_DB_TIME.observe(db_seconds, endpoint)
+
+
+def process_metrics():
+    """Render the process-wide database, pool and cache counters"""
+    queries = Counter('gearguard_db_queries_total', 'SQLite statements run, by database.', ('database',))
+    seconds = Counter('gearguard_db_query_seconds_total', 'Seconds spent in SQLite, by database.', ('database',))
+    for db_path, (count, total) in get_query_totals().items():
+        queries.inc(db_path, amount=count)
+        seconds.inc(db_path, amount=total)
+
+    pool = Counter('gearguard_db_pool_events_total', 'Connection pool events, by database.', ('database', 'event'))
+    for db_path, stats in get_pool_stats().items():
+        for event, count in stats.items():
+            pool.inc(db_path, event, amount=count)
+
+    cache = Counter('gearguard_reference_cache_events_total', 'Reference data cache events.', ('event',))
+    stats = get_cache_stats()
+    for event in ('hits', 'misses', 'invalidations'):
+        cache.inc(event, amount=stats[event])
+
+    return queries.render() + seconds.render() + pool.render() + cache.render()
+
+
+def render_metrics():
+    """Get every metric of this process in the Prometheus text format"""
+    lines = []
+    for metric in HTTP_METRICS:
+        lines.extend(metric.render())
+    lines.extend(process_metrics())
+    return '\n'.join(lines) + '\n'
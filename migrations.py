@@ -0,0 +1,1078 @@
+"""
+Versioned schema migrations for the GearGuard databases.
+
+Every database keeps a schema_version table listing the migrations applied
+to it. Workers only compare that version number with the latest registered
+migration on startup; the schema itself is changed by `flask gearguard migrate`
+(or automatically when GEARGUARD_AUTO_MIGRATE is enabled).
+
+Each migration runs in its own BEGIN IMMEDIATE transaction together with the
+schema_version insert, so a failed migration leaves nothing behind and two
+processes migrating at once apply every step exactly once.
+
+A migration that has shipped must never change meaning, so migrations spell
+out their SQL (index predicates, trigger bodies, rollup backfills) instead
+of building it from the live definitions in database.py: editing those later
+must not make a fresh database differ from one migrated earlier. Changing
+what a shipped migration created takes a new migration.
+"""
+import os
+import sqlite3
+
+from database import (
+    AUTH_DB, EQUIPMENT_DB, REQUESTS_DB, get_connection, release_connection, scheduled_start_epoch, due_at_epoch,
+    parse_duration_minutes
+)
+
+DATABASES = (AUTH_DB, EQUIPMENT_DB, REQUESTS_DB)
+
+# Registered migrations per database: {db_path: {version: (description, apply)}}
+MIGRATIONS = {db_path: {} for db_path in DATABASES}
+
+
+def migration(db_path, version, description):
+    """Register a function(cursor) as migration `version` of db_path"""
+    def register(apply):
+        if version in MIGRATIONS[db_path]:
+            raise ValueError(f"Duplicate migration {version} for '{db_path}'")
+        MIGRATIONS[db_path][version] = (description, apply)
+        return apply
+    return register
+
+
+def sql_migration(db_path, version, description, *statements):
+    """Register a migration made only of SQL statements (indexes, backfills, ...)"""
+    def apply(cursor):
+        for statement in statements:
+            cursor.execute(statement)
+    migration(db_path, version, description)(apply)
+
+
+def latest_version(db_path):
+    """Get the newest registered migration version for db_path"""
+    return max(MIGRATIONS[db_path], default=0)
+
+
+def get_schema_version(conn):
+    """Get the schema version recorded in a database (0 if never migrated)"""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+def get_schema_status():
+    """Get (current, latest) schema versions for every database"""
+    status = {}
+    for db_path in DATABASES:
+        conn = get_connection(db_path)
+        status[db_path] = (get_schema_version(conn), latest_version(db_path))
+        release_connection(conn)
+    return status
+
+
+def migrate(db_path, target=None, conn=None):
+    """Apply pending migrations to db_path up to target (default: latest).
+
+    Returns the list of (version, description) applied.
+    """
+    conn = conn or get_connection(db_path)
+    cursor = conn.cursor()
+    target = latest_version(db_path) if target is None else target
+    applied = []
+
+    try:
+        for version in sorted(MIGRATIONS[db_path]):
+            if version > target:
+                break
+            description, apply = MIGRATIONS[db_path][version]
+
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS schema_version (
+                        version INTEGER PRIMARY KEY,
+                        description TEXT NOT NULL,
+                        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                # Re-read inside the write lock: another process may have migrated
+                if version <= get_schema_version(conn):
+                    conn.rollback()
+                    continue
+                apply(cursor)
+                cursor.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                               (version, description))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append((version, description))
+            print(f"Applied migration {version} to '{db_path}': {description}")
+    finally:
+        release_connection(conn)
+
+    return applied
+
+
+def migrate_all():
+    """Apply all pending migrations to every database"""
+    return {db_path: migrate(db_path) for db_path in DATABASES}
+
+
+def schema_up_to_date():
+    """Check whether every database is at its latest schema version"""
+    return all(current >= latest for current, latest in get_schema_status().values())
+
+
+def ensure_schema(auto_migrate=None):
+    """Check that every database is at its latest schema version.
+
+    Outdated databases are migrated when auto_migrate is enabled (defaults to
+    the GEARGUARD_AUTO_MIGRATE environment variable, on unless set to 0).
+    Returns True if all databases are up to date afterwards.
+    """
+    if auto_migrate is None:
+        auto_migrate = os.environ.get('GEARGUARD_AUTO_MIGRATE', '1') != '0'
+
+    up_to_date = True
+    for db_path, (current, latest) in get_schema_status().items():
+        if current >= latest:
+            continue
+        if auto_migrate:
+            migrate(db_path)
+        else:
+            print(f"Database '{db_path}' is at schema version {current}, expected {latest}. "
+                  f"Run 'flask gearguard migrate'.")
+            up_to_date = False
+    return up_to_date
+
+
+# ==================== SCHEMA HELPERS ====================
+
+def add_missing_columns(cursor, table, columns):
+    """Add columns that older databases are missing.
+
+    columns is a list of (name, type, backfill_value); backfill_value is
+    written to existing rows when not None (ADD COLUMN cannot carry it).
+    """
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing_columns = {column[1] for column in cursor.fetchall()}
+
+    for column_name, column_type, backfill_value in columns:
+        if column_name in existing_columns:
+            continue
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column_name} {column_type}')
+        if backfill_value is not None:
+            cursor.execute(f'UPDATE {table} SET {column_name} = ? WHERE {column_name} IS NULL',
+                           (backfill_value,))
+
+
+def create_cache_version_triggers(cursor, tables):
+    """Create cache_versions and the triggers bumping it on every write to tables"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            tag TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    for table in tables:
+        cursor.execute('INSERT OR IGNORE INTO cache_versions (tag) VALUES (?)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_cache_{event.lower()}
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE cache_versions SET version = version + 1 WHERE tag = '{table}';
+                END
+            ''')
+
+
+# ==================== AUTHENTICATION DATABASE MIGRATIONS ====================
+
+@migration(AUTH_DB, 1, 'baseline schema')
+def _auth_baseline(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS portal_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+sql_migration(
+    AUTH_DB, 2, 'index signups by date',
+    'CREATE INDEX IF NOT EXISTS idx_portal_users_created_at ON portal_users (created_at)',
+)
+
+
+# ==================== EQUIPMENT DATABASE MIGRATIONS ====================
+
+@migration(EQUIPMENT_DB, 1, 'baseline schema')
+def _equipment_baseline(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS equipment (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            health_percentage INTEGER DEFAULT 100,
+            status TEXT DEFAULT 'active',
+            employee TEXT,
+            department TEXT,
+            serial_number TEXT,
+            technician TEXT,
+            equipment_category_id INTEGER,
+            company TEXT DEFAULT 'My Company (San Francisco)',
+            used_by TEXT,
+            maintenance_team TEXT,
+            assigned_date DATE,
+            description TEXT,
+            scrap_date DATE,
+            used_in_location TEXT,
+            work_center_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    add_missing_columns(cursor, 'equipment', [
+        ('employee', 'TEXT', None),
+        ('department', 'TEXT', None),
+        ('serial_number', 'TEXT', None),
+        ('technician', 'TEXT', None),
+        ('equipment_category_id', 'INTEGER', None),
+        ('company', 'TEXT', None),
+        ('used_by', 'TEXT', None),
+        ('maintenance_team', 'TEXT', None),
+        ('assigned_date', 'DATE', None),
+        ('description', 'TEXT', None),
+        ('scrap_date', 'DATE', None),
+        ('used_in_location', 'TEXT', None),
+        ('work_center_id', 'INTEGER', None),
+    ])
+
+    # Legacy maintenance requests table (superseded by requests.db)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT NOT NULL,
+            employee TEXT NOT NULL,
+            technician TEXT,
+            category TEXT NOT NULL,
+            stage TEXT DEFAULT 'New',
+            company TEXT NOT NULL,
+            status TEXT DEFAULT 'New',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    add_missing_columns(cursor, 'maintenance_requests', [
+        ('request_type', 'TEXT', 'Corrective (Breakdown)'),
+        ('priority', 'TEXT', 'Medium'),
+        ('description', 'TEXT', None),
+        ('scheduled_date', 'DATE', None),
+        ('due_date', 'DATE', None),
+        ('equipment_id', 'INTEGER', None),
+        ('team', 'TEXT', None),
+        ('request_date', 'DATE', None),
+        ('duration', 'TEXT', None),
+    ])
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS technicians (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            utilization_percentage INTEGER DEFAULT 0,
+            status TEXT DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_teams (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS team_members (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            team_id INTEGER NOT NULL,
+            technician_id INTEGER NOT NULL,
+            role TEXT DEFAULT 'member',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (team_id) REFERENCES maintenance_teams(id),
+            FOREIGN KEY (technician_id) REFERENCES technicians(id)
+        )
+    ''')
+
+    # Profiles table (linked to auth users)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            full_name TEXT,
+            phone TEXT,
+            role TEXT DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_roles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS equipment_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            responsible TEXT,
+            company TEXT DEFAULT 'My Company (San Francisco)',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+sql_migration(
+    EQUIPMENT_DB, 2, 'indexes for profile, health and name lookups',
+    'CREATE INDEX IF NOT EXISTS idx_profiles_user_id ON profiles (user_id)',
+    'CREATE INDEX IF NOT EXISTS idx_equipment_health ON equipment (health_percentage)',
+    'CREATE INDEX IF NOT EXISTS idx_equipment_name ON equipment (name)',
+)
+
+
+@migration(EQUIPMENT_DB, 3, 'reference cache version counters')
+def _equipment_cache_versions(cursor):
+    create_cache_version_triggers(cursor, ('equipment', 'equipment_categories'))
+
+
+# ==================== REQUESTS DATABASE MIGRATIONS ====================
+
+@migration(REQUESTS_DB, 1, 'baseline schema')
+def _requests_baseline(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_requests (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT NOT NULL,
+            employee TEXT NOT NULL,
+            technician TEXT,
+            category TEXT,
+            stage TEXT DEFAULT 'New',
+            company TEXT NOT NULL DEFAULT 'My company',
+            status TEXT DEFAULT 'New',
+            request_type TEXT,
+            priority TEXT DEFAULT 'Medium',
+            description TEXT,
+            scheduled_date DATE,
+            due_date DATE,
+            equipment_id INTEGER,
+            work_center_id INTEGER,
+            maintenance_for TEXT DEFAULT 'Equipment',
+            notes TEXT,
+            instructions TEXT,
+            team TEXT,
+            request_date DATE DEFAULT CURRENT_DATE,
+            duration TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    add_missing_columns(cursor, 'maintenance_requests', [
+        ('work_center_id', 'INTEGER', None),
+        ('maintenance_for', 'TEXT DEFAULT "Equipment"', None),
+        ('notes', 'TEXT', None),
+        ('instructions', 'TEXT', None),
+    ])
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS worksheet_comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            user TEXT NOT NULL,
+            comment TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (request_id) REFERENCES maintenance_requests(id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_centers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            code TEXT,
+            tag TEXT,
+            alternative_workcenters TEXT,
+            cost_per_hour REAL DEFAULT 0.0,
+            capacity_time_efficiency REAL DEFAULT 100.0,
+            oee_target REAL DEFAULT 0.0,
+            company TEXT DEFAULT 'My company',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS equipment_categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            responsible TEXT,
+            company TEXT DEFAULT 'My company',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+sql_migration(
+    REQUESTS_DB, 2, 'indexes for hot request and comment queries',
+    # Newest-first listings and keyset pagination
+    'CREATE INDEX IF NOT EXISTS idx_requests_created_at ON maintenance_requests (created_at, id)',
+    'CREATE INDEX IF NOT EXISTS idx_requests_status_created_at ON maintenance_requests (status, created_at)',
+    # Overdue checks only ever look at open requests
+    'CREATE INDEX IF NOT EXISTS idx_requests_open_due_date ON maintenance_requests (due_date) '
+    "WHERE status IN ('New', 'In Progress', 'Blocked', 'Ready for next stage')",
+    'CREATE INDEX IF NOT EXISTS idx_requests_equipment ON maintenance_requests (equipment_id, created_at) '
+    'WHERE equipment_id IS NOT NULL',
+    'CREATE INDEX IF NOT EXISTS idx_requests_technician_status ON maintenance_requests (technician, status)',
+    'CREATE INDEX IF NOT EXISTS idx_requests_scheduled_date ON maintenance_requests (scheduled_date) '
+    'WHERE scheduled_date IS NOT NULL',
+    'CREATE INDEX IF NOT EXISTS idx_requests_work_center ON maintenance_requests (work_center_id) '
+    'WHERE work_center_id IS NOT NULL',
+    'CREATE INDEX IF NOT EXISTS idx_requests_request_date ON maintenance_requests (request_date)',
+    'CREATE INDEX IF NOT EXISTS idx_worksheet_comments_request ON worksheet_comments (request_id, created_at)',
+)
+
+
+def _rollup_changes(row, sign):
+    """Build the statements adding (sign=+1) or removing (sign=-1) one request row from the rollups"""
+    is_open = f"{row}.status IN ('New', 'In Progress', 'Blocked', 'Ready for next stage')"
+    return f'''
+        INSERT INTO request_counts_by_status (status, count)
+        VALUES (COALESCE({row}.status, ''), {sign})
+        ON CONFLICT (status) DO UPDATE SET count = count + ({sign});
+        INSERT INTO request_counts_by_technician (technician, status, count)
+        VALUES (COALESCE({row}.technician, ''), COALESCE({row}.status, ''), {sign})
+        ON CONFLICT (technician, status) DO UPDATE SET count = count + ({sign});
+        INSERT INTO request_counts_by_equipment (equipment_id, open_count, total_count)
+        SELECT {row}.equipment_id, {sign} * ({is_open}), {sign} WHERE {row}.equipment_id IS NOT NULL
+        ON CONFLICT (equipment_id) DO UPDATE SET open_count = open_count + excluded.open_count,
+                                                 total_count = total_count + excluded.total_count;
+        INSERT INTO request_counts_by_work_center (work_center_id, open_count, total_count)
+        SELECT {row}.work_center_id, {sign} * ({is_open}), {sign} WHERE {row}.work_center_id IS NOT NULL
+        ON CONFLICT (work_center_id) DO UPDATE SET open_count = open_count + excluded.open_count,
+                                                   total_count = total_count + excluded.total_count;
+    '''
+
+
+@migration(REQUESTS_DB, 3, 'trigger-maintained request count rollups')
+def _requests_rollups(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS request_counts_by_status (
+            status TEXT PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS request_counts_by_technician (
+            technician TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (technician, status)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS request_counts_by_equipment (
+            equipment_id INTEGER PRIMARY KEY,
+            open_count INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS request_counts_by_work_center (
+            work_center_id INTEGER PRIMARY KEY,
+            open_count INTEGER NOT NULL DEFAULT 0,
+            total_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_insert
+        AFTER INSERT ON maintenance_requests
+        BEGIN {_rollup_changes('NEW', 1)} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_delete
+        AFTER DELETE ON maintenance_requests
+        BEGIN {_rollup_changes('OLD', -1)} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_rollup_update
+        AFTER UPDATE OF status, technician, equipment_id, work_center_id ON maintenance_requests
+        BEGIN {_rollup_changes('OLD', -1)} {_rollup_changes('NEW', 1)} END
+    ''')
+
+    # NULL statuses and technicians are rolled up under ''
+    for table in ('request_counts_by_status', 'request_counts_by_technician', 'request_counts_by_equipment',
+                  'request_counts_by_work_center'):
+        cursor.execute(f'DELETE FROM {table}')
+    cursor.execute('''
+        INSERT INTO request_counts_by_status (status, count)
+        SELECT COALESCE(status, ''), COUNT(*) FROM maintenance_requests GROUP BY 1
+    ''')
+    cursor.execute('''
+        INSERT INTO request_counts_by_technician (technician, status, count)
+        SELECT COALESCE(technician, ''), COALESCE(status, ''), COUNT(*) FROM maintenance_requests GROUP BY 1, 2
+    ''')
+    cursor.execute('''
+        INSERT INTO request_counts_by_equipment (equipment_id, open_count, total_count)
+        SELECT equipment_id, SUM(status IN ('New', 'In Progress', 'Blocked', 'Ready for next stage')), COUNT(*)
+        FROM maintenance_requests
+        WHERE equipment_id IS NOT NULL
+        GROUP BY equipment_id
+    ''')
+    cursor.execute('''
+        INSERT INTO request_counts_by_work_center (work_center_id, open_count, total_count)
+        SELECT work_center_id, SUM(status IN ('New', 'In Progress', 'Blocked', 'Ready for next stage')), COUNT(*)
+        FROM maintenance_requests
+        WHERE work_center_id IS NOT NULL
+        GROUP BY work_center_id
+    ''')
+
+
+@migration(REQUESTS_DB, 4, 'reference cache version counters')
+def _requests_cache_versions(cursor):
+    create_cache_version_triggers(cursor, ('work_centers',))
+
+
+sql_migration(
+    REQUESTS_DB, 5, 'indexes for filtered keyset pagination',
+    # Every REQUEST_FILTERS column followed by created_at, so each filtered page
+    # is a range scan in (created_at, id) order without a sort
+    'CREATE INDEX IF NOT EXISTS idx_requests_priority_created_at ON maintenance_requests (priority, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_requests_technician_created_at '
+    'ON maintenance_requests (technician, created_at)',
+    'CREATE INDEX IF NOT EXISTS idx_requests_team_created_at ON maintenance_requests (team, created_at)',
+    'DROP INDEX IF EXISTS idx_requests_work_center',
+    'CREATE INDEX IF NOT EXISTS idx_requests_work_center ON maintenance_requests (work_center_id, created_at) '
+    'WHERE work_center_id IS NOT NULL',
+)
+
+
+def fts5_available(cursor):
+    """Check whether this SQLite build has the FTS5 extension"""
+    try:
+        cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(text)')
+    except sqlite3.OperationalError:
+        return False
+    cursor.execute('DROP TABLE temp.fts5_probe')
+    return True
+
+
+@migration(REQUESTS_DB, 6, 'full-text search over requests and comments')
+def _requests_search(cursor):
+    if not fts5_available(cursor):
+        # search_maintenance_requests() falls back to LIKE scans
+        print('SQLite was built without FTS5: full-text search tables not created')
+        return
+
+    # index table -> (content table, indexed columns)
+    search_indexes = {
+        'request_search': ('maintenance_requests', ('subject', 'description', 'notes', 'instructions')),
+        'comment_search': ('worksheet_comments', ('comment',)),
+    }
+    for index, (table, columns) in search_indexes.items():
+        column_list = ', '.join(columns)
+        new_values = ', '.join(f'NEW.{column}' for column in columns)
+        old_values = ', '.join(f'OLD.{column}' for column in columns)
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5(
+                {column_list},
+                content='{table}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        ''')
+        # External-content tables keep no text of their own: removing a row
+        # means replaying its old values with the special 'delete' command
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{index}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {index} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{index}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{index}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                INSERT INTO {index} ({index}, rowid, {column_list}) VALUES ('delete', OLD.id, {old_values});
+                INSERT INTO {index} (rowid, {column_list}) VALUES (NEW.id, {new_values});
+            END
+        ''')
+        cursor.execute(f"INSERT INTO {index} ({index}) VALUES ('rebuild')")
+
+
+sql_migration(
+    REQUESTS_DB, 7, 'indexes for report queries',
+    # Date-ranged reports: rows come in request_date order, and the technician
+    # performance GROUP BY is answered from the index alone
+    'DROP INDEX IF EXISTS idx_requests_request_date',
+    'CREATE INDEX IF NOT EXISTS idx_requests_request_date '
+    'ON maintenance_requests (request_date, technician, status)',
+    'CREATE INDEX IF NOT EXISTS idx_requests_status_request_date ON maintenance_requests (status, request_date)',
+)
+
+
+def _history_rollup_changes(scope, key, condition):
+    """Build the statements folding one new status history row into a scope's rollups"""
+    return f'''
+        INSERT INTO stage_time_rollups (scope, group_key, status, exits, seconds)
+        SELECT '{scope}', {key}, NEW.from_status, 1,
+               CAST(ROUND((julianday(NEW.changed_at) - julianday(previous.changed_at)) * 86400) AS INTEGER)
+        FROM request_status_history previous
+        WHERE previous.id = (SELECT MAX(id) FROM request_status_history
+                             WHERE request_id = NEW.request_id AND id < NEW.id)
+          AND NEW.from_status IS NOT NULL AND {condition}
+        ON CONFLICT (scope, group_key, status) DO UPDATE SET exits = exits + 1,
+                                                             seconds = seconds + excluded.seconds;
+        INSERT INTO reliability_rollups (scope, group_key, failures, first_failure_at, last_failure_at)
+        SELECT '{scope}', {key}, 1, NEW.changed_at, NEW.changed_at
+        WHERE NEW.from_status IS NULL AND COALESCE(NEW.request_type, 'Corrective') != 'Preventive' AND {condition}
+        ON CONFLICT (scope, group_key) DO UPDATE SET
+            failures = failures + 1,
+            first_failure_at = COALESCE(MIN(first_failure_at, excluded.first_failure_at), excluded.first_failure_at),
+            last_failure_at = COALESCE(MAX(last_failure_at, excluded.last_failure_at), excluded.last_failure_at);
+        INSERT INTO reliability_rollups (scope, group_key, repairs, repair_seconds)
+        SELECT '{scope}', {key}, 1,
+               CAST(ROUND((julianday(NEW.changed_at) - julianday(opened.changed_at)) * 86400) AS INTEGER)
+        FROM request_status_history opened
+        WHERE opened.id = (SELECT MIN(id) FROM request_status_history WHERE request_id = NEW.request_id)
+          AND NEW.to_status = 'Repaired' AND {condition}
+        ON CONFLICT (scope, group_key) DO UPDATE SET repairs = repairs + 1,
+                                                     repair_seconds = repair_seconds + excluded.repair_seconds;
+    '''
+
+
+@migration(REQUESTS_DB, 8, 'request status history with MTTR, MTBF and stage time rollups')
+def _requests_status_history(cursor):
+    # Append-only: rows outlive their request so the rollups can always be
+    # recomputed from this table alone
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS request_status_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            from_status TEXT,
+            to_status TEXT,
+            changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            equipment_id INTEGER,
+            team TEXT,
+            request_type TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_status_history_request '
+                   'ON request_status_history (request_id, id)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stage_time_rollups (
+            scope TEXT NOT NULL,
+            group_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            exits INTEGER NOT NULL DEFAULT 0,
+            seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, group_key, status)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reliability_rollups (
+            scope TEXT NOT NULL,
+            group_key TEXT NOT NULL,
+            failures INTEGER NOT NULL DEFAULT 0,
+            first_failure_at TIMESTAMP,
+            last_failure_at TIMESTAMP,
+            repairs INTEGER NOT NULL DEFAULT 0,
+            repair_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, group_key)
+        )
+    ''')
+
+    # Backfill: the true history of existing requests is unknown, so each gets
+    # its creation and, when no longer New, one move to its current status at
+    # its last update. Creation rows go first so ids follow time per request.
+    cursor.execute('''
+        INSERT INTO request_status_history (request_id, from_status, to_status, changed_at,
+                                            equipment_id, team, request_type)
+        SELECT id, NULL, 'New', COALESCE(created_at, CURRENT_TIMESTAMP), equipment_id, team, request_type
+        FROM maintenance_requests ORDER BY id
+    ''')
+    cursor.execute('''
+        INSERT INTO request_status_history (request_id, from_status, to_status, changed_at,
+                                            equipment_id, team, request_type)
+        SELECT id, 'New', status, MAX(COALESCE(updated_at, created_at, CURRENT_TIMESTAMP),
+                                      COALESCE(created_at, CURRENT_TIMESTAMP)),
+               equipment_id, team, request_type
+        FROM maintenance_requests WHERE status IS NOT 'New' ORDER BY id
+    ''')
+
+    # Every status change is recorded by the statement that makes it, in the
+    # same transaction, whichever code path updates the request
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_status_history_insert
+        AFTER INSERT ON maintenance_requests
+        BEGIN
+            INSERT INTO request_status_history (request_id, from_status, to_status, changed_at,
+                                                equipment_id, team, request_type)
+            VALUES (NEW.id, NULL, NEW.status, COALESCE(NEW.created_at, CURRENT_TIMESTAMP),
+                    NEW.equipment_id, NEW.team, NEW.request_type);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_status_history_update
+        AFTER UPDATE OF status ON maintenance_requests
+        WHEN OLD.status IS NOT NEW.status
+        BEGIN
+            INSERT INTO request_status_history (request_id, from_status, to_status,
+                                                equipment_id, team, request_type)
+            VALUES (NEW.id, OLD.status, NEW.status, NEW.equipment_id, NEW.team, NEW.request_type);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_status_history_rollups
+        AFTER INSERT ON request_status_history
+        BEGIN
+            {_history_rollup_changes('equipment', 'CAST(NEW.equipment_id AS TEXT)', 'NEW.equipment_id IS NOT NULL')}
+            {_history_rollup_changes('team', "COALESCE(NULLIF(NEW.team, ''), 'Unassigned')", '1')}
+        END
+    ''')
+
+    cursor.execute('DELETE FROM stage_time_rollups')
+    cursor.execute('''
+        INSERT INTO stage_time_rollups (scope, group_key, status, exits, seconds)
+        WITH transitions AS (
+            SELECT *, LAG(changed_at) OVER (PARTITION BY request_id ORDER BY id) AS entered_at
+            FROM request_status_history
+        ), scoped AS (
+            SELECT 'equipment' AS scope, CAST(equipment_id AS TEXT) AS group_key, *
+            FROM transitions WHERE equipment_id IS NOT NULL
+            UNION ALL
+            SELECT 'team', COALESCE(NULLIF(team, ''), 'Unassigned'), * FROM transitions
+        )
+        SELECT scope, group_key, from_status, COUNT(*),
+               SUM(CAST(ROUND((julianday(changed_at) - julianday(entered_at)) * 86400) AS INTEGER))
+        FROM scoped
+        WHERE from_status IS NOT NULL AND entered_at IS NOT NULL
+        GROUP BY 1, 2, 3
+    ''')
+    cursor.execute('DELETE FROM reliability_rollups')
+    cursor.execute('''
+        INSERT INTO reliability_rollups (scope, group_key, failures, first_failure_at, last_failure_at,
+                                         repairs, repair_seconds)
+        WITH events AS (
+            SELECT *, FIRST_VALUE(changed_at) OVER (PARTITION BY request_id ORDER BY id) AS opened_at,
+                   from_status IS NULL AND COALESCE(request_type, 'Corrective') != 'Preventive' AS is_failure
+            FROM request_status_history
+        ), scoped AS (
+            SELECT 'equipment' AS scope, CAST(equipment_id AS TEXT) AS group_key, *
+            FROM events WHERE equipment_id IS NOT NULL
+            UNION ALL
+            SELECT 'team', COALESCE(NULLIF(team, ''), 'Unassigned'), * FROM events
+        )
+        SELECT scope, group_key, SUM(is_failure),
+               MIN(CASE WHEN is_failure THEN changed_at END), MAX(CASE WHEN is_failure THEN changed_at END),
+               SUM(to_status = 'Repaired'),
+               SUM(CASE WHEN to_status = 'Repaired'
+                        THEN CAST(ROUND((julianday(changed_at) - julianday(opened_at)) * 86400) AS INTEGER)
+                        ELSE 0 END)
+        FROM scoped
+        GROUP BY 1, 2
+    ''')
+
+
+# scheduled_date as 'YYYY-MM-DD HH:MM:SS', date-only schedules timed from created_at
+SCHEDULED_AT_EXPRESSION = (
+    "(CASE WHEN length(scheduled_date) = 10 "
+    "THEN datetime(scheduled_date || ' ' || COALESCE(time(created_at), '09:00:00')) "
+    "ELSE datetime(scheduled_date) END)"
+)
+
+sql_migration(
+    REQUESTS_DB, 9, 'index requests by normalized scheduled datetime',
+    f'CREATE INDEX IF NOT EXISTS idx_requests_scheduled_at ON maintenance_requests ({SCHEDULED_AT_EXPRESSION})',
+)
+
+
+# Rows normalized per executemany batch by migration 10
+TIME_BACKFILL_BATCH_SIZE = 5000
+
+
+@migration(REQUESTS_DB, 10, 'normalized scheduled start, due and duration columns')
+def _requests_time_columns(cursor):
+    add_missing_columns(cursor, 'maintenance_requests', [
+        ('scheduled_start', 'INTEGER', None),
+        ('due_at', 'INTEGER', None),
+        ('duration_minutes', 'INTEGER', None),
+    ])
+
+    # Parse with the same functions the writes use, so old and new rows agree
+    rows = cursor.execute('SELECT id, scheduled_date, due_date, duration, created_at FROM maintenance_requests')
+    updates = cursor.connection.cursor()
+    while True:
+        batch = rows.fetchmany(TIME_BACKFILL_BATCH_SIZE)
+        if not batch:
+            break
+        updates.executemany(
+            'UPDATE maintenance_requests SET scheduled_start = ?, due_at = ?, duration_minutes = ? WHERE id = ?',
+            [(scheduled_start_epoch(scheduled_date, created_at), due_at_epoch(due_date),
+              parse_duration_minutes(duration), request_id)
+             for request_id, scheduled_date, due_date, duration, created_at in batch])
+
+    # Calendar windows and overdue checks become integer range scans; the
+    # open-request index keeps its name since queries pin it with INDEXED BY
+    cursor.execute('DROP INDEX IF EXISTS idx_requests_scheduled_at')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_requests_scheduled_start ON maintenance_requests (scheduled_start) '
+                   'WHERE scheduled_start IS NOT NULL')
+    cursor.execute('DROP INDEX IF EXISTS idx_requests_open_due_date')
+    cursor.execute('CREATE INDEX idx_requests_open_due_date ON maintenance_requests (due_at) '
+                   "WHERE status IN ('New', 'In Progress', 'Blocked', 'Ready for next stage')")
+
+
+sql_migration(
+    REQUESTS_DB, 11, 'index scheduled request durations',
+    # The longest duration bounds how far before a window get_scheduled_jobs() looks
+    'CREATE INDEX IF NOT EXISTS idx_requests_scheduled_duration ON maintenance_requests (duration_minutes) '
+    'WHERE scheduled_start IS NOT NULL',
+)
+
+
+@migration(REQUESTS_DB, 12, 'cache version for work center bookings')
+def _requests_work_center_bookings_version(cursor):
+    # Bumped whenever a request's work center, schedule, duration or status
+    # may have changed, so capacity.py rebuilds its index only after such writes
+    cursor.execute("INSERT OR IGNORE INTO cache_versions (tag) VALUES ('work_center_bookings')")
+    bump = "UPDATE cache_versions SET version = version + 1 WHERE tag = 'work_center_bookings';"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_bookings_insert
+        AFTER INSERT ON maintenance_requests WHEN NEW.work_center_id IS NOT NULL
+        BEGIN {bump} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_bookings_update
+        AFTER UPDATE OF work_center_id, scheduled_start, duration_minutes, status ON maintenance_requests
+        WHEN OLD.work_center_id IS NOT NULL OR NEW.work_center_id IS NOT NULL
+        BEGIN {bump} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_bookings_delete
+        AFTER DELETE ON maintenance_requests WHEN OLD.work_center_id IS NOT NULL
+        BEGIN {bump} END
+    ''')
+
+
+@migration(REQUESTS_DB, 13, 'daily downtime series with dirty tracking')
+def _requests_downtime(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS downtime_daily (
+            scope TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            planned_seconds INTEGER NOT NULL DEFAULT 0,
+            unplanned_seconds INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, group_id, day)
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_downtime_daily_day ON downtime_daily (scope, day)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS downtime_dirty (
+            scope TEXT NOT NULL,
+            group_id INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (scope, group_id)
+        )
+    ''')
+
+    # Downtime scope -> request column grouping it
+    scopes = {'work_center': 'work_center_id', 'equipment': 'equipment_id'}
+
+    def mark(row):
+        return ''.join(f'''
+            INSERT INTO downtime_dirty (scope, group_id)
+            SELECT '{scope}', {row}.{column} WHERE {row}.{column} IS NOT NULL
+            ON CONFLICT (scope, group_id) DO UPDATE SET version = version + 1;'''
+            for scope, column in scopes.items())
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_downtime_insert
+        AFTER INSERT ON maintenance_requests
+        BEGIN {mark('NEW')}
+        END
+    ''')
+    # status covers repairs too: the history row is written by the same statement
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_downtime_update
+        AFTER UPDATE OF work_center_id, equipment_id, scheduled_start, duration_minutes, status, request_type
+        ON maintenance_requests
+        BEGIN {mark('OLD')}{mark('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_downtime_delete
+        AFTER DELETE ON maintenance_requests
+        BEGIN {mark('OLD')}
+        END
+    ''')
+
+    # Existing groups are computed on first read (or `flask gearguard downtime`)
+    for scope, column in scopes.items():
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO downtime_dirty (scope, group_id)
+            SELECT DISTINCT '{scope}', {column} FROM maintenance_requests WHERE {column} IS NOT NULL
+        ''')
+
+
+@migration(REQUESTS_DB, 14, 'labor cost ledger with cost rollups')
+def _requests_cost_ledger(cursor):
+    # Append-only like the status history: a request's labor is priced when it
+    # is repaired, and reopening it posts a reversal rather than editing the
+    # completion, so every month keeps the totals it showed at the time
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cost_ledger (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            request_id INTEGER NOT NULL,
+            entry TEXT NOT NULL,
+            recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            equipment_id INTEGER,
+            work_center_id INTEGER,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            cost_per_hour REAL NOT NULL DEFAULT 0,
+            cost_cents INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cost_ledger_request ON cost_ledger (request_id, id)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cost_rollups (
+            scope TEXT NOT NULL,
+            group_key TEXT NOT NULL,
+            repairs INTEGER NOT NULL DEFAULT 0,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            cost_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, group_key)
+        )
+    ''')
+
+    # Backfill: requests already repaired are priced at their last move to
+    # Repaired with today's work center rates
+    cursor.execute('''
+        INSERT INTO cost_ledger (request_id, entry, recorded_at, equipment_id, work_center_id,
+                                 minutes, cost_per_hour, cost_cents)
+        SELECT r.id, 'completion',
+               COALESCE((SELECT MAX(h.changed_at) FROM request_status_history h
+                         WHERE h.request_id = r.id AND h.to_status = 'Repaired'),
+                        r.updated_at, r.created_at, CURRENT_TIMESTAMP),
+               r.equipment_id, r.work_center_id, COALESCE(r.duration_minutes, 0), COALESCE(wc.cost_per_hour, 0),
+               CAST(ROUND(COALESCE(r.duration_minutes, 0) * COALESCE(wc.cost_per_hour, 0) * 100 / 60.0) AS INTEGER)
+        FROM maintenance_requests r
+        LEFT JOIN work_centers wc ON wc.id = r.work_center_id
+        WHERE r.status = 'Repaired'
+        ORDER BY r.id
+    ''')
+
+    rate = '(SELECT cost_per_hour FROM work_centers WHERE id = NEW.work_center_id)'
+    completion = f'''
+            INSERT INTO cost_ledger (request_id, entry, equipment_id, work_center_id,
+                                     minutes, cost_per_hour, cost_cents)
+            VALUES (NEW.id, 'completion', NEW.equipment_id, NEW.work_center_id, COALESCE(NEW.duration_minutes, 0),
+                    COALESCE({rate}, 0),
+                    CAST(ROUND(COALESCE(NEW.duration_minutes, 0) * COALESCE({rate}, 0) * 100 / 60.0) AS INTEGER));
+    '''
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_cost_insert
+        AFTER INSERT ON maintenance_requests
+        WHEN NEW.status = 'Repaired'
+        BEGIN {completion} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_cost_completion
+        AFTER UPDATE OF status ON maintenance_requests
+        WHEN NEW.status = 'Repaired' AND OLD.status IS NOT 'Repaired'
+        BEGIN {completion} END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_cost_reversal
+        AFTER UPDATE OF status ON maintenance_requests
+        WHEN OLD.status = 'Repaired' AND NEW.status IS NOT 'Repaired'
+        BEGIN
+            INSERT INTO cost_ledger (request_id, entry, equipment_id, work_center_id,
+                                     minutes, cost_per_hour, cost_cents)
+            SELECT request_id, 'reversal', equipment_id, work_center_id, -minutes, cost_per_hour, -cost_cents
+            FROM cost_ledger
+            WHERE id = (SELECT MAX(id) FROM cost_ledger WHERE request_id = NEW.id) AND entry = 'completion';
+        END
+    ''')
+
+    # Cost rollup scope -> (key expression, condition) of a new ledger row.
+    # Category totals are not stored: they are summed from the equipment rows
+    rollup_keys = {
+        'equipment': ('CAST(NEW.equipment_id AS TEXT)', 'NEW.equipment_id IS NOT NULL'),
+        'work_center': ('CAST(NEW.work_center_id AS TEXT)', 'NEW.work_center_id IS NOT NULL'),
+        'month': ("strftime('%Y-%m', NEW.recorded_at)", '1'),
+    }
+    changes = ''.join(f'''
+            INSERT INTO cost_rollups (scope, group_key, repairs, minutes, cost_cents)
+            SELECT '{scope}', {key}, (CASE NEW.entry WHEN 'reversal' THEN -1 ELSE 1 END), NEW.minutes, NEW.cost_cents
+            WHERE {condition}
+            ON CONFLICT (scope, group_key) DO UPDATE SET repairs = repairs + excluded.repairs,
+                                                         minutes = minutes + excluded.minutes,
+                                                         cost_cents = cost_cents + excluded.cost_cents;'''
+        for scope, (key, condition) in rollup_keys.items())
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_cost_ledger_rollups
+        AFTER INSERT ON cost_ledger
+        BEGIN {changes}
+        END
+    ''')
+
+    cursor.execute('DELETE FROM cost_rollups')
+    cursor.execute('''
+        INSERT INTO cost_rollups (scope, group_key, repairs, minutes, cost_cents)
+        SELECT 'equipment', CAST(equipment_id AS TEXT), SUM(CASE entry WHEN 'reversal' THEN -1 ELSE 1 END),
+               SUM(minutes), SUM(cost_cents)
+        FROM cost_ledger WHERE equipment_id IS NOT NULL GROUP BY 2
+        UNION ALL
+        SELECT 'work_center', CAST(work_center_id AS TEXT), SUM(CASE entry WHEN 'reversal' THEN -1 ELSE 1 END),
+               SUM(minutes), SUM(cost_cents)
+        FROM cost_ledger WHERE work_center_id IS NOT NULL GROUP BY 2
+        UNION ALL
+        SELECT 'month', strftime('%Y-%m', recorded_at), SUM(CASE entry WHEN 'reversal' THEN -1 ELSE 1 END),
+               SUM(minutes), SUM(cost_cents)
+        FROM cost_ledger GROUP BY 2
+    ''')
+
+
+@migration(REQUESTS_DB, 15, 'cache version for request analytics')
+def _requests_metrics_version(cursor):
+    # Bumped whenever a request column read by iter_request_metric_batches()
+    # may have changed, so analytics.py reloads its columns only after such writes
+    cursor.execute("INSERT OR IGNORE INTO cache_versions (tag) VALUES ('request_metrics')")
+    bump = "UPDATE cache_versions SET version = version + 1 WHERE tag = 'request_metrics';"
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_metrics_insert
+        AFTER INSERT ON maintenance_requests
+        BEGIN {bump} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_metrics_update
+        AFTER UPDATE OF technician, team, equipment_id, status, due_at, created_at, request_date
+        ON maintenance_requests
+        BEGIN {bump} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_requests_metrics_delete
+        AFTER DELETE ON maintenance_requests
+        BEGIN {bump} END
+    ''')
@@ -0,0 +1,217 @@
+"""
+Typed row models for GearGuard query results.
+
+Each model is a namedtuple subclass with empty __slots__, so a row takes no
+more memory than the plain tuple sqlite3 returns, while fields are read by
+name (request.status instead of request[7]). Assign a model's row_factory
+to a cursor to build rows straight from query results.
+"""
+from collections import namedtuple
+
+
+class RowModel:
+    """Row factory and JSON conversion shared by every row model"""
+    __slots__ = ()
+
+    @classmethod
+    def row_factory(cls, cursor, row):
+        """sqlite3 row factory building a model from a result row"""
+        return cls._make(row)
+
+    def to_dict(self):
+        """Get the row as a {field: value} dict for JSON responses"""
+        return dict(zip(self._fields, self))
+
+
+class MaintenanceRequest(RowModel, namedtuple('MaintenanceRequest', (
+        'id', 'subject', 'employee', 'technician', 'category', 'stage', 'company', 'status',
+        'request_type', 'priority', 'description', 'scheduled_date', 'due_date', 'equipment_id',
+        'team', 'request_date', 'duration', 'created_at', 'updated_at', 'equipment_name',
+        'work_center_id', 'maintenance_for', 'notes', 'instructions', 'work_center_name',
+        'equipment_category_name', 'scheduled_start', 'due_at', 'duration_minutes'))):
+    """A maintenance request joined with its equipment, work center and category names"""
+    __slots__ = ()
+
+    def scheduled_datetime(self):
+        """Get scheduled_date as 'YYYY-MM-DD HH:MM[:SS]', or None when unscheduled.
+
+        Date-only schedules take their time of day from created_at (09:00:00
+        when that is missing).
+        """
+        scheduled = str(self.scheduled_date or '').strip()
+        if not scheduled or scheduled.lower() == 'none':
+            return None
+        if 'T' in scheduled:
+            return scheduled.replace('T', ' ')
+        if len(scheduled) != 10 or ' ' in scheduled:
+            return scheduled
+
+        created_at = str(self.created_at or '').strip()
+        time_part = created_at.replace('T', ' ').split(' ')[1] if ' ' in created_at or 'T' in created_at else ''
+        if ':' not in time_part:
+            time_part = '09:00:00'
+        return f"{scheduled} {time_part.split('.')[0]}"
+
+    def calendar_event(self):
+        """Get the fields the calendar views render for this request"""
+        return {
+            'id': self.id,
+            'subject': self.subject or 'No Subject',
+            'employee': self.employee or '',
+            'technician': self.technician or '',
+            'scheduled_date': self.scheduled_datetime(),
+            'due_date': self.due_date,
+            'status': self.status or 'New',
+            'priority': self.priority or 'Medium',
+            'equipment_name': self.equipment_name,
+            'duration_minutes': self.duration_minutes,
+            'created_at': str(self.created_at) if self.created_at else None,
+        }
+
+
+class Equipment(RowModel, namedtuple('Equipment', (
+        'id', 'name', 'health_percentage', 'status', 'employee', 'department', 'serial_number',
+        'technician', 'equipment_category_id', 'company', 'used_by', 'maintenance_team',
+        'assigned_date', 'description', 'scrap_date', 'used_in_location', 'work_center_id',
+        'created_at', 'category_name'))):
+    """An equipment record with its category name"""
+    __slots__ = ()
+
+
+class WorkCenter(RowModel, namedtuple('WorkCenter', (
+        'id', 'name', 'code', 'tag', 'alternative_workcenters', 'cost_per_hour',
+        'capacity_time_efficiency', 'oee_target', 'company', 'created_at', 'updated_at'))):
+    """A work center"""
+    __slots__ = ()
+
+
+class EquipmentCategory(RowModel, namedtuple('EquipmentCategory', (
+        'id', 'name', 'responsible', 'company', 'created_at', 'updated_at'))):
+    """An equipment category"""
+    __slots__ = ()
+
+
+class WorksheetComment(RowModel, namedtuple('WorksheetComment', (
+        'id', 'request_id', 'user', 'comment', 'created_at'))):
+    """A worksheet comment on a maintenance request"""
+    __slots__ = ()
+
+
+class TechnicianPerformance(RowModel, namedtuple('TechnicianPerformance', (
+        'technician', 'total', 'completed', 'in_progress', 'new'))):
+    """Request totals of one technician, by outcome"""
+    __slots__ = ()
+
+    def completion_rate(self):
+        """Get the percentage of this technician's requests that were repaired"""
+        return self.completed / self.total * 100 if self.total else 0
+
+
+class GroupMetrics(RowModel, namedtuple('GroupMetrics', (
+        'group', 'requests', 'completed', 'open', 'overdue', 'completion_rate',
+        'open_age_p50', 'open_age_p90'))):
+    """Request metrics of one technician, team, category or equipment"""
+    __slots__ = ()
+
+
+class StatusChange(RowModel, namedtuple('StatusChange', (
+        'id', 'request_id', 'from_status', 'to_status', 'changed_at'))):
+    """One status transition of a maintenance request"""
+    __slots__ = ()
+
+
+class ReliabilityMetrics(RowModel, namedtuple('ReliabilityMetrics', (
+        'scope', 'group_key', 'name', 'failures', 'repairs', 'repair_seconds',
+        'first_failure_at', 'last_failure_at', 'failure_span_seconds'))):
+    """Failure and repair totals of one equipment or team"""
+    __slots__ = ()
+
+    def mttr_hours(self):
+        """Get the mean time to repair in hours, or None before the first repair"""
+        return round(self.repair_seconds / self.repairs / 3600, 2) if self.repairs else None
+
+    def mtbf_hours(self):
+        """Get the mean time between failures in hours, or None with fewer than two failures"""
+        if self.failures < 2:
+            return None
+        return round(self.failure_span_seconds / (self.failures - 1) / 3600, 2)
+
+    def to_dict(self):
+        """Get the row as a dict including MTTR and MTBF"""
+        return dict(super().to_dict(), mttr_hours=self.mttr_hours(), mtbf_hours=self.mtbf_hours())
+
+
+class StageTime(RowModel, namedtuple('StageTime', (
+        'scope', 'group_key', 'status', 'exits', 'seconds'))):
+    """Total time requests of one equipment or team spent in a status before leaving it"""
+    __slots__ = ()
+
+    def average_hours(self):
+        """Get the mean hours spent in the status per exit"""
+        return round(self.seconds / self.exits / 3600, 2) if self.exits else None
+
+
+class CostEntry(RowModel, namedtuple('CostEntry', (
+        'id', 'request_id', 'entry', 'recorded_at', 'equipment_id', 'work_center_id', 'minutes',
+        'cost_per_hour', 'cost_cents'))):
+    """A labor cost ledger row: a request's completion, or the reversal of it when reopened"""
+    __slots__ = ()
+
+
+class CostTotal(RowModel, namedtuple('CostTotal', (
+        'scope', 'group_key', 'name', 'repairs', 'minutes', 'cost_cents'))):
+    """Labor cost totals of one equipment, category, work center or month"""
+    __slots__ = ()
+
+    def hours(self):
+        """Get the labor hours"""
+        return round(self.minutes / 60, 2)
+
+    def cost(self):
+        """Get the labor cost in currency units"""
+        return self.cost_cents / 100
+
+    def to_dict(self):
+        """Get the row as a dict including hours and cost"""
+        return dict(super().to_dict(), hours=self.hours(), cost=self.cost())
+
+
+class ScheduledJob(RowModel, namedtuple('ScheduledJob', (
+        'id', 'technician', 'team', 'start', 'end'))):
+    """A scheduled request as an interval of epoch seconds [start, end)"""
+    __slots__ = ()
+
+
+class ScheduleConflict(RowModel, namedtuple('ScheduleConflict', (
+        'scope', 'resource', 'start', 'end', 'peak', 'capacity', 'request_ids'))):
+    """Overlapping jobs of one technician or team needing more hands than it has"""
+    __slots__ = ()
+
+
+class WorkCenterLoad(RowModel, namedtuple('WorkCenterLoad', (
+        'work_center_id', 'name', 'booked_hours', 'available_hours', 'utilization', 'saturated_slots'))):
+    """Hours booked on a work center in a window against the hours it can work"""
+    __slots__ = ()
+
+    def to_dict(self):
+        """Get the load as a dict with its saturated slots as dicts"""
+        return dict(super().to_dict(), saturated_slots=[slot.to_dict() for slot in self.saturated_slots])
+
+
+class SaturatedSlot(RowModel, namedtuple('SaturatedSlot', (
+        'start', 'end', 'booked_hours', 'available_hours'))):
+    """A slot of epoch seconds [start, end) booked at or beyond a work center's capacity"""
+    __slots__ = ()
+
+
+class OeePoint(RowModel, namedtuple('OeePoint', (
+        'scope', 'group_id', 'name', 'period_start', 'planned_downtime_hours', 'unplanned_downtime_hours',
+        'availability', 'oee', 'oee_target', 'meets_target'))):
+    """Downtime, availability and OEE of one work center or piece of equipment over one period"""
+    __slots__ = ()
+
+
+def select_columns(model, alias=None):
+    """Build the SELECT column list matching a model's fields"""
+    prefix = f'{alias}.' if alias else ''
+    return ', '.join(prefix + field for field in model._fields)
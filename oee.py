@@ -0,0 +1,171 @@
+"""
+Downtime and OEE analytics for GearGuard.
+
+Every maintenance request on a work center or piece of equipment is a
+downtime interval. It starts at scheduled_start, or at the time the request
+was raised when it is unscheduled. It ends when the request was repaired, or
+after its duration when no repair was recorded after the start. Preventive
+requests are planned downtime and all others unplanned. Each group's
+intervals are merged, so overlapping requests count once, then split into
+UTC days and stored in downtime_daily.
+
+Triggers mark a group dirty whenever one of its requests changes, and
+refresh_downtime() recomputes only those groups before the series are read.
+Day, week and month series then just sum the stored days.
+
+Availability is run time over planned production time, the period minus
+planned downtime. Performance and quality are not recorded, so OEE equals
+availability with both factors taken as 100%.
+"""
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+
+from database import (
+    DOWNTIME_SCOPES, get_all_work_centers, get_dirty_downtime_groups, get_downtime_sources,
+    replace_downtime_days, get_downtime_days
+)
+from models import OeePoint
+from schedule import job_end
+
+OEE_PERIODS = ('day', 'week', 'month')
+OEE_MAX_DAYS = 366
+
+DAY_SECONDS = 24 * 60 * 60
+EPOCH_DATE = date(1970, 1, 1)
+
+# Dirty groups recomputed per write transaction
+DOWNTIME_REFRESH_BATCH = 50
+
+_refresh_lock = threading.Lock()
+
+
+# ==================== DOWNTIME INTERVALS ====================
+
+def downtime_interval(scheduled_start, duration_minutes, request_type, opened_at, repaired_at):
+    """Get (start, end, planned) of one downtime source row, or None without a start"""
+    start = scheduled_start if scheduled_start is not None else opened_at
+    if start is None:
+        return None
+    end = repaired_at if repaired_at is not None and repaired_at > start else job_end(start, duration_minutes)
+    return start, end, request_type == 'Preventive'
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching (start, end) intervals, in start order"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def seconds_per_day(merged):
+    """Split merged intervals into {UTC day start: seconds}"""
+    days = defaultdict(int)
+    for start, end in merged:
+        while start < end:
+            day_end = start - start % DAY_SECONDS + DAY_SECONDS
+            days[day_end - DAY_SECONDS] += min(end, day_end) - start
+            start = day_end
+    return days
+
+
+def daily_downtime(sources):
+    """Get [(day, planned_seconds, unplanned_seconds)] of one group's downtime source rows"""
+    intervals = [interval for interval in (downtime_interval(*row) for row in sources) if interval]
+    planned = seconds_per_day(merge_intervals((start, end) for start, end, is_planned in intervals if is_planned))
+    total = seconds_per_day(merge_intervals((start, end) for start, end, _ in intervals))
+
+    epoch = EPOCH_DATE.toordinal()
+    return [(date.fromordinal(epoch + day // DAY_SECONDS).isoformat(),
+             planned.get(day, 0), seconds - planned.get(day, 0))
+            for day, seconds in sorted(total.items())]
+
+
+def refresh_downtime():
+    """Recompute the daily downtime of every dirty group.
+
+    Groups are written DOWNTIME_REFRESH_BATCH at a time, one transaction
+    each. Returns the number of groups refreshed.
+    """
+    refreshed = 0
+    with _refresh_lock:
+        dirty = [group for group in get_dirty_downtime_groups() if group[0] in DOWNTIME_SCOPES]
+        for offset in range(0, len(dirty), DOWNTIME_REFRESH_BATCH):
+            batch = [(scope, group_id, version, daily_downtime(get_downtime_sources(scope, group_id)))
+                     for scope, group_id, version in dirty[offset:offset + DOWNTIME_REFRESH_BATCH]]
+            success, message = replace_downtime_days(batch)
+            if success:
+                refreshed += len(batch)
+            else:
+                print(f"Downtime refresh of {len(batch)} groups failed: {message}")
+    return refreshed
+
+
+# ==================== SERIES ====================
+
+def period_start(day, period):
+    """Get the first day of the day, ISO week or month containing day"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start, period):
+    """Get the first day of the period after the one starting on start"""
+    if period == 'week':
+        return start + timedelta(days=7)
+    if period == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def get_oee_series(scope, period, start, end, group_id=None):
+    """Get OeePoints per group and period for the days in [start, end).
+
+    Work centers are listed even without downtime; equipment only when it
+    had downtime in the window. Periods are clipped to the window.
+    """
+    if scope not in DOWNTIME_SCOPES:
+        raise ValueError(f"scope must be one of: {', '.join(DOWNTIME_SCOPES)}")
+    if period not in OEE_PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(OEE_PERIODS)}")
+    refresh_downtime()
+
+    groups = {}  # group_id -> (name, oee_target)
+    downtime = defaultdict(lambda: [0, 0])  # (group_id, period start) -> [planned, unplanned]
+    if scope == 'work_center':
+        groups = {wc.id: (wc.name, wc.oee_target) for wc in get_all_work_centers()}
+    for row_group, name, target, day, planned, unplanned in get_downtime_days(scope, start.isoformat(),
+                                                                              end.isoformat()):
+        groups.setdefault(row_group, (name, target))
+        totals = downtime[row_group, period_start(date.fromisoformat(day), period)]
+        totals[0] += planned
+        totals[1] += unplanned
+    if group_id is not None:
+        groups = {group_id: groups[group_id]} if group_id in groups else {}
+
+    periods = []
+    current = period_start(start, period)
+    while current < end:
+        following = next_period(current, period)
+        periods.append((current, (min(following, end) - max(current, start)).days * DAY_SECONDS))
+        current = following
+
+    points = []
+    for key, (name, target) in sorted(groups.items(), key=lambda item: (str(item[1][0]), item[0])):
+        target = target or None  # 0 means no target was set
+        for current, seconds in periods:
+            planned, unplanned = downtime.get((key, current), (0, 0))
+            production = seconds - planned
+            availability = round((production - unplanned) / production * 100, 2) if production > 0 else None
+            points.append(OeePoint(
+                scope, key, name or f'#{key}', current.isoformat(), round(planned / 3600, 2),
+                round(unplanned / 3600, 2), availability, availability, target,
+                None if target is None or availability is None else availability >= target))
+    return points
@@ -0,0 +1,180 @@
+"""
+On-demand request profiling for GearGuard.
+
+An admin adds ?profile=cpu (or the X-Profile request header) to a URL to
+run that one request under a sampling profiler; ?profile=alloc also traces
+its memory allocations with tracemalloc. A sampler thread reads the request
+thread's stack from sys._current_frames() every PROFILE_INTERVAL_MS, so the
+request itself runs unmodified. When it ends, PROFILES_DIR receives
+
+  * <name>.collapsed: one "outer;...;inner count" line per sampled stack, the
+    input of flamegraph.pl and speedscope;
+  * <name>.allocations.txt (alloc only): peak traced memory and the top
+    allocation sites by size.
+
+Profiling is rate limited per process: one profiled request at a time, at
+least PROFILE_MIN_INTERVAL seconds apart, each sampled for at most
+PROFILE_MAX_SECONDS. Requests over the limit run normally. tracemalloc
+slows every thread while it traces, which is why alloc runs share the same
+single slot.
+"""
+import os
+import re
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+
+PROFILES_DIR = os.environ.get('GEARGUARD_PROFILES_DIR', 'profiles')
+PROFILE_INTERVAL_MS = float(os.environ.get('GEARGUARD_PROFILE_INTERVAL_MS', '5'))
+PROFILE_MIN_INTERVAL = float(os.environ.get('GEARGUARD_PROFILE_MIN_INTERVAL', '10'))
+PROFILE_MAX_SECONDS = 60
+# Newest profile runs kept in PROFILES_DIR
+PROFILE_KEEP = 50
+
+# Frames kept per traced allocation, and allocation sites listed per summary
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 30
+
+# Query parameter and header values -> profile mode
+PROFILE_PARAM = 'profile'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_MODES = {'1': 'cpu', 'cpu': 'cpu', 'alloc': 'alloc'}
+
+_slot = threading.Lock()
+_last_started = None
+
+
+def profile_mode(*values):
+    """Get the profile mode ('cpu' or 'alloc') asked for by any of values, or None"""
+    for value in values:
+        mode = PROFILE_MODES.get((value or '').strip().lower())
+        if mode:
+            return mode
+    return None
+
+
+def collapse(frame):
+    """Get a frame's stack as 'outer;...;inner' of function (file:line) names"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Thread counting the stacks of another thread at a fixed interval"""
+
+    def __init__(self, thread_id, interval, max_seconds=PROFILE_MAX_SECONDS):
+        super().__init__(name='gearguard-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stopped.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+            del frame
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class ProfileRun:
+    """One profiled request"""
+
+    def __init__(self, endpoint, mode):
+        safe_endpoint = re.sub(r'[^A-Za-z0-9_-]', '_', endpoint)
+        self.name = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_endpoint}-{uuid.uuid4().hex[:8]}"
+        self.mode = mode
+        self.started = time.perf_counter()
+        self.owns_tracemalloc = False
+        self.sampler = Sampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+
+
+def start_profile(endpoint, mode):
+    """Start profiling the calling thread's request; returns its ProfileRun, or None when rate limited"""
+    global _last_started
+    if not _slot.acquire(blocking=False):
+        return None
+    now = time.monotonic()
+    if _last_started is not None and now - _last_started < PROFILE_MIN_INTERVAL:
+        _slot.release()
+        return None
+    _last_started = now
+    run = ProfileRun(endpoint, mode)
+    try:
+        if mode == 'alloc' and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            run.owns_tracemalloc = True
+        run.sampler.start()
+        return run
+    except Exception:
+        if run.owns_tracemalloc:
+            tracemalloc.stop()
+        _slot.release()
+        raise
+
+
+def finish_profile(run):
+    """Stop a ProfileRun and write its files; returns the paths written"""
+    try:
+        run.sampler.stop()
+        elapsed = time.perf_counter() - run.started
+        snapshot = peak = None
+        if run.owns_tracemalloc:
+            snapshot = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        os.makedirs(PROFILES_DIR, exist_ok=True)
+        paths = [os.path.join(PROFILES_DIR, f'{run.name}.collapsed')]
+        with open(paths[0], 'w') as f:
+            for stack, count in run.sampler.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+        if snapshot is not None:
+            paths.append(os.path.join(PROFILES_DIR, f'{run.name}.allocations.txt'))
+            with open(paths[1], 'w') as f:
+                f.write(f'Request time: {elapsed:.3f}s, peak traced memory: {peak / 1024:.1f} KiB\n')
+                f.write(f'Top {TOP_ALLOCATIONS} allocation sites by size:\n')
+                for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                    frame = stat.traceback[0]
+                    f.write(f'{stat.size / 1024:10.1f} KiB {stat.count:8} blocks  {frame.filename}:{frame.lineno}\n')
+
+        prune_profiles()
+        print(f"Profiled {run.name} ({elapsed:.3f}s, {sum(run.sampler.stacks.values())} samples)")
+        return paths
+    finally:
+        _slot.release()
+
+
+def prune_profiles(keep=PROFILE_KEEP):
+    """Delete all but the newest `keep` profile runs from PROFILES_DIR"""
+    runs = sorted({name.split('.', 1)[0] for name in os.listdir(PROFILES_DIR)}, reverse=True)
+    for stale in runs[keep:]:
+        for suffix in ('.collapsed', '.allocations.txt'):
+            path = os.path.join(PROFILES_DIR, stale + suffix)
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def list_profiles():
+    """Get {name, size} of the profile files in PROFILES_DIR, newest first"""
+    if not os.path.isdir(PROFILES_DIR):
+        return []
+    return [{'name': name, 'size': os.path.getsize(os.path.join(PROFILES_DIR, name))}
+            for name in sorted(os.listdir(PROFILES_DIR), reverse=True)]
@@ -0,0 +1,239 @@
+"""
+Background report jobs for GearGuard.
+
+Large exports and report packs (several reports zipped together) run on a
+small thread pool instead of the request thread. Each job writes its result
+to REPORT_RESULTS_DIR and is kept for REPORT_RESULT_TTL seconds. Submitting
+a job identical to one still queued or running returns that job instead of
+starting another; once it has finished, the same parameters start a new job
+so the result reflects the current data.
+
+Job state lives in this process; with several worker processes a job is
+only visible to the process that accepted it.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from reports import REPORTS, REPORT_FILTERS, csv_chunks, ndjson_chunks, gzip_chunks
+
+REPORT_RESULTS_DIR = os.environ.get('GEARGUARD_REPORT_RESULTS_DIR', 'report_results')
+REPORT_JOB_WORKERS = int(os.environ.get('GEARGUARD_REPORT_JOB_WORKERS', '2'))
+REPORT_RESULT_TTL = 60 * 60  # seconds a finished job and its file are kept
+
+# Job formats -> (file extension, chunk encoder). A pack zips one such file
+# per report; gzip applies to single-report jobs.
+JOB_FORMATS = {
+    'csv': ('csv', csv_chunks),
+    'ndjson': ('ndjson', ndjson_chunks),
+}
+
+# Rows between progress updates, and seconds between progress event checks
+PROGRESS_EVERY_ROWS = 1000
+REPORT_JOB_EVENT_INTERVAL = 0.5
+
+# Seconds one progress event stream stays open, and milliseconds the client
+# is told to wait (SSE `retry:`) before reconnecting to resume it
+REPORT_JOB_EVENT_MAX_SECONDS = 60
+REPORT_JOB_EVENT_RETRY_MS = 2000
+
+_executor = None
+_jobs_lock = threading.Lock()
+_jobs = {}      # job id -> job dict
+_job_keys = {}  # parameter hash -> job id
+
+
+def _get_executor():
+    """Get the shared worker pool, started on first use"""
+    global _executor
+    with _jobs_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix='report-job')
+        return _executor
+
+
+def job_key(owner, report_types, filters, export_format, compress):
+    """Hash the parameters that decide a job's result"""
+    params = json.dumps([owner, sorted(report_types), filters, export_format, compress], sort_keys=True)
+    return hashlib.sha256(params.encode('utf-8')).hexdigest()
+
+
+def job_status(job):
+    """Get the public fields of a job"""
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'report_types': job['report_types'],
+        'format': job['format'],
+        'reports_done': job['reports_done'],
+        'reports_total': len(job['report_types']),
+        'rows': job['rows'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at'],
+    }
+
+
+# ==================== SUBMISSION ====================
+
+def submit_report_job(owner, report_types, filters=None, export_format='csv', compress=False):
+    """Queue a report, or a pack of reports, for background generation.
+
+    Returns (success, message, job). A queued or running job with the same
+    owner and parameters is returned instead of queueing a new one.
+    """
+    report_types = list(dict.fromkeys(report_types or ()))
+    if not report_types:
+        return False, "No report types given", None
+    unknown = [name for name in report_types if name not in REPORTS]
+    if unknown:
+        return False, f"Invalid report type: {', '.join(unknown)}", None
+    if export_format not in JOB_FORMATS:
+        return False, f"format must be one of: {', '.join(JOB_FORMATS)}", None
+
+    filters = {key: (filters or {}).get(key) or None for key in REPORT_FILTERS}
+    cleanup_expired_jobs()
+
+    key = job_key(owner, report_types, filters, export_format, compress)
+    with _jobs_lock:
+        existing = _jobs.get(_job_keys.get(key))
+        if existing and existing['status'] in ('queued', 'running'):
+            return True, "Identical job already submitted", existing
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'key': key,
+            'owner': owner,
+            'report_types': report_types,
+            'filters': filters,
+            'format': export_format,
+            'compress': compress,
+            'status': 'queued',
+            'reports_done': 0,
+            'rows': 0,
+            'error': None,
+            'path': None,
+            'filename': None,
+            'created_at': time.time(),
+            'finished_at': None,
+        }
+        _jobs[job['id']] = job
+        _job_keys[key] = job['id']
+
+    _get_executor().submit(_run_job, job)
+    return True, "Job queued", job
+
+
+def get_report_job(job_id, owner):
+    """Get a job by id, or None when it does not exist or belongs to someone else"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+    if job is None or job['owner'] != owner:
+        return None
+    return job
+
+
+# ==================== WORKER ====================
+
+def _counted(records, job):
+    """Pass records through, updating the job's row count as they are read"""
+    count = 0
+    for record in records:
+        yield record
+        count += 1
+        if count == PROGRESS_EVERY_ROWS:
+            job['rows'] += count
+            count = 0
+    job['rows'] += count
+
+
+def _report_chunks(job, name, encode):
+    """Encode one report of a job, counting its rows"""
+    report_def = REPORTS[name]
+    return encode(report_def, _counted(report_def.records(job['filters']), job))
+
+
+def _write_single(job, path):
+    """Write the one report of a job as CSV or NDJSON, gzipped on request"""
+    extension, encode = JOB_FORMATS[job['format']]
+    chunks = _report_chunks(job, job['report_types'][0], encode)
+    if job['compress']:
+        with open(path, 'wb') as result:
+            for data in gzip_chunks(chunks):
+                result.write(data)
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as result:
+            result.writelines(chunks)
+    job['reports_done'] = 1
+    return f"{job['report_types'][0]}_{date.today().isoformat()}.{extension}" + ('.gz' if job['compress'] else '')
+
+
+def _write_pack(job, path):
+    """Write every report of a job into one zip archive"""
+    extension, encode = JOB_FORMATS[job['format']]
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name in job['report_types']:
+            with archive.open(f'{name}.{extension}', 'w') as member:
+                for chunk in _report_chunks(job, name, encode):
+                    member.write(chunk.encode('utf-8'))
+            job['reports_done'] += 1
+    return f"gearguard_reports_{date.today().isoformat()}.zip"
+
+
+def _run_job(job):
+    """Generate a job's result file on a pool thread"""
+    job['status'] = 'running'
+    os.makedirs(REPORT_RESULTS_DIR, exist_ok=True)
+    path = os.path.abspath(os.path.join(REPORT_RESULTS_DIR, job['id']))
+    partial = path + '.part'
+
+    try:
+        write = _write_single if len(job['report_types']) == 1 else _write_pack
+        filename = write(job, partial)
+        os.replace(partial, path)
+        job.update(path=path, filename=filename, finished_at=time.time(), status='done')
+    except Exception as e:
+        print(f"Report job {job['id']} failed: {e}")
+        if os.path.exists(partial):
+            os.remove(partial)
+        job.update(error=str(e), finished_at=time.time(), status='failed')
+
+
+# ==================== CLEANUP ====================
+
+def cleanup_expired_jobs(now=None):
+    """Forget finished jobs older than REPORT_RESULT_TTL and delete their files.
+
+    Returns the number of result files deleted.
+    """
+    now = now or time.time()
+    with _jobs_lock:
+        expired = [job for job in _jobs.values()
+                   if job['finished_at'] is not None and now - job['finished_at'] > REPORT_RESULT_TTL]
+        for job in expired:
+            del _jobs[job['id']]
+            if _job_keys.get(job['key']) == job['id']:
+                del _job_keys[job['key']]
+        known = set(_jobs)
+
+    removed = 0
+    if os.path.isdir(REPORT_RESULTS_DIR):
+        # Also sweep files left behind by earlier processes
+        for name in os.listdir(REPORT_RESULTS_DIR):
+            path = os.path.join(REPORT_RESULTS_DIR, name)
+            if name.split('.')[0] in known:
+                continue
+            # Outside the lock: another worker may delete the file first
+            try:
+                if now - os.path.getmtime(path) > REPORT_RESULT_TTL:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
@@ -0,0 +1,294 @@
+"""
+Report definitions for GearGuard.
+
+Every report is registered once with its title, its columns and a records
+function yielding the rows to show. Request reports stream their records
+straight from a SQLite cursor, so the same definition serves the JSON
+payload of /generate-report and the constant-memory /export-report download.
+"""
+import csv
+import io
+import json
+import zlib
+from collections import namedtuple
+from datetime import date, timedelta
+
+from database import (
+    get_all_equipment, get_all_work_centers, get_all_equipment_categories, get_request_stats,
+    get_technician_performance, iter_report_requests, iter_overdue_report_requests, get_reliability_metrics,
+    parse_request_datetime, get_cost_totals
+)
+from oee import get_oee_series
+
+# Report parameters read from the request, passed to every records function as a dict
+REPORT_FILTERS = ('start_date', 'end_date', 'status_filter')
+
+# Representations /generate-report can return; clients pick a subset with `include`
+REPORT_PARTS = ('html_content', 'table_data', 'csv_content')
+
+# Streaming export formats -> MIME type. html is rendered by app.py from the
+# report templates in templates/reports/; the others by export_report().
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'html': 'text/html',
+}
+
+# Rows encoded per chunk handed to the WSGI server
+EXPORT_CHUNK_ROWS = 500
+
+Report = namedtuple('Report', ('title', 'columns', 'records'))
+StatusShare = namedtuple('StatusShare', ('status', 'count', 'percentage'))
+
+# Report name -> Report. columns is a tuple of (header, function(record) -> value),
+# optionally followed by the cell's CSS class in the HTML report: a string or a
+# function(record) -> string. templates/reports/_base.html renders every cell.
+REPORTS = {}
+
+
+def report(name, title, columns):
+    """Register a records function as the report `name`"""
+    def register(records):
+        REPORTS[name] = Report(title, columns, records)
+        return records
+    return register
+
+
+def report_headers(report_def):
+    """Get the column headers of a report"""
+    return [column[0] for column in report_def.columns]
+
+
+def report_row(report_def, record):
+    """Get the column values of one record"""
+    return tuple(column[1](record) for column in report_def.columns)
+
+
+def report_cells(report_def, record):
+    """Get the (value, CSS class or None) cells of one record in the HTML report"""
+    cells = []
+    for column in report_def.columns:
+        css = column[2] if len(column) > 2 else None
+        cells.append((column[1](record), css(record) if callable(css) else css))
+    return cells
+
+
+def report_table(report_def, records):
+    """Get records as {header: value} dicts, the table_data of /generate-report"""
+    headers = report_headers(report_def)
+    return [dict(zip(headers, report_row(report_def, record))) for record in records]
+
+
+# ==================== REPORT DEFINITIONS ====================
+
+@report('maintenance_requests', 'Maintenance Requests Report', (
+    ('ID', lambda req: req.id),
+    ('Subject', lambda req: req.subject),
+    ('Employee', lambda req: req.employee),
+    ('Technician', lambda req: req.technician or 'Unassigned'),
+    ('Status', lambda req: req.status),
+    ('Priority', lambda req: req.priority),
+    ('Request Date', lambda req: req.request_date or 'N/A'),
+    ('Scheduled Date', lambda req: req.scheduled_date or 'N/A'),
+))
+def maintenance_requests_records(filters):
+    return iter_report_requests(filters.get('start_date'), filters.get('end_date'), filters.get('status_filter'))
+
+
+def equipment_health(eq):
+    """Get the health percentage of equipment, 100 when unset"""
+    return eq.health_percentage if eq.health_percentage is not None else 100
+
+
+def health_class(health):
+    """Get the CSS class of a health percentage"""
+    return 'report-critical' if health < 30 else 'report-warning' if health < 60 else 'report-good'
+
+
+@report('equipment_status', 'Equipment Status Report', (
+    ('ID', lambda eq: eq.id),
+    ('Name', lambda eq: eq.name),
+    ('Health', lambda eq: f'{equipment_health(eq)}%', lambda eq: 'report-strong ' + health_class(equipment_health(eq))),
+    ('Status', lambda eq: eq.status or 'active'),
+    ('Created', lambda eq: eq.created_at or 'N/A'),
+))
+def equipment_status_records(filters):
+    return get_all_equipment()
+
+
+@report('status_summary', 'Status Summary Report', (
+    ('Status', lambda share: share.status, 'report-strong'),
+    ('Count', lambda share: share.count),
+    ('Percentage', lambda share: f'{share.percentage:.1f}%'),
+))
+def status_summary_records(filters):
+    stats = get_request_stats()
+    total = stats['total_requests']
+    status_counts = {status or 'Unknown': count for status, count in stats['by_status'].items()}
+    return [StatusShare(status, count, (count / total * 100) if total > 0 else 0)
+            for status, count in sorted(status_counts.items())]
+
+
+@report('overdue_requests', 'Overdue Requests Report', (
+    ('ID', lambda req: req.id),
+    ('Subject', lambda req: req.subject),
+    ('Employee', lambda req: req.employee),
+    ('Due Date', lambda req: req.due_date or 'N/A', 'report-strong report-critical'),
+    ('Status', lambda req: req.status),
+    ('Priority', lambda req: req.priority),
+))
+def overdue_requests_records(filters):
+    return iter_overdue_report_requests(filters.get('start_date'), filters.get('end_date'))
+
+
+@report('technician_performance', 'Technician Performance Report', (
+    ('Technician', lambda perf: perf.technician, 'report-strong'),
+    ('Total Requests', lambda perf: perf.total),
+    ('Completed', lambda perf: perf.completed, 'report-good'),
+    ('In Progress', lambda perf: perf.in_progress, 'report-warning'),
+    ('New', lambda perf: perf.new, 'report-info'),
+    ('Completion Rate', lambda perf: f'{perf.completion_rate():.1f}%', 'report-strong'),
+))
+def technician_performance_records(filters):
+    return get_technician_performance(filters.get('start_date'), filters.get('end_date'))
+
+
+@report('work_centers', 'Work Centers Report', (
+    ('Name', lambda wc: wc.name, 'report-strong'),
+    ('Code', lambda wc: wc.code or ''),
+    ('Cost per hour', lambda wc: wc.cost_per_hour or 0),
+    ('Capacity Time Efficiency', lambda wc: wc.capacity_time_efficiency or 100),
+    ('OEE Target', lambda wc: wc.oee_target or 0),
+    ('Company', lambda wc: wc.company or 'My company'),
+))
+def work_centers_records(filters):
+    return get_all_work_centers()
+
+
+@report('equipment_categories', 'Equipment Categories Report', (
+    ('Name', lambda cat: cat.name, 'report-strong'),
+    ('Responsible', lambda cat: cat.responsible or ''),
+    ('Company', lambda cat: cat.company or 'My company'),
+))
+def equipment_categories_records(filters):
+    return get_all_equipment_categories()
+
+
+RELIABILITY_COLUMNS = (
+    ('Name', lambda rel: rel.name, 'report-strong'),
+    ('Failures', lambda rel: rel.failures, 'report-warning'),
+    ('Repairs', lambda rel: rel.repairs, 'report-good'),
+    ('MTTR (hours)', lambda rel: rel.mttr_hours() if rel.repairs else 'N/A'),
+    ('MTBF (hours)', lambda rel: rel.mtbf_hours() if rel.failures > 1 else 'N/A'),
+    ('Last Failure', lambda rel: rel.last_failure_at or 'N/A'),
+)
+
+
+@report('equipment_reliability', 'Equipment Reliability Report', RELIABILITY_COLUMNS)
+def equipment_reliability_records(filters):
+    return get_reliability_metrics('equipment')
+
+
+@report('team_reliability', 'Team Reliability Report', RELIABILITY_COLUMNS)
+def team_reliability_records(filters):
+    return get_reliability_metrics('team')
+
+
+def oee_report_window(filters):
+    """Get the [start, end) days of an OEE report: the inclusive date filters, else the last 12 months"""
+    start = parse_request_datetime(filters.get('start_date'))
+    end = parse_request_datetime(filters.get('end_date'))
+    end = end.date() + timedelta(days=1) if end else date.today() + timedelta(days=1)
+    start = start.date() if start else date(end.year - 1, end.month, 1)
+    return start, max(start, end)
+
+
+OEE_COLUMNS = (
+    ('Name', lambda point: point.name, 'report-strong'),
+    ('Month', lambda point: point.period_start[:7]),
+    ('Planned Downtime (hours)', lambda point: point.planned_downtime_hours),
+    ('Unplanned Downtime (hours)', lambda point: point.unplanned_downtime_hours, 'report-warning'),
+    ('Availability', lambda point: f'{point.availability:.1f}%' if point.availability is not None else 'N/A'),
+    ('OEE', lambda point: f'{point.oee:.1f}%' if point.oee is not None else 'N/A',
+     lambda point: 'report-warning' if point.meets_target is False else 'report-good'),
+    ('OEE Target', lambda point: f'{point.oee_target:.1f}%' if point.oee_target else 'N/A'),
+)
+
+
+@report('work_center_oee', 'Work Center OEE Report', OEE_COLUMNS)
+def work_center_oee_records(filters):
+    return get_oee_series('work_center', 'month', *oee_report_window(filters))
+
+
+@report('equipment_downtime', 'Equipment Downtime Report', OEE_COLUMNS[:-1])
+def equipment_downtime_records(filters):
+    return get_oee_series('equipment', 'month', *oee_report_window(filters))
+
+
+COST_COLUMNS = (
+    ('Repairs', lambda total: total.repairs),
+    ('Labor Hours', lambda total: total.hours()),
+    ('Labor Cost', lambda total: f'{total.cost():.2f}'),
+)
+
+
+@report('monthly_costs', 'Monthly Maintenance Cost Report', (('Month', lambda total: total.name, 'report-strong'),) + COST_COLUMNS)
+def monthly_costs_records(filters):
+    start_date, end_date = filters.get('start_date'), filters.get('end_date')
+    return get_cost_totals('month', start_date[:7] if start_date else None, end_date[:7] if end_date else None)
+
+
+@report('equipment_costs', 'Equipment Maintenance Cost Report', (('Name', lambda total: total.name, 'report-strong'),) + COST_COLUMNS)
+def equipment_costs_records(filters):
+    return get_cost_totals('equipment')
+
+
+# ==================== STREAMING EXPORT ====================
+
+def csv_chunks(report_def, records):
+    """Yield a report as CSV text, EXPORT_CHUNK_ROWS rows per chunk"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(report_headers(report_def))
+
+    for count, record in enumerate(records, 1):
+        writer.writerow(report_row(report_def, record))
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(report_def, records):
+    """Yield a report as newline-delimited JSON objects, EXPORT_CHUNK_ROWS rows per chunk"""
+    headers = report_headers(report_def)
+    lines = []
+
+    for record in records:
+        lines.append(json.dumps(dict(zip(headers, report_row(report_def, record))), default=str))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks):
+    """Compress text chunks into one gzip stream as they are produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # +16 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_report(name, filters, export_format='csv', compress=False):
+    """Stream report `name` in export_format, optionally gzip-compressed"""
+    report_def = REPORTS[name]
+    encode = csv_chunks if export_format == 'csv' else ndjson_chunks
+    chunks = encode(report_def, report_def.records(filters))
+    return gzip_chunks(chunks) if compress else chunks
@@ -0,0 +1,166 @@
+"""
+Schedule engine for GearGuard.
+
+A scheduled request is an interval [scheduled_start, scheduled_start +
+duration_minutes) of epoch seconds. One sweep over the intervals sorted by
+start splits them into clusters of transitively overlapping jobs and packs
+each cluster into lanes with two heaps: the running jobs by end time and the
+lanes they free. A job takes the lowest free lane, so a cluster needs as
+many lanes as it has jobs running at once at its peak. The same pass lays
+out the calendar week view and finds double-booked technicians and
+overbooked teams, in O(n log n) for n jobs.
+"""
+import heapq
+import random
+import time
+from collections import defaultdict
+
+from database import DEFAULT_JOB_MINUTES, OPEN_STATUSES, get_scheduled_jobs
+from models import ScheduledJob, ScheduleConflict
+
+# Resources whose overlapping jobs are checked (ScheduleConflict.scope)
+SCHEDULE_SCOPES = ('technician', 'team')
+
+
+def job_end(start, duration_minutes):
+    """Get the end of a job, taking DEFAULT_JOB_MINUTES when its duration is unknown"""
+    return start + (duration_minutes or DEFAULT_JOB_MINUTES) * 60
+
+
+def sweep(jobs):
+    """Split jobs into overlap clusters and pack each into lanes.
+
+    jobs are (start, end, job) triples. Yields (placements, lanes) per
+    cluster in start order, placements being (start, end, job, lane).
+    """
+    push, pop = heapq.heappush, heapq.heappop
+    cluster = []
+    cluster_end = None
+    running = []  # (end, lane) of the cluster's jobs still running, soonest end first
+    free = []     # lanes freed by finished jobs, lowest first
+    lanes = 0
+
+    for start, end, job in sorted(jobs, key=lambda item: (item[0], item[1])):
+        if cluster and start >= cluster_end:
+            yield cluster, lanes
+            cluster, running, free, lanes = [], [], [], 0
+        while running and running[0][0] <= start:
+            push(free, pop(running)[1])
+        if free:
+            lane = pop(free)
+        else:
+            lane = lanes
+            lanes += 1
+        push(running, (end, lane))
+        if not cluster or end > cluster_end:
+            cluster_end = end
+        cluster.append((start, end, job, lane))
+
+    if cluster:
+        yield cluster, lanes
+
+
+def pack_lanes(jobs):
+    """Get {job: (lane, lanes)} for (start, end, job) triples; lanes is the width of the job's cluster"""
+    layout = {}
+    for placements, lanes in sweep(jobs):
+        for _, _, job, lane in placements:
+            layout[job] = (lane, lanes)
+    return layout
+
+
+def find_conflicts(jobs, scope='technician'):
+    """Get ScheduleConflicts of ScheduledJob rows, ordered by start.
+
+    A technician conflicts with itself whenever two of its jobs overlap. A
+    team is overbooked when more of its jobs overlap than it has technicians
+    assigned to jobs in the set (at least one); its unassigned jobs count
+    towards the load.
+    """
+    if scope not in SCHEDULE_SCOPES:
+        raise ValueError(f"scope must be one of: {', '.join(SCHEDULE_SCOPES)}")
+
+    by_resource = defaultdict(list)
+    capacity = defaultdict(set)
+    for job in jobs:
+        resource = getattr(job, scope)
+        if not resource:
+            continue
+        by_resource[resource].append((job.start, job.end, job.id))
+        if scope == 'team' and job.technician:
+            capacity[resource].add(job.technician)
+
+    conflicts = []
+    for resource, intervals in by_resource.items():
+        hands = max(len(capacity[resource]), 1)
+        for placements, lanes in sweep(intervals):
+            if lanes > hands:
+                conflicts.append(ScheduleConflict(
+                    scope, resource, placements[0][0], max(end for _, end, _, _ in placements),
+                    lanes, hands, sorted(job_id for _, _, job_id, _ in placements)))
+    return sorted(conflicts, key=lambda conflict: (conflict.start, conflict.resource))
+
+
+def get_schedule_conflicts(start, end, scopes=SCHEDULE_SCOPES):
+    """Load the open jobs running in [start, end) once and check them for every scope"""
+    jobs = get_scheduled_jobs(start, end)
+    return {
+        'jobs': len(jobs),
+        'conflicts': {scope: find_conflicts(jobs, scope) for scope in scopes},
+    }
+
+
+def calendar_layout(requests):
+    """Get the calendar events of MaintenanceRequest rows with their lane layout.
+
+    Each event gets its lane, the lane count of its overlap cluster, and
+    whether its technician is double-booked by another open request in the set.
+    """
+    jobs = [ScheduledJob(req.id, req.technician, req.team, req.scheduled_start,
+                         job_end(req.scheduled_start, req.duration_minutes))
+            for req in requests if req.scheduled_start is not None]
+    layout = pack_lanes((job.start, job.end, job.id) for job in jobs)
+
+    open_ids = {req.id for req in requests if req.status in OPEN_STATUSES}
+    conflicts = find_conflicts([job for job in jobs if job.id in open_ids], 'technician')
+    conflicted = {job_id for conflict in conflicts for job_id in conflict.request_ids}
+
+    events = []
+    for req in requests:
+        lane, lanes = layout.get(req.id, (0, 1))
+        events.append(dict(req.calendar_event(), lane=lane, lanes=lanes, conflict=req.id in conflicted))
+    return events
+
+
+# ==================== BENCHMARK ====================
+
+def synthetic_jobs(count, days=7, technicians=500, teams=50, seed=7):
+    """Build count random open ScheduledJobs over `days` days without touching a database"""
+    rng = random.Random(seed)
+    jobs = []
+    for job_id in range(count):
+        technician = rng.randrange(technicians)
+        start = rng.randrange(days * 24 * 60) * 60
+        jobs.append(ScheduledJob(job_id, f'Technician {technician}', f'Team {technician % teams}',
+                                 start, start + rng.choice((30, 60, 90, 120, 240)) * 60))
+    return jobs
+
+
+def benchmark(sizes=(10_000, 50_000), repeat=3):
+    """Time lane packing plus conflict checks for every scope per job count.
+
+    Returns a list of (jobs, best seconds).
+    """
+    results = []
+    for count in sizes:
+        jobs = synthetic_jobs(count)
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            pack_lanes((job.start, job.end, job.id) for job in jobs)
+            for scope in SCHEDULE_SCOPES:
+                find_conflicts(jobs, scope)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results.append((count, best))
+    return results
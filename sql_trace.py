@@ -0,0 +1,164 @@
+"""
+SQL tracing for GearGuard.
+
+While tracing is on, every pooled connection has a trace callback counting
+the statements SQLite runs (trigger bodies and implicit BEGINs included) and
+remembering the last one with its values bound. The instrumented cursors in
+database.py pass each execute's SQL and time to record_statement(), which
+
+  * logs statements slower than SLOW_QUERY_MS with their EXPLAIN QUERY PLAN,
+    and keeps the latest SLOW_LOG_SIZE of them for the admin page;
+  * tallies the statements of the current HTTP request by SQL text, so the
+    same statement run REPEATED_QUERY_THRESHOLD times or more in one request
+    (an N+1 pattern such as a per-row name lookup) is reported when the
+    request ends, and summarized in the X-Query-Summary response header.
+
+Tracing is toggled at runtime with set_enabled(). Connections pick the
+change up the next time they are checked out of the pool; while off, no
+callback is installed and the cursors skip tracing after one flag check.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# Statements slower than this are logged with their query plan
+SLOW_QUERY_MS = float(os.environ.get('GEARGUARD_SLOW_QUERY_MS', '100'))
+
+# Runs of one statement within a request from which it is reported as repeated
+REPEATED_QUERY_THRESHOLD = int(os.environ.get('GEARGUARD_REPEATED_QUERY_THRESHOLD', '5'))
+
+# Slow statements kept in memory for the admin page
+SLOW_LOG_SIZE = 100
+
+SUMMARY_HEADER = 'X-Query-Summary'
+
+# Read by the cursors on every statement, so a plain module global
+enabled = os.environ.get('GEARGUARD_SQL_TRACE', '0') == '1'
+# Bumped by set_enabled(); connections re-apply the trace callback when theirs differs
+generation = 0
+
+_slow_log_lock = threading.Lock()
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+_local = threading.local()  # .trace: RequestTrace of the thread's HTTP request, .explaining
+
+
+class RequestTrace:
+    """Statements run while serving one HTTP request"""
+    __slots__ = ('statements', 'queries', 'seconds', 'sqlite_statements', 'slow', 'last_statement')
+
+    def __init__(self):
+        self.statements = {}  # SQL text -> [runs, seconds]
+        self.queries = 0
+        self.seconds = 0.0
+        self.sqlite_statements = 0
+        self.slow = 0
+        self.last_statement = None
+
+    def repeated(self):
+        """Get (sql, runs, seconds) of statements run at least REPEATED_QUERY_THRESHOLD times, most runs first"""
+        repeated = [(sql, runs, seconds) for sql, (runs, seconds) in self.statements.items()
+                    if runs >= REPEATED_QUERY_THRESHOLD]
+        return sorted(repeated, key=lambda item: -item[1])
+
+    def summary(self):
+        """Get the X-Query-Summary header value"""
+        return (f'queries={self.queries}; sqlite={self.sqlite_statements}; db_ms={self.seconds * 1000:.2f}; '
+                f'repeated={len(self.repeated())}; slow={self.slow}')
+
+
+def set_enabled(on):
+    """Turn tracing on or off for every connection of this process"""
+    global enabled, generation
+    enabled = bool(on)
+    generation += 1
+
+
+def apply(conn):
+    """Install or remove the trace callback on a connection to match the current setting"""
+    conn.set_trace_callback(_on_statement if enabled else None)
+    conn.trace_generation = generation
+
+
+def _on_statement(statement):
+    trace = getattr(_local, 'trace', None)
+    if trace is not None and not getattr(_local, 'explaining', False):
+        trace.sqlite_statements += 1
+        trace.last_statement = statement
+
+
+def begin_request():
+    """Start tracing the calling thread's HTTP request (no-op while tracing is off)"""
+    _local.trace = RequestTrace() if enabled else None
+
+
+def end_request():
+    """Stop tracing the calling thread's request; returns its RequestTrace, or None"""
+    trace = getattr(_local, 'trace', None)
+    _local.trace = None
+    return trace
+
+
+def current_request():
+    """Get the RequestTrace of the calling thread's request, or None"""
+    return getattr(_local, 'trace', None)
+
+
+def explain(conn, sql, parameters):
+    """Get the EXPLAIN QUERY PLAN lines of a statement, or [] when it cannot be explained"""
+    _local.explaining = True
+    try:
+        cursor = conn.cursor(sqlite3.Cursor)
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parameters)
+        return [row[3] for row in cursor.fetchall()]
+    except (sqlite3.Error, ValueError):
+        return []
+    finally:
+        _local.explaining = False
+
+
+def record_statement(conn, sql, parameters, seconds):
+    """Record one executed statement; parameters is None for executemany and scripts"""
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.queries += 1
+        trace.seconds += seconds
+        stats = trace.statements.get(sql)
+        if stats is None:
+            trace.statements[sql] = [1, seconds]
+        else:
+            stats[0] += 1
+            stats[1] += seconds
+
+    if seconds * 1000 < SLOW_QUERY_MS:
+        return
+    statement = ' '.join(sql.split())
+    plan = explain(conn, sql, parameters) if parameters is not None else []
+    entry = {
+        'at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'database': getattr(conn, 'db_path', None),
+        'ms': round(seconds * 1000, 2),
+        'sql': statement,
+        'bound_sql': trace.last_statement if trace is not None else None,
+        'plan': plan,
+    }
+    with _slow_log_lock:
+        _slow_log.append(entry)
+    if trace is not None:
+        trace.slow += 1
+    print(f"Slow query ({entry['ms']} ms on {entry['database']}): {statement}")
+    for line in plan:
+        print(f"    plan: {line}")
+
+
+def log_repeated(method, path, trace):
+    """Print the statements a request ran repeatedly"""
+    for sql, runs, seconds in trace.repeated():
+        print(f"Repeated query in {method} {path}: {runs} runs, {seconds * 1000:.2f} ms: {' '.join(sql.split())}")
+
+
+def get_slow_queries():
+    """Get the latest slow statements, newest first"""
+    with _slow_log_lock:
+        return list(reversed(_slow_log))
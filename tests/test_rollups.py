@@ -0,0 +1,97 @@
+"""
+Rollup trigger tests: every change to a request must leave the rollup tables
+equal to a fresh recount (verify_request_rollups() returns {}).
+
+Runs against throwaway databases in a temporary directory:
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import (
+    REQUESTS_DB, create_equipment, create_maintenance_request_new, create_work_center, delete_maintenance_request,
+    get_connection, init_db, release_connection, release_thread_connections, update_maintenance_request,
+    update_request_status_new, verify_request_rollups
+)
+
+
+class RequestRollupTriggerTest(unittest.TestCase):
+    """Reopen, reassign and delete requests and check the rollups after each change"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Database paths are relative, so the databases are created in the temp directory
+        cls._cwd = os.getcwd()
+        cls._tmp = tempfile.TemporaryDirectory()
+        os.chdir(cls._tmp.name)
+        init_db()
+        create_work_center('Assembly', cost_per_hour=60.0)
+        create_work_center('Paint', cost_per_hour=45.0)
+        cls.drill = create_equipment('Drill', maintenance_team='Mechanics', work_center_id=1)[1]
+        cls.press = create_equipment('Press', maintenance_team='Electricians', work_center_id=2)[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        release_thread_connections()
+        os.chdir(cls._cwd)
+        cls._tmp.cleanup()
+
+    def assertRollupsConsistent(self):
+        self.assertEqual(verify_request_rollups(), {})
+
+    def execute(self, query, params=()):
+        conn = get_connection(REQUESTS_DB)
+        try:
+            conn.execute(query, params)
+            conn.commit()
+        finally:
+            release_connection(conn)
+
+    def create_request(self, subject, **fields):
+        """Create a request and return its id"""
+        success, message = create_maintenance_request_new(subject, 'tester', duration='02:00', **fields)
+        self.assertTrue(success, message)
+        conn = get_connection(REQUESTS_DB)
+        try:
+            return conn.execute('SELECT MAX(id) FROM maintenance_requests').fetchone()[0]
+        finally:
+            release_connection(conn)
+
+    def test_request_changes_keep_rollups_consistent(self):
+        first = self.create_request('Replace belt', equipment_id=self.drill, technician='Ann', team='Mechanics',
+                                    work_center_id=1)
+        second = self.create_request('Rewire panel', equipment_id=self.press, technician='Bob', team='Electricians',
+                                     work_center_id=2)
+        self.assertRollupsConsistent()
+
+        for status in ('In Progress', 'Repaired'):
+            self.assertTrue(update_request_status_new(first, status))
+            self.assertRollupsConsistent()
+
+        # Reopening posts a cost reversal and moves the request back to the open counts
+        self.assertTrue(update_request_status_new(first, 'In Progress'))
+        self.assertRollupsConsistent()
+
+        success, message = update_maintenance_request(first, technician='Bob', team='Electricians',
+                                                      equipment_id=self.press)
+        self.assertTrue(success, message)
+        self.assertRollupsConsistent()
+
+        self.execute('UPDATE maintenance_requests SET work_center_id = 2 WHERE id = ?', (first,))
+        self.assertRollupsConsistent()
+
+        self.assertTrue(update_request_status_new(first, 'Repaired'))
+        self.assertRollupsConsistent()
+
+        for request_id in (first, second):
+            success, message = delete_maintenance_request(request_id)
+            self.assertTrue(success, message)
+            self.assertRollupsConsistent()
+
+
+if __name__ == '__main__':
+    unittest.main()